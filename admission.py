@@ -0,0 +1,108 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+# Token bucket на ключ (телефон, IP): rate токенов в секунду, не больше burst подряд.
+# Ключи вытесняются по LRU после max_keys: вытесненный ключ начинает с полного бака,
+# то есть ограничение может только ослабнуть, а память процесса не растёт
+class RateLimiter:
+    def __init__(self, rate, burst, max_keys=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # key -> [tokens, updated_at]
+        self.allowed = 0
+        self.limited = 0
+
+    def hit(self, key):
+        # 0 — запрос пропущен; иначе через сколько секунд появится следующий токен
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(self.burst), now]
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(float(self.burst), bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                self.allowed += 1
+                return 0.0
+            self.limited += 1
+            return (1 - bucket[0]) / self.rate
+
+    def stats(self):
+        with self._lock:
+            return {'keys': len(self._buckets), 'allowed': self.allowed, 'limited': self.limited}
+
+
+# Не больше limit транзакций записи одновременно в процессе. До queue_size запросов ждут
+# освобождения не дольше timeout, остальным сразу отказ — вместо очереди к пулу соединений,
+# которую делят с записью все остальные страницы
+class ConcurrencyGate:
+    def __init__(self, limit, queue_size, timeout):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def acquire(self):
+        with self._cond:
+            # Пока кто-то ждёт, новые запросы встают за ним, а не проходят вперёд
+            if self._active < self.limit and not self._waiting:
+                self._active += 1
+                self.admitted += 1
+                return True
+            if self._waiting >= self.queue_size:
+                self.rejected += 1
+                return False
+            self._waiting += 1
+            self.queued += 1
+            deadline = time.monotonic() + self.timeout
+            try:
+                while self._active >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timed_out += 1
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+            self._active += 1
+            self.admitted += 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'active': self._active,
+                'waiting': self._waiting,
+                'admitted': self.admitted,
+                'queued': self.queued,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+            }
+
+
+def retry_after(seconds):
+    # Значение заголовка Retry-After: целые секунды, не меньше одной
+    return str(max(1, math.ceil(seconds)))
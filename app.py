@@ -1,61 +1,133 @@
 import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from flask import Flask, render_template, request, redirect, url_for, session, make_response
-from datetime import datetime, timedelta, date
-
-app = Flask(__name__)
-app.secret_key = 'your-secret-key-change-in-production'
-
-SLOTS = [
-    "14:00-14:30", "14:30-15:00", "15:00-15:30", "15:30-16:00",
-    "16:00-16:30", "16:30-17:00", "17:00-17:30", "17:30-18:00",
-    "18:00-18:30", "18:30-19:00", "19:00-19:30", "19:30-20:00"
-]
-
-def get_db_connection():
-    db_url = os.environ.get("DATABASE_URL")
-    if not db_url:
-        raise Exception("DATABASE_URL environment variable is required")
-    return psycopg2.connect(db_url, cursor_factory=RealDictCursor)
+import secrets
+from flask import (Blueprint, Flask, render_template, request, redirect, url_for, session, make_response, jsonify,
+                   Response, stream_with_context)
+from datetime import datetime, date, timedelta
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+import admission
+import assets
+import db
+import export
+import metrics
+import reports
+from db import get_db, get_storage
+from cache import VersionedCache, PageCache, compress_page, choose_encoding
+from migrate import migrate
+from cleanup import MaintenanceScheduler
+from schedule import (get_current_week_dates, load_week, availability_to_masks, slots_payload, override_diff,
+                      rule_closed)
+from slots import SlotCatalog, WEEKDAYS, parse_time, rules_from_rows
+
+bp = Blueprint('booking', __name__)
+
+# Счётчики запросов к БД, Server-Timing и гистограммы по маршрутам (/admin/metrics)
+request_metrics = metrics.Metrics()
+
+WEEKLY_LIMIT = 3
+
+# Записи в админке: размер страницы и фильтры по статусу (?status=)
+ADMIN_PAGE_SIZE = int(os.environ.get("ADMIN_PAGE_SIZE", 50))
+# Сколько действий принимает один запрос /admin/batch
+ADMIN_BATCH_MAX = int(os.environ.get("ADMIN_BATCH_MAX", 500))
+ADMIN_STATUS_FILTERS = {
+    'all': None,
+    'active': ('confirmed', 'pending_cancellation'),
+    'pending': ('pending_cancellation',),
+    'cancelled': ('cancelled',),
+}
+
+# Адрес SSE-потока изменений слотов (events.py), например /events за прокси; пусто — только опрос API
+EVENTS_URL = os.environ.get("EVENTS_URL", "")
+
+availability_cache = VersionedCache(
+    max_entries=int(os.environ.get("AVAILABILITY_CACHE_SIZE", 16)),
+    ttl=float(os.environ.get("AVAILABILITY_CACHE_TTL", 300)),
+    version_ttl=float(os.environ.get("DATA_VERSION_TTL", 2)),
+)
+
+# Битовые маски недели по версиям (со слотами, к которым они относятся): текущая для /api/availability и прошлые для дельт
+availability_masks = VersionedCache(
+    max_entries=int(os.environ.get("AVAILABILITY_HISTORY_SIZE", 64)),
+    ttl=float(os.environ.get("AVAILABILITY_CACHE_TTL", 300)),
+    version_ttl=float(os.environ.get("DATA_VERSION_TTL", 2)),
+)
+
+# Отчёты по диапазонам дат — до следующего изменения записей
+report_cache = VersionedCache(
+    max_entries=int(os.environ.get("REPORT_CACHE_SIZE", 32)),
+    ttl=float(os.environ.get("REPORT_CACHE_TTL", 300)),
+    version_ttl=float(os.environ.get("DATA_VERSION_TTL", 2)),
+)
+
+# Готовый HTML страниц и фрагментов (с вариантами gzip/br) по версии данных
+page_cache = PageCache(
+    max_bytes=int(os.environ.get("PAGE_CACHE_BYTES", 8 * 1024 * 1024)),
+    max_entries=int(os.environ.get("PAGE_CACHE_SIZE", 256)),
+    ttl=float(os.environ.get("PAGE_CACHE_TTL", 300)),
+    version_ttl=float(os.environ.get("DATA_VERSION_TTL", 2)),
+)
+
+# Допуск к /book в пиковые минуты: частота попыток с одного телефона и IP, сколько транзакций
+# записи идут одновременно (на процесс) и кэш отказов, которые повтор не изменит
+phone_limiter = admission.RateLimiter(
+    rate=float(os.environ.get("BOOK_PHONE_RATE", 0.2)),
+    burst=int(os.environ.get("BOOK_PHONE_BURST", 3)),
+)
+ip_limiter = admission.RateLimiter(
+    rate=float(os.environ.get("BOOK_IP_RATE", 1)),
+    burst=int(os.environ.get("BOOK_IP_BURST", 10)),
+)
+booking_gate = admission.ConcurrencyGate(
+    limit=int(os.environ.get("BOOK_CONCURRENCY", 2)),
+    queue_size=int(os.environ.get("BOOK_QUEUE", 4)),
+    timeout=float(os.environ.get("BOOK_QUEUE_TIMEOUT", 2)),
+)
+# Версия не используется: записи сбрасывает clear() при отмене, а отмены
+# в других воркерах становятся видны не позже чем через ttl
+booking_rejections = VersionedCache(
+    max_entries=int(os.environ.get("BOOK_REJECTIONS_SIZE", 4096)),
+    ttl=float(os.environ.get("BOOK_REJECTIONS_TTL", 5)),
+)
+
+# Очистка старых записей — в фоне, а не на запросе главной страницы
+maintenance = MaintenanceScheduler(
+    get_storage,
+    lambda: db.get_pool().connection(),
+    interval=float(os.environ.get("MAINTENANCE_INTERVAL", 600)),
+    commit=lambda conn: commit_changes(conn),
+)
+
+@bp.before_app_request
+def start_maintenance():
+    maintenance.start()
+
+def create_app(config=None):
+    app = Flask(__name__)
+    secret_key = os.environ.get("SECRET_KEY")
+    if not secret_key:
+        # Без SECRET_KEY сессии админа не переживут перезапуск
+        print("[CONFIG] SECRET_KEY is not set, using a random key")
+        secret_key = secrets.token_hex(32)
+    app.config['SECRET_KEY'] = secret_key
+    if config:
+        app.config.update(config)
+    # За прокси (Render) адрес клиента — в X-Forwarded-For; без этого лимит по IP общий на всех
+    trusted_proxies = int(os.environ.get("TRUSTED_PROXIES", 0))
+    if trusted_proxies:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=trusted_proxies)
+    db.init_app(app)
+    request_metrics.init_app(app, get_storage)
+    assets.init_app(app)
+    app.register_blueprint(bp)
+    return app
 
 def init_db():
-    conn = get_db_connection()
+    # Отдельное соединение, а не пул: в gunicorn миграции идут в мастере до fork
+    store = get_storage()
+    conn = store.connect()
     try:
-        with conn.cursor() as cur:
-            # Таблица бронирований
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS bookings (
-                    id SERIAL PRIMARY KEY,
-                    name TEXT NOT NULL,
-                    phone TEXT NOT NULL,
-                    date DATE NOT NULL,
-                    time_slot TEXT NOT NULL,
-                    status TEXT NOT NULL DEFAULT 'confirmed',
-                    attended INTEGER,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-
-            # Таблица исключений расписания
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS availability_override (
-                    id SERIAL PRIMARY KEY,
-                    date DATE NOT NULL,
-                    time_slot TEXT
-                )
-            """)
-
-            # Проверка наличия столбца 'attended' (для обновлений)
-            cur.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name='bookings' AND column_name='attended'
-            """)
-            if cur.fetchone() is None:
-                cur.execute("ALTER TABLE bookings ADD COLUMN attended INTEGER")
-
-            conn.commit()
+        migrate(store, conn)
     finally:
         conn.close()
 
@@ -64,120 +136,165 @@ def mask_phone(phone):
         return phone[:4] + '*' * (len(phone) - 7) + phone[-3:]
     return phone
 
-def get_current_week_dates():
-    today = date.today()
-    if today.weekday() == 6:
-        start = today + timedelta(days=1)
-    else:
-        start = today - timedelta(days=today.weekday())
-    return [start + timedelta(days=i) for i in range(6)]
+def load_data_version():
+    return get_storage().data_version(get_db())
+
+def commit_changes(conn):
+    # Коммит изменяющей операции вместе с увеличением версии данных
+    store = get_storage()
+    version, changed_at = store.bump_version(conn)
+    store.notify_changed(conn, version)
+    conn.commit()
+    availability_cache.set_version(version, changed_at)
+    availability_masks.set_version(version, changed_at)
+    report_cache.set_version(version, changed_at)
+    page_cache.set_version(version, changed_at)
+
+def rejection_keys(phone, target_date, slot_id):
+    # Слот занят/закрыт — для всех; недельный лимит — для телефона (неделя с понедельника, как в БД)
+    week_start = target_date - timedelta(days=target_date.weekday())
+    return ('slot', target_date, slot_id), ('week', phone, week_start)
+
+def release_rejections():
+    # Отмена или изменение расписания освобождают слоты и недельный лимит
+    booking_rejections.clear()
+
+def cached_page(key, version, render):
+    # Шаблон рендерится и сжимается один раз на версию; ответ — готовый вариант под Accept-Encoding
+    page = page_cache.get(key, version)
+    if page is None:
+        page = compress_page(render())
+        page_cache.put(key, version, page)
+    encoding = choose_encoding(page, request.accept_encodings)
+    response = make_response(page.encoded[encoding] if encoding else page.body)
+    response.content_type = page.mimetype
+    if encoding:
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    return response
 
-def cleanup_old_bookings():
-    conn = get_db_connection()
+def cached_week_availability(dates, version):
+    # (слоты недели, {день: {slot_id: свободен}})
+    week = availability_cache.get(dates[0], version)
+    if week is None:
+        week = load_week(get_storage(), get_db(), dates)
+        availability_cache.put(dates[0], version, week)
+        # Снимок версии, от которой клиент страницы потом попросит дельту
+        week_slots, availability = week
+        availability_masks.put((dates[0], version), version,
+                               (week_slots, availability_to_masks(dates, week_slots, availability)))
+    return week
+
+def week_masks(dates, version):
+    entry = availability_masks.get((dates[0], version), version)
+    if entry is None:
+        week_slots, availability = cached_week_availability(dates, version)
+        entry = (week_slots, availability_to_masks(dates, week_slots, availability))
+        availability_masks.put((dates[0], version), version, entry)
+    return entry
+
+def create_booking(name, phone, target_date, slot_id):
+    # Открыт ли слот в этот день недели, проверяет тот же запрос, что и записывает
+    if not 0 < slot_id < 32768:
+        return None, "Slot is not available"
+
+    conn = get_db()
     try:
-        with conn.cursor() as cur:
-            today = date.today()
-            last_sunday = today - timedelta(days=today.weekday() + 1)
-            cur.execute("""
-                DELETE FROM bookings 
-                WHERE date <= %s AND status IN ('confirmed', 'cancelled')
-            """, (last_sunday.isoformat(),))
+        row = get_storage().create_booking(conn, name, phone, target_date, slot_id, WEEKLY_LIMIT)
+        if row['booking_id'] is not None:
+            commit_changes(conn)
+        else:
             conn.commit()
-    finally:
-        conn.close()
-
-def is_slot_available(target_date, time_slot):
-    if target_date.weekday() >= 6:
-        return False
-    if time_slot not in SLOTS:
-        return False
-
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-            # Проверка: отключён ли день?
-            cur.execute(
-                "SELECT 1 FROM availability_override WHERE date = %s AND time_slot IS NULL",
-                (target_date.isoformat(),)
-            )
-            if cur.fetchone():
-                return False
-
-            # Проверка: отключён ли слот?
-            cur.execute(
-                "SELECT 1 FROM availability_override WHERE date = %s AND time_slot = %s",
-                (target_date.isoformat(), time_slot)
-            )
-            if cur.fetchone():
-                return False
-
-            # Занят ли слот (confirmed или pending)?
-            cur.execute(
-                """SELECT 1 FROM bookings 
-                   WHERE date = %s AND time_slot = %s AND status IN ('confirmed', 'pending_cancellation')""",
-                (target_date.isoformat(), time_slot)
-            )
-            if cur.fetchone():
-                return False
-
-        return True
-    finally:
-        conn.close()
-
-def can_book_client(phone, target_date):
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-            # Один раз в день
-            cur.execute(
-                "SELECT 1 FROM bookings WHERE phone = %s AND date = %s AND status = 'confirmed'",
-                (phone, target_date.isoformat())
-            )
-            if cur.fetchone():
-                return False, "You are already booked for this day."
-
-            # Макс. 3 в неделю
-            monday = target_date - timedelta(days=target_date.weekday())
-            sunday = monday + timedelta(days=6)
-            cur.execute(
-                """SELECT COUNT(*) FROM bookings 
-                   WHERE phone = %s AND date BETWEEN %s AND %s AND status = 'confirmed'""",
-                (phone, monday.isoformat(), sunday.isoformat())
-            )
-            count = cur.fetchone()['count']
-            if count >= 3:
-                return False, "Maximum 3 sessions per week."
-
-        return True, ""
-    finally:
-        conn.close()
-
-@app.route('/')
+    except Exception:
+        conn.rollback()
+        raise
+
+    if row['booking_id'] is not None:
+        return row['booking_id'], ""
+    slot_key, week_key = rejection_keys(phone, target_date, slot_id)
+    if row['blocked'] or row['taken']:
+        booking_rejections.put(slot_key, 0, "Slot is not available")
+        return None, "Slot is not available"
+    if row['same_day']:
+        return None, "You are already booked for this day."
+    if row['week_count'] >= WEEKLY_LIMIT:
+        booking_rejections.put(week_key, 0, "Maximum 3 sessions per week.")
+        return None, "Maximum 3 sessions per week."
+    # Слот заняли параллельно (сработал уникальный индекс)
+    booking_rejections.put(slot_key, 0, "Slot is not available")
+    return None, "Slot is not available"
+
+@bp.route('/')
 def index():
-    now = datetime.now()
-    if now.weekday() == 6 and now.hour >= 10:
-        cleanup_old_bookings()
+    week_dates = get_current_week_dates()
+    version, changed_at = availability_cache.current_version(load_data_version)
+    # ETag слабый: варианты gzip/br/без сжатия — одна и та же страница
+    etag = '%s-%d' % (week_dates[0].isoformat(), version)
+    if request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+        response.set_etag(etag, weak=True)
+        response.vary.add('Accept-Encoding')
+        return response
+
+    def render():
+        week_slots, availability = cached_week_availability(week_dates, version)
+        days = []
+        for d in week_dates:
+            slots = [{'id': s.id, 'time': s.label, 'available': availability[d][s.id]} for s in week_slots]
+            days.append({
+                'date': d,
+                'formatted': d.strftime('%A, %b %d'),
+                'slots': slots
+            })
+        return render_template('index.html', days=days, version=version,
+                               week=week_dates[0].isoformat(), events_url=EVENTS_URL,
+                               slot_ids=','.join(str(s.id) for s in week_slots))
+
+    response = cached_page(('index', week_dates[0]), version, render)
+    response.set_etag(etag, weak=True)
+    response.last_modified = changed_at
+    response.cache_control.no_cache = True
+    return response
 
+# Компактная сетка недели: {"week", "version", "slots": [{"id", "time"}], "days", "free": [маска по дням]}.
+# ?since=<version> — только изменившиеся дни: {"week", "version", "since", "changed": {дата: маска}}
+@bp.route('/api/availability')
+def api_availability():
     week_dates = get_current_week_dates()
-    days = []
-    for d in week_dates:
-        slots = []
-        for slot in SLOTS:
-            available = is_slot_available(d, slot)
-            slots.append({'time': slot, 'available': available})
-        days.append({
-            'date': d,
-            'formatted': d.strftime('%A, %b %d'),
-            'slots': slots
-        })
-    return render_template('index.html', days=days)
+    version, changed_at = availability_cache.current_version(load_data_version)
+    etag = 'api-%s-%d' % (week_dates[0].isoformat(), version)
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+        response.set_etag(etag)
+        return response
+
+    week_slots, masks = week_masks(week_dates, version)
+    payload = {'week': week_dates[0].isoformat(), 'version': version}
+    since = request.args.get('since', type=int)
+    old = availability_masks.get((week_dates[0], since), since) if since is not None else None
+    if old is not None and old[0] == week_slots:
+        payload['since'] = since
+        payload['changed'] = {
+            d.isoformat(): mask for d, mask, was in zip(week_dates, masks, old[1]) if mask != was
+        }
+    else:
+        # Снимка этой версии нет (другой воркер, вытеснен, новая неделя, сменился каталог) — отдаём всё
+        payload['slots'] = slots_payload(week_slots)
+        payload['days'] = [d.isoformat() for d in week_dates]
+        payload['free'] = masks
+
+    response = jsonify(payload)
+    response.set_etag(etag)
+    response.last_modified = changed_at
+    response.cache_control.no_cache = True
+    return response
 
-@app.route('/book', methods=['POST'])
+@bp.route('/book', methods=['POST'])
 def book():
     name = request.form['name'].strip()
     phone = request.form['phone'].strip()
     date_str = request.form['date']
-    time_slot = request.form['time_slot']
+    slot_id = request.form.get('slot_id', type=int)
 
     if not name or not phone:
         return "Name and phone are required", 400
@@ -186,48 +303,43 @@ def book():
         target_date = datetime.fromisoformat(date_str).date()
     except:
         return "Invalid date", 400
-
-    if not is_slot_available(target_date, time_slot):
-        return "Slot is not available", 400
-
-    can, msg = can_book_client(phone, target_date)
-    if not can:
-        return msg, 400
-
-    conn = get_db_connection()
+    if slot_id is None:
+        return "Invalid slot", 400
+
+    # Сначала то, что не требует БД: частота попыток, известный отказ, свободное место в очереди
+    for limiter, key in ((ip_limiter, request.remote_addr), (phone_limiter, phone)):
+        wait = limiter.hit(key)
+        if wait:
+            response = make_response("Too many booking attempts, please try again shortly.", 429)
+            response.headers['Retry-After'] = admission.retry_after(wait)
+            return response
+
+    for key in rejection_keys(phone, target_date, slot_id):
+        msg = booking_rejections.get(key, 0)
+        if msg is not None:
+            return msg, 400
+
+    if not booking_gate.acquire():
+        response = make_response("Booking is busy right now, please try again.", 503)
+        response.headers['Retry-After'] = admission.retry_after(booking_gate.timeout)
+        return response
     try:
-        with conn.cursor() as cur:
-            cur.execute(
-                """INSERT INTO bookings (name, phone, date, time_slot, status)
-                   VALUES (%s, %s, %s, %s, 'confirmed')""",
-                (name, phone, date_str, time_slot)
-            )
-            conn.commit()
+        booking_id, msg = create_booking(name, phone, target_date, slot_id)
     finally:
-        conn.close()
+        booking_gate.release()
+    if booking_id is None:
+        return msg, 400
 
-    response = make_response(redirect(url_for('success')))
+    response = make_response(redirect(url_for('.success')))
     response.set_cookie('user_phone', phone, max_age=7*24*60*60)
     return response
 
-@app.route('/success')
+@bp.route('/success')
 def success():
-    return """
-    <div style="font-family: Poppins, sans-serif; background: #1a1a2e; color: white; min-height: 100vh; 
-                display: flex; align-items: center; justify-content: center; text-align: center; padding: 20px;">
-        <div>
-            <h1 style="font-size: 2.5em; margin-bottom: 20px; color: #00f5d4;">Booked!</h1>
-            <p>Your English session is confirmed.</p>
-            <a href="/my-bookings" style="display: inline-block; margin-top: 20px; padding: 12px 24px; 
-               background: #00f5d4; color: #0f172a; text-decoration: none; border-radius: 8px; font-weight: bold;">
-                View My Bookings
-            </a>
-        </div>
-    </div>
-    """
+    return render_template('success.html')
 
 # === User: My Bookings ===
-@app.route('/my-bookings', methods=['GET', 'POST'])
+@bp.route('/my-bookings', methods=['GET', 'POST'])
 def my_bookings():
     if request.method == 'POST':
         phone = request.form['phone'].strip()
@@ -235,35 +347,26 @@ def my_bookings():
         phone = request.cookies.get('user_phone')
 
     if phone:
-        conn = get_db_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """SELECT id, date, time_slot, status FROM bookings 
-                       WHERE phone = %s AND date >= %s ORDER BY date""",
-                    (phone, date.today().isoformat())
-                )
-                bookings = cur.fetchall()
-            masked = mask_phone(phone)
-            return render_template('my_bookings.html', bookings=bookings, phone=masked)
-        finally:
-            conn.close()
+        bookings = [
+            (b['id'], b['date'], b['time_slot'], b['status'])
+            for b in get_storage().client_bookings(get_db(), phone, date.today())
+        ]
+        masked = mask_phone(phone)
+        return render_template('my_bookings.html', bookings=bookings, phone=masked)
     
     return render_template('check_bookings.html')
 
-@app.route('/cancel/<int:booking_id>', methods=['POST'])
+@bp.route('/cancel/<int:booking_id>', methods=['POST'])
 def cancel_booking(booking_id):
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("UPDATE bookings SET status = 'pending_cancellation' WHERE id = %s", (booking_id,))
-            conn.commit()
-    finally:
-        conn.close()
-    return redirect(url_for('my_bookings'))
+    conn = get_db()
+    get_storage().set_status(conn, booking_id, 'pending_cancellation')
+    commit_changes(conn)
+    # Запрос отмены уже возвращает место в недельном лимите (client_week_counts)
+    release_rejections()
+    return redirect(url_for('.my_bookings'))
 
 # === Admin Panel ===
-@app.route('/admin', methods=['GET', 'POST'])
+@bp.route('/admin', methods=['GET', 'POST'])
 def admin():
     if request.method == 'POST':
         if request.form.get('password') == 'adasiniqizi':
@@ -272,268 +375,354 @@ def admin():
             return "Invalid password", 403
 
     if not session.get('admin'):
-        return '''
-        <form method="post" style="font-family: Poppins, sans-serif; max-width: 400px; margin: 100px auto; 
-                padding: 20px; background: #16213e; border-radius: 10px; color: white;">
-            <h2>Admin Login</h2>
-            <input type="password" name="password" placeholder="Password" required 
-                   style="width: 100%; padding: 10px; margin: 10px 0; border-radius: 5px; 
-                          border: 1px solid #334155; background: #0f3460; color: white;">
-            <button type="submit" style="width: 100%; padding: 10px; background: #00f5d4; 
-                    color: #0f172a; border: none; border-radius: 5px; font-weight: bold;">Login</button>
-        </form>
-        '''
-
-    today = date.today().isoformat()
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-            # Сегодняшние записи
-            cur.execute("""
-                SELECT id, name, phone, time_slot, status, attended FROM bookings
-                WHERE date = %s 
-                ORDER BY time_slot
-            """, (today,))
-            today_bookings = cur.fetchall()
-
-            # Все записи недели
-            cur.execute("""
-                SELECT id, name, phone, date, time_slot, status, attended FROM bookings
-                WHERE date >= %s ORDER BY date, time_slot
-            """, (date.today().isoformat(),))
-            bookings = cur.fetchall()
-
-            # Расписание
-            dates = get_current_week_dates()
-            schedule_data = []
-            for d in dates:
-                cur.execute(
-                    "SELECT time_slot FROM availability_override WHERE date = %s",
-                    (d.isoformat(),)
-                )
-                overrides = cur.fetchall()
-                disabled_slots = set(row['time_slot'] for row in overrides if row['time_slot'] is not None)
-                full_day_disabled = any(row['time_slot'] is None for row in overrides)
-                schedule_data.append({
-                    'date': d,
-                    'full_disabled': full_day_disabled,
-                    'disabled_slots': disabled_slots
-                })
-
-        masked_today = []
-        for b in today_bookings:
-            masked_today.append((
-                b['id'], b['name'], mask_phone(b['phone']), b['time_slot'],
-                b['status'], b['attended']
-            ))
-
-        masked_bookings = []
-        for b in bookings:
-            masked_bookings.append((
-                b['id'], b['name'], mask_phone(b['phone']), b['date'],
-                b['time_slot'], b['status'], b['attended']
-            ))
-
-        return render_template(
-            'admin.html',
-            today_bookings=masked_today,
-            bookings=masked_bookings,
-            schedule_data=schedule_data,
-            slots=SLOTS,
-            today=date.today().strftime('%A, %b %d')
-        )
-    finally:
-        conn.close()
+        return render_template('admin_login.html')
+
+    # Первая отрисовка не зависит от объёма данных: сегодняшние записи (не больше слотов дня)
+    # и сетка недели; список всех записей страница подгружает постранично с /admin/bookings
+    store = get_storage()
+    conn = get_db()
+    today_bookings = store.bookings_on(conn, date.today())
+
+    # Расписание: слоты недели из кэша сетки, исключения и правила — по запросу
+    dates = get_current_week_dates()
+    version, _ = availability_cache.current_version(load_data_version)
+    week_slots, _ = cached_week_availability(dates, version)
+    disabled_days = set()
+    disabled_slots = {}
+    for row in store.overrides(conn, dates[0], dates[-1]):
+        if row['slot_id'] is None:
+            disabled_days.add(row['date'])
+        else:
+            disabled_slots.setdefault(row['date'], set()).add(row['slot_id'])
+    rules = rules_from_rows(store.schedule_rules(conn))
+    schedule_data = []
+    for d in dates:
+        slots = [s for s in week_slots if s.open_on(d)]
+        schedule_data.append({
+            'date': d,
+            'slots': slots,
+            'full_disabled': d in disabled_days,
+            'disabled_slots': disabled_slots.get(d, set()),
+            'rule_slots': rule_closed(rules, d, slots),
+        })
+
+    return render_template(
+        'admin.html',
+        today_bookings=today_bookings,
+        schedule_data=schedule_data,
+        schedule_start=dates[0],
+        schedule_end=dates[-1],
+        rules=rules,
+        weekdays=WEEKDAYS,
+        status_filters=ADMIN_STATUS_FILTERS,
+        today=date.today().strftime('%A, %b %d')
+    )
+
+def parse_cursor(value):
+    # Ключ последней строки страницы: YYYY-MM-DD,HH:MM,id
+    day, starts_at, booking_id = value.split(',')
+    return date.fromisoformat(day), datetime.strptime(starts_at, '%H:%M').time(), int(booking_id)
+
+def format_cursor(row):
+    return '%s,%s,%d' % (row['date'].isoformat(), row['starts_at'].strftime('%H:%M'), row['id'])
+
+@bp.route('/admin/bookings')
+def admin_bookings():
+    # Фрагмент таблицы записей с сегодняшнего дня: ?status=all|active|pending|cancelled, ?after=<ключ>
+    if not session.get('admin'):
+        return "Access denied", 403
 
-@app.route('/admin/update_schedule', methods=['POST'])
+    status = request.args.get('status', 'all')
+    if status not in ADMIN_STATUS_FILTERS:
+        return "Invalid status", 400
+    try:
+        after = parse_cursor(request.args['after']) if request.args.get('after') else None
+    except ValueError:
+        return "Invalid cursor", 400
+
+    def render():
+        rows = get_storage().bookings_page(get_db(), date.today(), after, ADMIN_STATUS_FILTERS[status],
+                                           ADMIN_PAGE_SIZE + 1)
+        next_url = None
+        if len(rows) > ADMIN_PAGE_SIZE:
+            rows = rows[:ADMIN_PAGE_SIZE]
+            next_url = url_for('.admin_bookings', status=status, after=format_cursor(rows[-1]))
+        return render_template('admin_bookings.html', bookings=rows, next_url=next_url)
+
+    version, _ = availability_cache.current_version(load_data_version)
+    return cached_page(('admin_bookings', date.today(), status, after), version, render)
+
+@bp.route('/admin/update_schedule', methods=['POST'])
 def update_schedule():
     if not session.get('admin'):
         return "Access denied", 403
 
-    conn = get_db_connection()
+    # Форма редактирует диапазон start..end: сохраняется только разница с исключениями этих дней
     try:
-        with conn.cursor() as cur:
-            cur.execute("DELETE FROM availability_override")
-            for key, value in request.form.items():
-                if key.startswith('disable_'):
-                    parts = key.replace('disable_', '').split('_')
-                    if len(parts) == 1:
-                        cur.execute("INSERT INTO availability_override (date, time_slot) VALUES (%s, NULL)", (parts[0],))
-                    elif len(parts) == 2:
-                        cur.execute("INSERT INTO availability_override (date, time_slot) VALUES (%s, %s)", (parts[0], parts[1]))
-            conn.commit()
-        return redirect(url_for('admin'))
-    finally:
-        conn.close()
+        dates = get_current_week_dates()
+        start = date.fromisoformat(request.form['start']) if request.form.get('start') else dates[0]
+        end = date.fromisoformat(request.form['end']) if request.form.get('end') else dates[-1]
+        submitted = set()
+        for key in request.form:
+            if not key.startswith('disable_'):
+                continue
+            day, _, slot = key[len('disable_'):].partition('_')
+            day = date.fromisoformat(day)
+            if start <= day <= end and (not slot or slot.isdigit()):
+                submitted.add((day, int(slot) if slot else None))
+    except ValueError:
+        return "Invalid schedule", 400
+    if end < start or (end - start).days > 31:
+        return "Invalid schedule range", 400
+
+    conn = get_db()
+    store = get_storage()
+    try:
+        stored = [(row['date'], row['slot_id']) for row in store.overrides(conn, start, end)]
+        # У выключенного целиком дня слоты в форме скрыты: их исключения остаются как были
+        closed_days = set(day for day, slot_id in submitted if slot_id is None)
+        submitted.update(entry for entry in stored if entry[0] in closed_days)
+        added, removed = override_diff(stored, submitted)
+        if added or removed:
+            store.change_overrides(conn, added, removed)
+            commit_changes(conn)
+            release_rejections()
+        else:
+            conn.rollback()
+    except Exception:
+        conn.rollback()
+        raise
+    return redirect(url_for('.admin'))
+
+@bp.route('/admin/rules', methods=['POST'])
+def add_rule():
+    # Повторяющееся правило: дни недели (weekday, можно несколько), окно from–to, срок действия
+    if not session.get('admin'):
+        return "Access denied", 403
+    try:
+        weekdays = sorted(set(int(d) for d in request.form.getlist('weekday')))
+        from_time = parse_time(request.form['from']) if request.form.get('from') else None
+        to_time = parse_time(request.form['to']) if request.form.get('to') else None
+        valid_from = date.fromisoformat(request.form['valid_from']) if request.form.get('valid_from') else None
+        valid_until = date.fromisoformat(request.form['valid_until']) if request.form.get('valid_until') else None
+    except ValueError:
+        return "Invalid rule", 400
+    if (not weekdays or not all(0 <= d <= 6 for d in weekdays)
+            or (from_time and to_time and to_time <= from_time)
+            or (valid_from and valid_until and valid_until < valid_from)):
+        return "Invalid rule", 400
+
+    conn = get_db()
+    get_storage().add_rules(conn, weekdays, from_time, to_time, valid_from, valid_until)
+    commit_changes(conn)
+    return redirect(url_for('.admin'))
+
+@bp.route('/admin/rules/<int:rule_id>/delete', methods=['POST'])
+def delete_rule(rule_id):
+    if not session.get('admin'):
+        return "Access denied", 403
+    conn = get_db()
+    get_storage().delete_rule(conn, rule_id)
+    commit_changes(conn)
+    release_rejections()
+    return redirect(url_for('.admin'))
 
-@app.route('/admin/set_attendance/<int:booking_id>/<int:status>', methods=['POST'])
+@bp.route('/admin/set_attendance/<int:booking_id>/<int:status>', methods=['POST'])
 def set_attendance(booking_id, status):
     if not session.get('admin'):
         return "Access denied", 403
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("UPDATE bookings SET attended = %s WHERE id = %s", (status, booking_id))
-            conn.commit()
-        return redirect(url_for('admin'))
-    finally:
-        conn.close()
+    conn = get_db()
+    get_storage().set_attendance(conn, booking_id, status)
+    commit_changes(conn)
+    return redirect(url_for('.admin'))
 
-@app.route('/admin/approve_cancel/<int:booking_id>', methods=['POST'])
+@bp.route('/admin/approve_cancel/<int:booking_id>', methods=['POST'])
 def approve_cancel(booking_id):
     if not session.get('admin'):
         return "Access denied", 403
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("UPDATE bookings SET status = 'cancelled' WHERE id = %s", (booking_id,))
-            conn.commit()
-        return redirect(url_for('admin'))
-    finally:
-        conn.close()
+    conn = get_db()
+    get_storage().set_status(conn, booking_id, 'cancelled')
+    commit_changes(conn)
+    release_rejections()
+    return redirect(url_for('.admin'))
 
-@app.route('/admin/reject_cancel/<int:booking_id>', methods=['POST'])
+@bp.route('/admin/reject_cancel/<int:booking_id>', methods=['POST'])
 def reject_cancel(booking_id):
     if not session.get('admin'):
         return "Access denied", 403
-    conn = get_db_connection()
+    conn = get_db()
+    get_storage().set_status(conn, booking_id, 'confirmed')
+    commit_changes(conn)
+    return redirect(url_for('.admin'))
+
+@bp.route('/admin/cancel/<int:booking_id>', methods=['POST'])
+def admin_cancel(booking_id):
+    # «Cancel Now» в списке записей — то же действие cancel, что и в /admin/batch (только confirmed)
+    if not session.get('admin'):
+        return "Access denied", 403
+    conn = get_db()
+    applied, _ = get_storage().apply_batch(conn, {'cancel': [booking_id]})
+    if applied['cancel']:
+        commit_changes(conn)
+        release_rejections()
+    else:
+        conn.rollback()
+    return redirect(url_for('.admin'))
+
+@bp.route('/admin/batch', methods=['POST'])
+def admin_batch():
+    # {"ops": [{"id": 12, "action": "present"}, ...]} -> результат по каждому элементу:
+    # ok, skipped (состояние записи не подходит), not_found, invalid, duplicate
+    if not session.get('admin'):
+        return "Access denied", 403
+
+    data = request.get_json(silent=True)
+    ops = data.get('ops') if isinstance(data, dict) else None
+    if not isinstance(ops, list) or not ops:
+        return "Expected JSON {\"ops\": [{\"id\": ..., \"action\": ...}]}", 400
+    if len(ops) > ADMIN_BATCH_MAX:
+        return "Too many operations (max %d)" % ADMIN_BATCH_MAX, 400
+
+    store = get_storage()
+    results = []
+    actions = {}
+    seen = set()
+    for op in ops:
+        booking_id = op.get('id') if isinstance(op, dict) else None
+        action = op.get('action') if isinstance(op, dict) else None
+        result = {'id': booking_id, 'action': action}
+        if (type(booking_id) is not int or not 0 < booking_id < 2**31
+                or not isinstance(action, str) or action not in store.BATCH_ACTIONS):
+            result['result'] = 'invalid'
+        elif booking_id in seen:
+            # Два действия над одной записью в одном запросе зависели бы от порядка UPDATE
+            result['result'] = 'duplicate'
+        else:
+            seen.add(booking_id)
+            actions.setdefault(action, []).append(booking_id)
+        results.append(result)
+
+    conn = get_db()
     try:
-        with conn.cursor() as cur:
-            cur.execute("UPDATE bookings SET status = 'confirmed' WHERE id = %s", (booking_id,))
-            conn.commit()
-        return redirect(url_for('admin'))
-    finally:
-        conn.close()
+        applied, existing = store.apply_batch(conn, actions) if actions else ({}, set())
+        count = sum(len(ids) for ids in applied.values())
+        if count:
+            commit_changes(conn)
+            if applied.get('approve') or applied.get('cancel'):
+                release_rejections()
+        else:
+            conn.rollback()
+    except Exception:
+        conn.rollback()
+        raise
+
+    for result in results:
+        if 'result' in result:
+            continue
+        if result['id'] in applied[result['action']]:
+            result['result'] = 'ok'
+        elif result['id'] in existing:
+            result['result'] = 'skipped'
+        else:
+            result['result'] = 'not_found'
+    return jsonify({'applied': count, 'results': results})
 
-@app.route('/admin/export_excel')
+@bp.route('/admin/export_excel')
 def export_excel():
     if not session.get('admin'):
         return "Access denied", 403
 
-    from io import BytesIO
-    from flask import send_file
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, Alignment, PatternFill
-
-    conn = get_db_connection()
+    # ?format=csv|xlsx, ?from=YYYY-MM-DD, ?to=YYYY-MM-DD
+    fmt = request.args.get('format', 'xlsx')
+    if fmt not in ('xlsx', 'csv'):
+        return "Invalid format", 400
     try:
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT name, phone, date, time_slot, status,
-                       CASE WHEN attended = 1 THEN 'Present'
-                            WHEN attended = 0 THEN 'Absent'
-                            ELSE 'Not marked' END as attendance
-                FROM bookings
-                WHERE date >= %s
-                ORDER BY date, time_slot
-            """, (date.today().isoformat(),))
-            records = cur.fetchall()
-
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Bookings Report"
-
-        headers = ["Name", "Phone", "Date", "Time Slot", "Status", "Attendance"]
-        ws.append(headers)
-
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="4F46E5", end_color="4F46E5", fill_type="solid")
-        for col in range(1, len(headers) + 1):
-            ws.cell(row=1, column=col).font = header_font
-            ws.cell(row=1, column=col).fill = header_fill
-            ws.cell(row=1, column=col).alignment = Alignment(horizontal="center")
-
-        for row in records:
-            ws.append([row['name'], row['phone'], row['date'], row['time_slot'], row['status'], row['attendance']])
-
-        for col in ws.columns:
-            max_length = 0
-            column = col[0].column_letter
-            for cell in col:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 30)
-            ws.column_dimensions[column].width = adjusted_width
-
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name='english_bookings_report.xlsx'
-        )
-    finally:
-        conn.close()
+        start = date.fromisoformat(request.args['from']) if request.args.get('from') else date.today()
+        end = date.fromisoformat(request.args['to']) if request.args.get('to') else None
+    except ValueError:
+        return "Invalid date", 400
+
+    store = get_storage()
+    conn = get_db()
+    batches = export.iter_rows(store, conn, start, end)
+    if fmt == 'csv':
+        body = export.stream_csv(batches)
+        mimetype = 'text/csv'
+    else:
+        body = export.stream_xlsx(batches, export.column_widths(store, conn, start, end))
+        mimetype = export.XLSX_MIMETYPE
 
-@app.route('/admin/reports')
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = 'attachment; filename=english_bookings_report.' + fmt
+    return response
+
+@bp.route('/admin/reports')
 def admin_reports():
     if not session.get('admin'):
-        return redirect(url_for('admin'))
+        return redirect(url_for('.admin'))
 
-    conn = get_db_connection()
+    # ?range=week|month|custom, ?date=YYYY-MM-DD (для week/month), ?from=&to= (для custom)
+    kind = request.args.get('range', 'week')
     try:
-        with conn.cursor() as cur:
-            today = date.today()
-            week_start = today - timedelta(days=today.weekday())
-            week_end = week_start + timedelta(days=6)
-
-            total_slots = 6 * len(SLOTS)
-            cur.execute("""
-                SELECT COUNT(*) as cnt FROM bookings 
-                WHERE date BETWEEN %s AND %s AND status IN ('confirmed', 'pending_cancellation')
-            """, (week_start.isoformat(), week_end.isoformat()))
-            booked = cur.fetchone()['cnt']
-
-            cur.execute("SELECT COUNT(*) as cnt FROM bookings WHERE attended = 1")
-            present = cur.fetchone()['cnt']
-
-            cur.execute("SELECT COUNT(*) as cnt FROM bookings WHERE attended = 0")
-            absent = cur.fetchone()['cnt']
-
-            cur.execute("""
-                SELECT name, phone, COUNT(*) as cnt 
-                FROM bookings 
-                GROUP BY phone, name
-                ORDER BY cnt DESC 
-                LIMIT 5
-            """)
-            top_students = cur.fetchall()
-
-            load_by_day = []
-            for i in range(6):
-                d = week_start + timedelta(days=i)
-                cur.execute("""
-                    SELECT COUNT(*) as cnt FROM bookings 
-                    WHERE date = %s AND status IN ('confirmed', 'pending_cancellation')
-                """, (d.isoformat(),))
-                cnt = cur.fetchone()['cnt']
-                load_by_day.append({
-                    'day': d.strftime('%A'),
-                    'count': cnt,
-                    'percent': round(cnt / len(SLOTS) * 100)
-                })
-
+        anchor = date.fromisoformat(request.args['date']) if request.args.get('date') else date.today()
+        start = date.fromisoformat(request.args['from']) if request.args.get('from') else None
+        end = date.fromisoformat(request.args['to']) if request.args.get('to') else None
+        start, end = reports.report_range(kind, anchor, start, end)
+    except ValueError:
+        return "Invalid report range", 400
+
+    version, _ = report_cache.current_version(load_data_version)
+
+    def render():
+        report = report_cache.get((start, end), version)
+        if report is None:
+            store = get_storage()
+            conn = get_db()
+            catalog = SlotCatalog.from_rows(store.slot_catalog(conn))
+            report = reports.build_report(store, conn, start, end, catalog)
+            report_cache.put((start, end), version, report)
         return render_template('admin_reports.html',
-            total_slots=total_slots,
-            booked=booked,
-            load_percent=round(booked / total_slots * 100),
-            present=present,
-            absent=absent,
-            top_students=top_students,
-            load_by_day=load_by_day,
-            week_start=week_start.strftime('%b %d'),
-            week_end=week_end.strftime('%b %d')
+            range_kind=kind,
+            range_start=start,
+            range_end=end,
+            week_start=start.strftime('%b %d'),
+            week_end=end.strftime('%b %d'),
+            **report
         )
-    finally:
-        conn.close()
+
+    return cached_page(('reports', kind, start, end), version, render)
+
+@bp.route('/admin/pool_stats')
+def admin_pool_stats():
+    if not session.get('admin'):
+        return "Access denied", 403
+    return jsonify(db.pool_stats())
+
+@bp.route('/admin/metrics')
+def admin_metrics():
+    if not session.get('admin') and not metrics.token_allowed(request):
+        return "Access denied", 403
+    body = request_metrics.render(
+        pool=db.pool_stats(),
+        caches={
+            'availability': availability_cache.stats(),
+            'availability_masks': availability_masks.stats(),
+            'report': report_cache.stats(),
+            'pages': page_cache.stats(),
+            'book_rejections': booking_rejections.stats(),
+        },
+        limiters={'phone': phone_limiter.stats(), 'ip': ip_limiter.stats()},
+        gate=booking_gate.stats(),
+    )
+    return Response(body, mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
+    # Сервер разработки; в продакшене — gunicorn -c gunicorn.conf.py wsgi:app
+    app = create_app()
     init_db()
+    if os.environ.get("EVENTS_PORT"):
+        # SSE в том же процессе, в отдельном потоке с asyncio
+        import events
+        events.start_in_thread(get_storage())
     port = int(os.environ.get("PORT", 5000))
     app.run(host='0.0.0.0', port=port)
\ No newline at end of file
@@ -0,0 +1,137 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import sys
+from collections import namedtuple
+
+from flask import request, send_from_directory
+
+from cache import brotli, choose_encoding
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+# Имя файла меняется вместе с содержимым, поэтому браузер может не перепроверять его год
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Собранный файл: путь относительно static/ и заранее сжатые варианты {кодировка: путь}
+Asset = namedtuple('Asset', 'path encoded mimetype')
+
+def minify_css(text):
+    # Комментарии и пробелы вокруг { } ; , : — значимые пробелы в селекторах и calc() не трогаются
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,])\s*', r'\1', text)
+    text = re.sub(r':\s+', ':', text)
+    return text.replace(';}', '}').strip() + '\n'
+
+def minify_js(text):
+    # Осторожно, без разбора JS: отступы, пустые строки и комментарии // в конце строки.
+    # Переводы строк остаются — на них полагается автоматическая вставка ;
+    lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('//'):
+            continue
+        lines.append(re.sub(r'(?<=[;{},])\s+//\s.*$', '', line))
+    return '\n'.join(lines) + '\n'
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+def _write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def build(static_dir=STATIC_DIR):
+    # static/name.ext -> static/dist/name.<hash>.ext (+ .gz/.br) и manifest.json {name.ext: dist/...}
+    dist = os.path.join(static_dir, DIST_DIR)
+    os.makedirs(dist, exist_ok=True)
+    manifest = {}
+    written = set()
+    for name in sorted(os.listdir(static_dir)):
+        base, ext = os.path.splitext(name)
+        minify = MINIFIERS.get(ext)
+        if minify is None or not os.path.isfile(os.path.join(static_dir, name)):
+            continue
+        with open(os.path.join(static_dir, name), encoding='utf-8') as f:
+            data = minify(f.read()).encode('utf-8')
+        target = '%s.%s%s' % (base, hashlib.sha256(data).hexdigest()[:12], ext)
+        _write(os.path.join(dist, target), data)
+        _write(os.path.join(dist, target + '.gz'), gzip.compress(data, compresslevel=9, mtime=0))
+        written.update((target, target + '.gz'))
+        if brotli is not None:
+            _write(os.path.join(dist, target + '.br'), brotli.compress(data, quality=11))
+            written.add(target + '.br')
+        manifest[name] = '%s/%s' % (DIST_DIR, target)
+        print(f"[ASSETS] {name} -> {manifest[name]} ({len(data)} bytes)")
+
+    # Прежние сборки больше не нужны: страницы ссылаются только на имена из нового манифеста
+    for name in os.listdir(dist):
+        if name not in written and name != MANIFEST:
+            os.remove(os.path.join(dist, name))
+    with open(os.path.join(dist, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+def load_manifest(static_dir=STATIC_DIR):
+    try:
+        with open(os.path.join(static_dir, DIST_DIR, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def load_assets(static_dir, manifest):
+    assets = {}
+    for path in manifest.values():
+        encoded = {encoding: path + suffix for encoding, suffix in (('br', '.br'), ('gzip', '.gz'))
+                   if os.path.isfile(os.path.join(static_dir, path + suffix))}
+        assets[path] = Asset(path, encoded, mimetypes.guess_type(path)[0] or 'application/octet-stream')
+    return assets
+
+def init_app(app):
+    # Без сборки (python assets.py build) статика отдаётся как раньше, по исходным именам
+    manifest = load_manifest(app.static_folder)
+    if not manifest:
+        return
+    assets = load_assets(app.static_folder, manifest)
+    print(f"[ASSETS] Serving {len(assets)} fingerprinted assets")
+
+    @app.url_defaults
+    def fingerprinted_static(endpoint, values):
+        # url_for('static', filename='style.css') -> /static/dist/style.<hash>.css
+        if endpoint == 'static' and values.get('filename') in manifest:
+            values['filename'] = manifest[values['filename']]
+
+    send_static = app.view_functions['static']
+
+    def static(filename):
+        asset = assets.get(filename)
+        if asset is None:
+            return send_static(filename=filename)
+        # Готовый .br/.gz с диска вместо сжатия на лету
+        encoding = choose_encoding(asset, request.accept_encodings)
+        response = send_from_directory(app.static_folder, asset.encoded[encoding] if encoding else asset.path,
+                                       mimetype=asset.mimetype, max_age=IMMUTABLE_MAX_AGE)
+        if encoding:
+            response.content_encoding = encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    app.view_functions['static'] = static
+
+def main(argv):
+    if len(argv) < 2 or argv[1] != 'build':
+        print("Usage: python assets.py build")
+        return 2
+    manifest = build()
+    print(f"[ASSETS] Built {len(manifest)} assets into static/{DIST_DIR}"
+          f"{'' if brotli is not None else ' (brotli is not installed, gzip only)'}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,556 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import threading
+import http.client
+from datetime import date, timedelta, datetime, timezone
+from urllib.parse import urlsplit, urlencode
+
+# Бенчмарку не нужна фоновая очистка: она удалила бы засеянные прошлые недели
+os.environ.setdefault("MAINTENANCE_INTERVAL", "0")
+# Все студенты бенчмарка приходят с одного адреса, а проверяется сама транзакция записи:
+# лимиты частоты и очередь /book не должны отклонять всплеск до БД
+os.environ.setdefault("BOOK_IP_RATE", "0")
+os.environ.setdefault("BOOK_PHONE_RATE", "0")
+os.environ.setdefault("BOOK_CONCURRENCY", "1000")
+os.environ.setdefault("BOOK_QUEUE", "1000")
+
+import app as booking_app
+import db
+import export
+import reports
+from schedule import load_week
+from slots import SlotCatalog
+
+SLOT_RE = re.compile(r'class="slot available"\s+data-date="([\d-]+)"\s+data-slot="(\d+)"')
+VERSION_RE = re.compile(r'data-week="([\d-]+)" data-version="(\d+)" data-slots="([\d,]*)"')
+QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+
+# Приложение для прогона в процессе и микробенчмарков; клиенты — test_client или HTTP (--url)
+flask_app = None
+base_url = None
+
+# Счётчики текущего запроса: запросы к БД и выдачи соединений из пула
+_local = threading.local()
+
+def _reset_counters():
+    _local.queries = 0
+    _local.connections = 0
+
+def _on_query(sql, seconds):
+    _local.queries = getattr(_local, 'queries', 0) + 1
+
+def instrument():
+    booking_app.get_storage().listeners.append(_on_query)
+    pool = db.get_pool()
+    getconn = pool.getconn
+
+    def counting_getconn():
+        _local.connections = getattr(_local, 'connections', 0) + 1
+        return getconn()
+    pool.getconn = counting_getconn
+
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(p / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+def student_phone(i):
+    return '+99890%07d' % i
+
+
+# === Данные ===
+def seed(store, conn, students, weeks, future_weeks, overrides, rnd):
+    # Прошлые и будущие недели заполнены, текущая свободна — её разбирают в burst
+    this_week = booking_app.get_current_week_dates()
+    monday = this_week[0]
+    week_starts = [monday - timedelta(weeks=w) for w in range(weeks, 0, -1)]
+    week_starts += [monday + timedelta(weeks=w) for w in range(1, future_weeks + 1)]
+
+    catalog = SlotCatalog.from_rows(store.slot_catalog(conn))
+    rows = []
+    for start in week_starts:
+        days = [start + timedelta(days=d) for d in range(7)]
+        cells = [(day, slot.id) for day in days for slot in catalog.for_day(day)]
+        rnd.shuffle(cells)
+        per_week = {}
+        per_day = set()
+        for day, slot in cells:
+            student = rnd.randrange(students)
+            if per_week.get(student, 0) >= booking_app.WEEKLY_LIMIT or (student, day) in per_day:
+                continue
+            per_week[student] = per_week.get(student, 0) + 1
+            per_day.add((student, day))
+            if day < monday:
+                status = rnd.choices(['confirmed', 'cancelled'], [9, 1])[0]
+                attended = rnd.choice([1, 1, 1, 0]) if status == 'confirmed' else None
+            else:
+                status, attended = 'confirmed', None
+            rows.append((student, day.isoformat(), slot, status, attended))
+
+    blocked = []
+    for day, slot in rnd.sample([(d, s.id) for d in this_week for s in catalog.for_day(d)], overrides):
+        blocked.append((day, slot))
+
+    with store.cursor(conn) as cur:
+        for table in ('bookings', 'availability_override', 'daily_stats', 'student_daily_stats',
+                      'client_week_counts', 'clients'):
+            cur.execute("DELETE FROM " + table)
+        cur.execute("UPDATE rollup_state SET cleaned_through = NULL WHERE id = 1")
+        for i in range(0, students, 500):
+            chunk = range(i, min(i + 500, students))
+            cur.execute(
+                "INSERT INTO clients (phone, name) VALUES " + ", ".join(["(%s, %s)"] * len(chunk)),
+                [value for student in chunk for value in (student_phone(student), 'Student %d' % student)]
+            )
+        cur.execute("SELECT id, phone FROM clients")
+        client_ids = {row['phone']: row['id'] for row in cur.fetchall()}
+        for i in range(0, len(rows), 500):
+            chunk = [(client_ids[student_phone(row[0])],) + row[1:] for row in rows[i:i + 500]]
+            cur.execute(
+                "INSERT INTO bookings (client_id, date, slot_id, status, attended) VALUES "
+                + ", ".join(["(%s, %s, %s, %s, %s)"] * len(chunk)),
+                [value for row in chunk for value in row]
+            )
+    store.change_overrides(conn, blocked, [])
+    booking_app.commit_changes(conn)
+    return {'bookings': len(rows), 'overrides': len(blocked), 'students': students,
+            'weeks': weeks, 'future_weeks': future_weeks,
+            'from': week_starts[0].isoformat() if week_starts else monday.isoformat()}
+
+def has_bookings(store, conn):
+    with store.cursor(conn) as cur:
+        cur.execute("SELECT COUNT(*) AS n FROM bookings")
+        n = cur.fetchone()['n']
+    conn.rollback()
+    return n > 0
+
+def check_integrity(store, conn, week):
+    # Гонки записи не должны дать два активных бронирования слота или больше лимита в неделю
+    params = (week[0].isoformat(), week[-1].isoformat())
+    with store.cursor(conn) as cur:
+        cur.execute("""
+            SELECT COUNT(*) AS n FROM (
+                SELECT date, slot_id FROM bookings
+                WHERE date BETWEEN %s AND %s AND status IN ('confirmed', 'pending_cancellation')
+                GROUP BY date, slot_id HAVING COUNT(*) > 1
+            ) dup
+        """, params)
+        double_booked = cur.fetchone()['n']
+        cur.execute("""
+            SELECT COUNT(*) AS n FROM (
+                SELECT client_id FROM bookings
+                WHERE date BETWEEN %s AND %s AND status = 'confirmed'
+                GROUP BY client_id HAVING COUNT(*) > %s
+            ) over_quota
+        """, params + (booking_app.WEEKLY_LIMIT,))
+        over_quota = cur.fetchone()['n']
+        # Недельные счётчики обновляются триггером в той же транзакции, что и запись
+        cur.execute("""
+            SELECT COUNT(*) AS n FROM (
+                SELECT client_id FROM (
+                    SELECT client_id, confirmed AS n FROM client_week_counts WHERE week_start = %s
+                    UNION ALL
+                    SELECT client_id, -COUNT(*) FROM bookings
+                    WHERE date BETWEEN %s AND %s AND status = 'confirmed'
+                    GROUP BY client_id
+                ) counts
+                GROUP BY client_id HAVING SUM(n) <> 0
+            ) drift
+        """, (params[0],) + params)
+        counter_drift = cur.fetchone()['n']
+        cur.execute("""
+            SELECT COUNT(*) AS n FROM bookings
+            WHERE date BETWEEN %s AND %s AND status IN ('confirmed', 'pending_cancellation')
+        """, params)
+        booked = cur.fetchone()['n']
+    conn.rollback()
+    return {'double_booked_slots': double_booked, 'over_quota_students': over_quota,
+            'week_counter_drift': counter_drift, 'week_booked': booked}
+
+
+# === Нагрузка ===
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+
+    def request(self, client, label, method, url, **kwargs):
+        _reset_counters()
+        start = time.perf_counter()
+        response = client.open(url, method=method, **kwargs)
+        body = response.get_data()  # дочитываем потоковые ответы (экспорт)
+        elapsed = time.perf_counter() - start
+        if base_url:
+            # Сервер в другом процессе: число запросов к БД — из Server-Timing (у экспорта — до тела)
+            match = QUERIES_RE.search(response.headers.get('Server-Timing', ''))
+            queries, connections = (int(match.group(1)) if match else 0), 0
+        else:
+            queries, connections = _local.queries, _local.connections
+        sample = (elapsed, response.status_code, queries, connections, len(body))
+        with self._lock:
+            self.samples.setdefault(label, []).append(sample)
+        return response, body
+
+    def summary(self, duration):
+        routes = {}
+        total = 0
+        for label, samples in sorted(self.samples.items()):
+            latencies = [s[0] * 1000 for s in samples]
+            statuses = {}
+            for s in samples:
+                statuses[str(s[1])] = statuses.get(str(s[1]), 0) + 1
+            total += len(samples)
+            routes[label] = {
+                'count': len(samples),
+                'errors': sum(1 for s in samples if s[1] >= 500),
+                'statuses': statuses,
+                'mean_ms': round(sum(latencies) / len(latencies), 3),
+                'p50_ms': round(percentile(latencies, 50), 3),
+                'p95_ms': round(percentile(latencies, 95), 3),
+                'p99_ms': round(percentile(latencies, 99), 3),
+                'max_ms': round(max(latencies), 3),
+                'queries_per_request': round(sum(s[2] for s in samples) / len(samples), 3),
+                'max_queries': max(s[2] for s in samples),
+                'connections_per_request': (None if base_url else
+                                            round(sum(s[3] for s in samples) / len(samples), 3)),
+                'bytes_per_request': int(sum(s[4] for s in samples) / len(samples)),
+            }
+        return {
+            'duration_s': round(duration, 3),
+            'requests': total,
+            'throughput_rps': round(total / duration, 1) if duration else None,
+            'routes': routes,
+        }
+
+class HttpResponse:
+    def __init__(self, status, headers, body):
+        self.status_code = status
+        self.headers = headers
+        self._body = body
+
+    def get_data(self):
+        return self._body
+
+class HttpClient:
+    # Интерфейс как у test_client (open -> ответ), keep-alive соединение и свои cookie
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=120)
+        self.cookies = {}
+
+    def open(self, url, method='GET', headers=None, data=None):
+        headers = dict(headers or {})
+        body = None
+        if data is not None:
+            body = urlencode(data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        if self.cookies:
+            headers['Cookie'] = '; '.join('%s=%s' % item for item in self.cookies.items())
+        for attempt in range(2):
+            try:
+                self.conn.request(method, url, body=body, headers=headers)
+                response = self.conn.getresponse()
+                payload = response.read()
+                break
+            except (http.client.RemoteDisconnected, ConnectionError):
+                # Сервер закрыл keep-alive соединение — открываем заново
+                self.conn.close()
+                if attempt:
+                    raise
+        for cookie in response.headers.get_all('Set-Cookie') or []:
+            name, _, rest = cookie.partition('=')
+            self.cookies[name.strip()] = rest.split(';', 1)[0]
+        return HttpResponse(response.status, response.headers, payload)
+
+def new_client(admin=False):
+    client = HttpClient(base_url) if base_url else flask_app.test_client()
+    if admin:
+        client.open('/admin', method='POST', data={'password': 'adasiniqizi'})
+    return client
+
+class GridClient:
+    # Как static/script.js: страница один раз, дальше — дельты /api/availability
+    def __init__(self, recorder, client):
+        self.recorder = recorder
+        self.client = client
+        self.free = {}     # дата -> множество свободных слотов
+        self.version = None
+        self.etag = None
+
+    def load_page(self, etag=None):
+        headers = {'If-None-Match': etag} if etag else {}
+        response, body = self.recorder.request(self.client, 'GET /', 'GET', '/', headers=headers)
+        if response.status_code == 200:
+            html = body.decode('utf-8')
+            match = VERSION_RE.search(html)
+            self.version = int(match.group(2))
+            self.etag = '"api-%s-%d"' % (match.group(1), self.version)
+            self.slot_ids = [int(i) for i in match.group(3).split(',') if i]
+            self.free = {}
+            for d, slot_id in SLOT_RE.findall(html):
+                self.free.setdefault(d, set()).add(int(slot_id))
+        return response
+
+    def poll(self):
+        response, body = self.recorder.request(
+            self.client, 'GET /api/availability', 'GET', '/api/availability?since=%d' % self.version,
+            headers={'If-None-Match': self.etag})
+        if response.status_code != 200:
+            return
+        data = json.loads(body)
+        if 'slots' in data:
+            self.slot_ids = [slot['id'] for slot in data['slots']]
+        masks = data['changed'] if 'changed' in data else dict(zip(data['days'], data['free']))
+        for d, mask in masks.items():
+            self.free[d] = {slot_id for i, slot_id in enumerate(self.slot_ids) if mask >> i & 1}
+        self.version = data['version']
+        self.etag = response.headers['ETag']
+
+    def cells(self, skip_days=()):
+        return [(d, t) for d, slots in self.free.items() if d not in skip_days for t in slots]
+
+def browse(recorder, student, iterations, think, rnd):
+    # Обычный посетитель: открывает расписание, иногда перезагружает его, иначе опрашивает
+    # /api/availability; время от времени смотрит свои записи
+    grid = GridClient(recorder, new_client())
+    page_etag = grid.load_page().headers.get('ETag')
+    for _ in range(iterations - 1):
+        if rnd.random() < 0.2:
+            grid.load_page(page_etag)
+        else:
+            grid.poll()
+        if rnd.random() < 0.3:
+            recorder.request(grid.client, 'POST /my-bookings', 'POST', '/my-bookings',
+                             data={'phone': student_phone(student)})
+        if think:
+            time.sleep(rnd.uniform(0, think))
+
+def book_rush(recorder, student, barrier, max_attempts, rnd):
+    # «Запись открылась»: все стартуют одновременно, открывают сетку и пытаются занять слоты;
+    # после отказа подтягивают изменения, как это делает script.js
+    grid = GridClient(recorder, new_client())
+    phone = student_phone(student)
+    booked = 0
+    skip_days = set()
+    barrier.wait()
+    grid.load_page()
+    for _ in range(max_attempts):
+        free = grid.cells(skip_days)
+        if not free:
+            break
+        day, slot = rnd.choice(free)
+        response, body = recorder.request(grid.client, 'POST /book', 'POST', '/book', data={
+            'name': 'Student %d' % student, 'phone': phone, 'date': day, 'slot_id': slot,
+        })
+        if response.status_code == 302:
+            booked += 1
+            skip_days.add(day)
+        elif b'already booked' in body:
+            skip_days.add(day)
+        elif b'Maximum' in body:
+            break
+        if booked >= booking_app.WEEKLY_LIMIT:
+            break
+        grid.poll()
+    recorder.request(grid.client, 'GET /my-bookings', 'GET', '/my-bookings')
+    return booked
+
+def admin_loop(recorder, stop, export_from, rnd):
+    client = new_client(admin=True)
+    pages = [
+        ('GET /admin', '/admin'),
+        ('GET /admin/bookings', '/admin/bookings'),
+        ('GET /admin/reports?range=week', '/admin/reports'),
+        ('GET /admin/reports?range=month', '/admin/reports?range=month'),
+        ('GET /admin/export_excel?format=csv', '/admin/export_excel?format=csv&from=' + export_from),
+        ('GET /admin/export_excel?format=xlsx', '/admin/export_excel?format=xlsx&from=' + export_from),
+    ]
+    # По кругу со случайного места, чтобы каждая страница попала в замеры
+    i = rnd.randrange(len(pages))
+    while not stop.is_set():
+        label, url = pages[i % len(pages)]
+        recorder.request(client, label, 'GET', url)
+        i += 1
+
+def run_phase(workers, admins, export_from, seed_value):
+    recorder = Recorder()
+    stop = threading.Event()
+    threads = [threading.Thread(target=w, args=(recorder,)) for w in workers]
+    threads += [threading.Thread(target=admin_loop, args=(recorder, stop, export_from, random.Random(seed_value + i)))
+                for i in range(admins)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads[:len(workers)]:
+        t.join()
+    stop.set()
+    for t in threads[len(workers):]:
+        t.join()
+    return recorder.summary(time.perf_counter() - start)
+
+
+# === Микробенчмарки горячих функций (без HTTP) ===
+def timed(fn, repeat):
+    latencies = []
+    for _ in range(repeat):
+        _reset_counters()
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {
+        'repeat': repeat,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'queries': _local.queries,
+    }
+
+def micro(store, export_from, repeat):
+    week = booking_app.get_current_week_dates()
+    results = {}
+    with flask_app.app_context():
+        conn = booking_app.get_db()
+        catalog = SlotCatalog.from_rows(store.slot_catalog(conn))
+        results['week_availability'] = timed(lambda: load_week(store, conn, week), repeat)
+        results['client_bookings'] = timed(lambda: store.client_bookings(conn, student_phone(0), week[0]), repeat)
+        results['admin_bookings_page'] = timed(
+            lambda: store.bookings_page(conn, week[0], None, None, booking_app.ADMIN_PAGE_SIZE + 1), repeat)
+        results['build_report_month'] = timed(
+            lambda: reports.build_report(store, conn, week[0] - timedelta(days=30), week[-1], catalog),
+            repeat)
+        results['export_rows'] = timed(
+            lambda: sum(len(b) for b in export.iter_rows(store, conn, date.fromisoformat(export_from), None)),
+            max(1, repeat // 10))
+        conn.rollback()
+    return results
+
+
+# === Сравнение с сохранённым прогоном ===
+def compare(baseline, current, threshold):
+    regressions = []
+    for phase, data in current['phases'].items():
+        base_routes = baseline.get('phases', {}).get(phase, {}).get('routes', {})
+        for label, route in data['routes'].items():
+            base = base_routes.get(label)
+            if not base:
+                continue
+            if base['p95_ms'] and route['p95_ms'] > base['p95_ms'] * (1 + threshold):
+                regressions.append('%s %s: p95 %.1f ms -> %.1f ms' % (phase, label, base['p95_ms'], route['p95_ms']))
+            # Доля попаданий в кэш зависит от гонок, поэтому небольшой допуск
+            if route['queries_per_request'] > base['queries_per_request'] * 1.1 + 0.1:
+                regressions.append('%s %s: queries/request %.2f -> %.2f' % (
+                    phase, label, base['queries_per_request'], route['queries_per_request']))
+    for key in ('double_booked_slots', 'over_quota_students', 'week_counter_drift'):
+        if current['integrity'].get(key):
+            regressions.append('integrity: %s = %d' % (key, current['integrity'][key]))
+    return regressions
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Booking load test and micro-benchmarks")
+    parser.add_argument('--students', type=int, default=50, help="simulated students (threads)")
+    parser.add_argument('--weeks', type=int, default=26, help="past weeks of seeded bookings")
+    parser.add_argument('--future-weeks', type=int, default=2, help="upcoming weeks of seeded bookings")
+    parser.add_argument('--overrides', type=int, default=6, help="blocked slots in the burst week")
+    parser.add_argument('--iterations', type=int, default=20, help="page loads per student in the browse phase")
+    parser.add_argument('--think', type=float, default=0.0, help="max think time between page loads, seconds")
+    parser.add_argument('--admins', type=int, default=1, help="concurrent admin sessions")
+    parser.add_argument('--attempts', type=int, default=15, help="max booking attempts per student in the burst")
+    parser.add_argument('--repeat', type=int, default=50, help="repetitions per micro-benchmark")
+    parser.add_argument('--url', help="load a running server (e.g. http://127.0.0.1:5000) instead of the app in-process")
+    parser.add_argument('--seed', type=int, default=1, help="random seed")
+    parser.add_argument('--reset', action='store_true', help="wipe existing bookings before seeding")
+    parser.add_argument('--output', help="write JSON results to this file (default: stdout)")
+    parser.add_argument('--compare', help="baseline JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2, help="allowed p95 regression (0.2 = 20%%)")
+    args = parser.parse_args(argv[1:])
+
+    global flask_app, base_url
+    flask_app = booking_app.create_app()
+    base_url = args.url
+    store = booking_app.get_storage()
+    booking_app.init_db()
+    instrument()
+    rnd = random.Random(args.seed)
+
+    with db.get_pool().connection() as conn:
+        if has_bookings(store, conn) and not args.reset:
+            print("[BENCH] Database already has bookings; pass --reset to wipe and reseed", file=sys.stderr)
+            return 2
+        dataset = seed(store, conn, args.students, args.weeks, args.future_weeks, args.overrides, rnd)
+    print(f"[BENCH] Seeded {dataset['bookings']} bookings, {dataset['overrides']} overrides", file=sys.stderr)
+    if base_url:
+        # Воркеры сервера увидят новую версию данных не позже чем через DATA_VERSION_TTL
+        time.sleep(float(os.environ.get("DATA_VERSION_TTL", 2)) + 0.5)
+
+    phases = {}
+    phases['browse'] = run_phase(
+        [lambda r, i=i: browse(r, i, args.iterations, args.think, random.Random(args.seed * 1000 + i))
+         for i in range(args.students)],
+        args.admins, dataset['from'], args.seed)
+    print(f"[BENCH] browse: {phases['browse']['throughput_rps']} req/s", file=sys.stderr)
+
+    barrier = threading.Barrier(args.students)
+    booked = []
+    phases['burst'] = run_phase(
+        [lambda r, i=i: booked.append(book_rush(r, i, barrier, args.attempts, random.Random(args.seed * 2000 + i)))
+         for i in range(args.students)],
+        args.admins, dataset['from'], args.seed)
+    print(f"[BENCH] burst: {phases['burst']['throughput_rps']} req/s, {sum(booked)} bookings", file=sys.stderr)
+
+    week = booking_app.get_current_week_dates()
+    with db.get_pool().connection() as conn:
+        integrity = check_integrity(store, conn, week)
+        catalog = SlotCatalog.from_rows(store.slot_catalog(conn))
+        conn.rollback()
+    integrity['burst_bookings'] = sum(booked)
+    integrity['burst_capacity'] = sum(catalog.capacity(d) for d in week) - dataset['overrides']
+
+    result = {
+        'meta': {
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'backend': store.dialect,
+            'target': base_url or 'in-process',
+            'python': platform.python_version(),
+            'students': args.students,
+            'admins': args.admins,
+            'iterations': args.iterations,
+            'seed': args.seed,
+            'pool': db.pool_stats(),
+        },
+        'dataset': dataset,
+        'phases': phases,
+        'micro': micro(store, dataset['from'], args.repeat),
+        'integrity': integrity,
+    }
+
+    output = json.dumps(result, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    failed = bool(integrity['double_booked_slots'] or integrity['over_quota_students']
+                  or integrity['week_counter_drift'])
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        for key in ('backend', 'target', 'students', 'admins', 'iterations', 'seed'):
+            if baseline.get('meta', {}).get(key) != result['meta'][key]:
+                print(f"[BENCH] Warning: baseline {key}={baseline.get('meta', {}).get(key)}, "
+                      f"this run {key}={result['meta'][key]}", file=sys.stderr)
+        regressions = compare(baseline, result, args.threshold)
+        for line in regressions:
+            print(f"[BENCH] Regression: {line}", file=sys.stderr)
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,147 @@
+import gzip
+import time
+import threading
+from collections import OrderedDict, namedtuple
+
+try:
+    import brotli
+except ImportError:  # Brotli есть в requirements.txt; без него отдаётся только gzip
+    brotli = None
+
+
+# LRU-кэш, записи которого привязаны к версии данных.
+# Версия — общий счётчик в БД, который увеличивает каждая изменяющая операция.
+# Процесс перечитывает его не чаще раза в version_ttl секунд, поэтому изменения
+# из других воркеров видны с такой задержкой, а свои — сразу (set_version после коммита).
+class VersionedCache:
+    def __init__(self, max_entries=32, ttl=60.0, version_ttl=2.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version_ttl = version_ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (version, stored_at, value)
+        self._version = None           # (version, changed_at)
+        self._version_checked = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def known_version(self):
+        # Версия без обращения к БД, если она ещё свежая; иначе None
+        with self._lock:
+            if self._version is not None and time.monotonic() - self._version_checked < self.version_ttl:
+                return self._version
+        return None
+
+    def current_version(self, load_version):
+        version = self.known_version()
+        if version is None:
+            version = load_version()
+            self.set_version(*version)
+        return version
+
+    def set_version(self, version, changed_at):
+        with self._lock:
+            if self._version is None or version >= self._version[0]:
+                self._version = (version, changed_at)
+            self._version_checked = time.monotonic()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_version, stored_at, value = entry
+                if entry_version == version and time.monotonic() - stored_at < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._remove(key)
+            self.misses += 1
+            return None
+
+    def put(self, key, version, value):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (version, time.monotonic(), value)
+            self._added(value)
+            while self._entries and self._over_limit():
+                self._remove(next(iter(self._entries)))
+
+    # Под self._lock: учёт записей для наследников с другим ограничением размера
+    def _added(self, value):
+        pass
+
+    def _remove(self, key):
+        del self._entries[key]
+
+    def _over_limit(self):
+        return len(self._entries) > self.max_entries
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._version_checked = 0.0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'version': self._version[0] if self._version else None,
+            }
+
+
+# Отрисованная страница: тело без сжатия и заранее сжатые варианты {кодировка: байты}
+Page = namedtuple('Page', 'body encoded mimetype')
+
+def compress_page(body, mimetype='text/html; charset=utf-8', gzip_level=6, brotli_quality=5):
+    # Сжимается один раз при записи в кэш, а не на каждый ответ
+    data = body.encode('utf-8') if isinstance(body, str) else body
+    encoded = {'gzip': gzip.compress(data, compresslevel=gzip_level, mtime=0)}
+    if brotli is not None:
+        encoded['br'] = brotli.compress(data, quality=brotli_quality)
+    return Page(data, encoded, mimetype)
+
+def choose_encoding(page, accept_encodings):
+    # Лучший из имеющихся вариантов по Accept-Encoding (werkzeug Accept); None — без сжатия
+    best, best_quality = None, 0
+    for encoding in ('br', 'gzip'):
+        quality = accept_encodings[encoding] if encoding in page.encoded else 0
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+# Кэш отрисованных страниц и фрагментов: тот же ключ версии данных, но LRU ограничено
+# суммарным размером всех вариантов страницы, а не только числом записей
+class PageCache(VersionedCache):
+    def __init__(self, max_bytes=8 * 1024 * 1024, max_entries=256, ttl=300.0, version_ttl=2.0):
+        super().__init__(max_entries=max_entries, ttl=ttl, version_ttl=version_ttl)
+        self.max_bytes = max_bytes
+        self.bytes = 0
+
+    @staticmethod
+    def _size(page):
+        return len(page.body) + sum(len(data) for data in page.encoded.values())
+
+    def _added(self, page):
+        self.bytes += self._size(page)
+
+    def _remove(self, key):
+        self.bytes -= self._size(self._entries.pop(key)[2])
+
+    def _over_limit(self):
+        return super()._over_limit() or self.bytes > self.max_bytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+            self._version_checked = 0.0
+
+    def stats(self):
+        stats = super().stats()
+        with self._lock:
+            stats['bytes'] = self.bytes
+        return stats
@@ -1,26 +1,126 @@
 # cleanup.py
 import os
-import psycopg2
-from datetime import date, timedelta
+import sys
+import time
+import threading
+from datetime import date, datetime, timedelta, timezone
 
-def cleanup_old_bookings():
+from storage import open_storage
+
+CLEANUP_TASK = 'cleanup_old_bookings'
+CLEANUP_BATCH_SIZE = int(os.environ.get("CLEANUP_BATCH_SIZE", 500))
+
+def cleanup_cutoff(today=None):
+    today = today or date.today()
+    return today - timedelta(days=today.weekday() + 1)
+
+def cleanup_due(now=None):
+    # Как и раньше: по воскресеньям после 10:00
+    now = now or datetime.now()
+    return now.weekday() == 6 and now.hour >= 10
+
+def _commit(store, conn):
+    # Без приложения (CLI): версия данных и уведомление подписчиков SSE в той же транзакции
+    version, _ = store.bump_version(conn)
+    store.notify_changed(conn, version)
+    conn.commit()
+
+def cleanup_old_bookings(store, conn, today=None, batch_size=CLEANUP_BATCH_SIZE, force=False,
+                         commit=None):
+    # commit(conn) — коммит изменения данных; в приложении это app.commit_changes (ещё и кэши процесса)
+    cutoff = cleanup_cutoff(today)
+    period = cutoff.isoformat()
+
+    # Один исполнитель на все воркеры/процессы
+    if not store.try_lock_maintenance(conn):
+        return None
+
+    try:
+        run = store.last_run(conn, CLEANUP_TASK)
+        conn.rollback()
+        if run is not None and run['period'] == period and not force:
+            return None
+
+        started_at = datetime.now(timezone.utc)
+        started = time.monotonic()
+        removed = 0
+        # Короткие транзакции по batch_size строк, чтобы не держать долгих блокировок
+        while True:
+            deleted = store.delete_old_bookings(conn, cutoff, batch_size)
+            conn.commit()
+            removed += deleted
+            if deleted < batch_size:
+                break
+
+        duration_ms = int((time.monotonic() - started) * 1000)
+        # Агрегаты уже учтены триггерами — фиксируем, до какой даты сырых данных нет
+        store.mark_cleaned(conn, cutoff)
+        store.record_run(conn, CLEANUP_TASK, period, started_at, removed, duration_ms)
+        if not removed:
+            conn.commit()
+        elif commit is not None:
+            commit(conn)
+        else:
+            _commit(store, conn)
+        print(f"[CLEANUP] Deleted {removed} records up to {cutoff} in {duration_ms} ms")
+        return {'period': period, 'rows_removed': removed, 'duration_ms': duration_ms}
+    finally:
+        # После ошибки в пакете транзакция PostgreSQL прервана: без отката снятие блокировки
+        # само упадёт, скроет исходную ошибку и оставит блокировку на соединении из пула
+        conn.rollback()
+        store.unlock_maintenance(conn)
+
+
+# Фоновый планировщик внутри процесса: раз в interval секунд проверяет,
+# пора ли запускать очистку. Повторы за тот же период — no-op (maintenance_runs).
+class MaintenanceScheduler:
+    def __init__(self, get_storage, get_connection, interval=600.0, commit=None):
+        self.get_storage = get_storage
+        self.get_connection = get_connection
+        self.interval = interval
+        self.commit = commit
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='maintenance', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def run_once(self):
+        if not cleanup_due():
+            return None
+        with self.get_connection() as conn:
+            return cleanup_old_bookings(self.get_storage(), conn, commit=self.commit)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"[CLEANUP] Failed: {e}")
+            self._stop.wait(self.interval)
+
+def main(argv):
     db_url = os.environ.get("DATABASE_URL")
     if not db_url:
         raise Exception("DATABASE_URL is required")
 
-    conn = psycopg2.connect(db_url)
+    store = open_storage(db_url)
+    conn = store.connect()
     try:
-        with conn.cursor() as cur:
-            today = date.today()
-            last_sunday = today - timedelta(days=today.weekday() + 1)
-            cur.execute("""
-                DELETE FROM bookings 
-                WHERE date <= %s AND status IN ('confirmed', 'cancelled')
-            """, (last_sunday.isoformat(),))
-            conn.commit()
-            print(f"[CLEANUP] Deleted records up to {last_sunday}")
+        result = cleanup_old_bookings(store, conn, force='--force' in argv)
+        if result is None:
+            print(f"[CLEANUP] Nothing to do: already ran for {cleanup_cutoff()} or running elsewhere")
     finally:
         conn.close()
 
 if __name__ == "__main__":
-    cleanup_old_bookings()
\ No newline at end of file
+    main(sys.argv)
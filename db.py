@@ -0,0 +1,231 @@
+import os
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+
+from flask import g
+
+from storage import open_storage
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    def __init__(self, backend, min_size=1, max_size=10, timeout=10.0,
+                 check_after=30.0, max_lifetime=1800.0):
+        if min_size > max_size:
+            raise ValueError("min_size must not exceed max_size")
+        self.backend = backend
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_after = check_after
+        self.max_lifetime = max_lifetime
+
+        self._cond = threading.Condition()
+        self._idle = []      # свободные соединения (LIFO)
+        self._meta = {}      # id(conn) -> [created_at, last_used]
+        self._size = 0       # всего открыто (свободные + выданные)
+        self._in_use = 0
+        self._waiting = 0
+        self._created = 0
+        self._recycled = 0
+        self._closed = False
+
+        for _ in range(min_size):
+            conn = self._new_connection()
+            with self._cond:
+                self._size += 1
+                self._idle.append(conn)
+
+    def _new_connection(self):
+        conn = self.backend.connect()
+        now = time.monotonic()
+        with self._cond:
+            self._meta[id(conn)] = [now, now]
+            self._created += 1
+        return conn
+
+    def _drop(self, conn):
+        self._meta.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn):
+        if self.backend.is_closed(conn):
+            return False
+        created, last_used = self._meta.get(id(conn), (0, 0))
+        now = time.monotonic()
+        if self.max_lifetime and now - created > self.max_lifetime:
+            return False
+        if self.check_after is not None and now - last_used > self.check_after:
+            # Соединение долго простаивало — проверяем, что сервер его не закрыл
+            try:
+                self.backend.ping(conn)
+            except Exception:
+                return False
+        return True
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    conn = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout("Timed out waiting for a database connection")
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._in_use += 1
+
+        try:
+            if conn is not None and not self._is_healthy(conn):
+                with self._cond:
+                    self._recycled += 1
+                self._drop(conn)
+                conn = None
+            if conn is None:
+                conn = self._new_connection()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def putconn(self, conn, discard=False):
+        closed = self.backend.is_closed(conn)
+        if not discard and not closed and self.backend.in_transaction(conn):
+            # Незавершённая транзакция не должна попасть к следующему запросу
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+        with self._cond:
+            self._in_use -= 1
+            if discard or closed or self._closed:
+                self._size -= 1
+                self._drop(conn)
+            else:
+                self._meta.get(id(conn), [0, 0])[1] = time.monotonic()
+                self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        try:
+            yield conn
+        except Exception:
+            self.putconn(conn)
+            raise
+        else:
+            self.putconn(conn)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            for conn in idle:
+                self._drop(conn)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'waiting': self._waiting,
+                'created': self._created,
+                'recycled': self._recycled,
+            }
+
+
+_storage = None
+_pool = None
+_pool_lock = threading.Lock()
+
+# Бэкенд хранения (PostgreSQL или SQLite) выбирается по DATABASE_URL
+def get_storage():
+    global _storage
+    if _storage is None:
+        db_url = os.environ.get("DATABASE_URL")
+        if not db_url:
+            raise Exception("DATABASE_URL environment variable is required")
+        _storage = open_storage(db_url)
+    return _storage
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    get_storage(),
+                    min_size=int(os.environ.get("DB_POOL_MIN", 1)),
+                    max_size=int(os.environ.get("DB_POOL_MAX", 10)),
+                    timeout=float(os.environ.get("DB_POOL_TIMEOUT", 10)),
+                    check_after=float(os.environ.get("DB_POOL_CHECK_AFTER", 30)),
+                    max_lifetime=float(os.environ.get("DB_POOL_MAX_LIFETIME", 1800)),
+                )
+    return _pool
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+atexit.register(close_pool)
+
+def _forget_pool_after_fork():
+    # Соединения родителя не трогаем (сокеты общие с ним) — воркер откроет свой пул
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_forget_pool_after_fork)
+
+def pool_stats():
+    if _pool is None:
+        return {'size': 0, 'idle': 0, 'in_use': 0, 'waiting': 0, 'created': 0, 'recycled': 0}
+    return _pool.stats()
+
+# Одно соединение на запрос: берётся при первом обращении, возвращается в teardown
+def get_db():
+    if 'db' not in g:
+        start = time.perf_counter()
+        g.db = get_pool().getconn()
+        g.db_acquire = time.perf_counter() - start
+    return g.db
+
+def release_db(exc=None):
+    conn = g.pop('db', None)
+    if conn is not None:
+        # putconn откатит незавершённую транзакцию (в т.ч. после ошибки)
+        get_pool().putconn(conn)
+
+def init_app(app):
+    app.teardown_appcontext(release_db)
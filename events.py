@@ -0,0 +1,302 @@
+import os
+import sys
+import json
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+from storage import open_storage
+from schedule import get_current_week_dates, load_week_masks, slots_payload
+
+EVENTS_HOST = os.environ.get("EVENTS_HOST", "0.0.0.0")
+EVENTS_PORT = int(os.environ.get("EVENTS_PORT", 5001))
+EVENTS_PATH = os.environ.get("EVENTS_PATH", "/events")
+EVENTS_POLL_INTERVAL = float(os.environ.get("EVENTS_POLL_INTERVAL", 0.5))
+EVENTS_KEEPALIVE = float(os.environ.get("EVENTS_KEEPALIVE", 25))
+EVENTS_MAX_CLIENTS = int(os.environ.get("EVENTS_MAX_CLIENTS", 10000))
+EVENTS_ALLOW_ORIGIN = os.environ.get("EVENTS_ALLOW_ORIGIN", "*")
+
+# Клиент, который не успевает читать, отключается, а не копит буфер
+MAX_CLIENT_BUFFER = 64 * 1024
+
+
+# Server-Sent Events со сменами слотов текущей недели.
+# Один поток с asyncio держит всех подписчиков (корутина на соединение, без потока на клиента).
+# Источник изменений — LISTEN/NOTIFY (PostgreSQL, уведомление уходит при COMMIT записи)
+# или опрос data_version раз в poll_interval секунд (SQLite, тесты). На каждое изменение —
+# один запрос к БД и одна рассылка дельты всем подписчикам, сколько бы их ни было.
+class EventServer:
+    def __init__(self, store, host=EVENTS_HOST, port=EVENTS_PORT, path=EVENTS_PATH,
+                 poll_interval=EVENTS_POLL_INTERVAL, keepalive=EVENTS_KEEPALIVE,
+                 max_clients=EVENTS_MAX_CLIENTS, allow_origin=EVENTS_ALLOW_ORIGIN):
+        self.store = store
+        self.host = host
+        self.port = port
+        self.path = path
+        self.poll_interval = poll_interval
+        self.keepalive = keepalive
+        self.max_clients = max_clients
+        self.allow_origin = allow_origin
+
+        self.clients = set()
+        self.week = None
+        self.days = None
+        self.version = None
+        self.slots = None
+        self.masks = None
+        self.sent = 0
+        self.dropped = 0
+        self.notifications = 0
+        self.refreshes = 0
+
+        # Все обращения к БД — в одном потоке со своим соединением
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='events-db')
+        self._conn = None
+        self._refreshing = False
+        self._dirty = False
+        self._tasks = set()
+
+    # === Состояние недели ===
+    def _load(self, known_week, known_version):
+        if self._conn is None or self.store.is_closed(self._conn):
+            self._conn = self.store.connect()
+        conn = self._conn
+        try:
+            dates = get_current_week_dates()
+            version, _ = self.store.data_version(conn)
+            if version == known_version and dates[0].isoformat() == known_week:
+                conn.rollback()
+                return None
+            week_slots, masks = load_week_masks(self.store, conn, dates)
+            conn.rollback()
+        except Exception:
+            self._conn = None
+            try:
+                conn.close()
+            except Exception:
+                pass
+            raise
+        return dates, version, week_slots, masks
+
+    async def refresh(self):
+        # Уведомления, пришедшие во время загрузки, схлопываются в ещё одну загрузку
+        if self._refreshing:
+            self._dirty = True
+            return
+        self._refreshing = True
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                self._dirty = False
+                result = await loop.run_in_executor(self._executor, self._load, self.week, self.version)
+                self.refreshes += 1
+                if result is not None:
+                    self._apply(*result)
+                if not self._dirty:
+                    break
+        except Exception as e:
+            print(f"[EVENTS] Refresh failed: {e}")
+        finally:
+            self._refreshing = False
+
+    def _full_payload(self):
+        return {'week': self.week, 'version': self.version, 'slots': slots_payload(self.slots),
+                'days': self.days, 'free': self.masks}
+
+    def _apply(self, dates, version, week_slots, masks):
+        week = dates[0].isoformat()
+        if self.version is not None and week == self.week and version < self.version:
+            return
+        first = self.masks is None
+        if first or week != self.week or week_slots != self.slots:
+            # Новая неделя или другой набор слотов: биты масок значат другое, шлём всё
+            self.week, self.days, self.version = week, [d.isoformat() for d in dates], version
+            self.slots, self.masks = week_slots, masks
+            payload = self._full_payload()
+        else:
+            changed = {d: m for d, m, old in zip(self.days, masks, self.masks) if m != old}
+            self.version, self.masks = version, masks
+            if not changed:
+                return
+            payload = {'week': week, 'version': version, 'changed': changed}
+        if not first:
+            self.broadcast(self._event(payload))
+
+    def _event(self, payload):
+        return ('id: %d\nevent: slots\ndata: %s\n\n' % (
+            payload['version'], json.dumps(payload, separators=(',', ':')))).encode('utf-8')
+
+    # === Подписчики ===
+    def broadcast(self, data):
+        for writer in list(self.clients):
+            if writer.transport.is_closing() or writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+                self.clients.discard(writer)
+                self.dropped += 1
+                writer.transport.abort()
+                continue
+            writer.write(data)
+            self.sent += 1
+
+    def _respond(self, writer, status, body, extra=''):
+        writer.write(('HTTP/1.1 %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n'
+                      'Access-Control-Allow-Origin: %s\r\nConnection: close\r\n%s\r\n' % (
+                          status, len(body), self.allow_origin, extra)).encode('latin-1') + body)
+
+    def stats(self):
+        return {'clients': len(self.clients), 'version': self.version, 'sent': self.sent,
+                'dropped': self.dropped, 'notifications': self.notifications, 'refreshes': self.refreshes}
+
+    async def handle(self, reader, writer):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), 10)
+            request_line, *header_lines = head.decode('latin-1').split('\r\n')
+            method, target, _ = request_line.split(' ', 2)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                ConnectionError, ValueError):
+            writer.close()
+            return
+        headers = {}
+        for line in header_lines:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        url = urlsplit(target)
+
+        if method != 'GET' or url.path not in (self.path, self.path + '/stats'):
+            self._respond(writer, '404 Not Found', b'{"error":"not found"}')
+            writer.close()
+            return
+        if url.path.endswith('/stats'):
+            self._respond(writer, '200 OK', json.dumps(self.stats()).encode('utf-8'))
+            writer.close()
+            return
+        if len(self.clients) >= self.max_clients:
+            self._respond(writer, '503 Service Unavailable', b'{"error":"too many subscribers"}',
+                          'Retry-After: 10\r\n')
+            writer.close()
+            return
+
+        # Переподключившийся EventSource присылает Last-Event-ID — версию, которую он видел
+        since = headers.get('last-event-id') or parse_qs(url.query).get('since', [None])[0]
+        writer.write((
+            'HTTP/1.1 200 OK\r\n'
+            'Content-Type: text/event-stream\r\n'
+            'Cache-Control: no-cache\r\n'
+            'Connection: keep-alive\r\n'
+            'X-Accel-Buffering: no\r\n'
+            'Access-Control-Allow-Origin: %s\r\n'
+            '\r\n'
+            'retry: 3000\n\n' % self.allow_origin
+        ).encode('latin-1'))
+        if self.masks is not None and since != str(self.version):
+            writer.write(self._event(self._full_payload()))
+        self.clients.add(writer)
+        try:
+            # Клиент ничего не шлёт; read() вернёт b'' при закрытии соединения
+            while await reader.read(1024):
+                pass
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+    # === Фоновые задачи ===
+    def _spawn(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _keepalive(self):
+        # Комментарий SSE не даёт прокси закрыть простаивающее соединение
+        while True:
+            await asyncio.sleep(self.keepalive)
+            self.broadcast(b': ping\n\n')
+
+    async def _poll(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.poll_interval)
+
+    async def _listen(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                listener = await loop.run_in_executor(self._executor, self.store.listen_changes)
+            except Exception as e:
+                print(f"[EVENTS] LISTEN failed: {e}")
+                await asyncio.sleep(5)
+                continue
+            if listener is None:
+                print("[EVENTS] No change notifications for this backend, polling data version")
+                await self._poll()
+                return
+
+            lost = loop.create_future()
+            fd = listener.fileno()
+
+            def on_readable():
+                try:
+                    payloads = self.store.poll_changes(listener)
+                except Exception as e:
+                    loop.remove_reader(fd)
+                    if not lost.done():
+                        lost.set_result(e)
+                    return
+                if payloads:
+                    self.notifications += len(payloads)
+                    self._spawn(self.refresh())
+
+            loop.add_reader(fd, on_readable)
+            # Изменения, случившиеся до LISTEN, подтягиваем сразу
+            await self.refresh()
+            error = await lost
+            print(f"[EVENTS] Lost LISTEN connection: {error}")
+            try:
+                listener.close()
+            except Exception:
+                pass
+            await asyncio.sleep(1)
+
+    async def _week_rollover(self):
+        # В воскресенье сетка переключается на следующую неделю без всяких записей
+        while True:
+            await asyncio.sleep(60)
+            if self.week != get_current_week_dates()[0].isoformat():
+                await self.refresh()
+
+    async def serve(self, ready=None):
+        await self.refresh()
+        server = await asyncio.start_server(self.handle, self.host, self.port, limit=8192, backlog=1024)
+        self._spawn(self._listen())
+        self._spawn(self._keepalive())
+        self._spawn(self._week_rollover())
+        print(f"[EVENTS] Serving {self.path} on {self.host}:{self.port}")
+        if ready is not None:
+            ready.set()
+        async with server:
+            await server.serve_forever()
+
+def start_in_thread(store, **kwargs):
+    # Для запуска вместе с приложением в одном процессе (python app.py)
+    server = EventServer(store, **kwargs)
+    ready = threading.Event()
+    thread = threading.Thread(target=lambda: asyncio.run(server.serve(ready)), name='events', daemon=True)
+    thread.start()
+    ready.wait(10)
+    return server
+
+def main(argv):
+    db_url = os.environ.get("DATABASE_URL")
+    if not db_url:
+        raise Exception("DATABASE_URL is required")
+    server = EventServer(open_storage(db_url))
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
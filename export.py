@@ -0,0 +1,74 @@
+import csv
+import io
+import os
+import tempfile
+
+HEADERS = ["Name", "Phone", "Date", "Time Slot", "Status", "Attendance"]
+COLUMNS = ['name', 'phone', 'date', 'time_slot', 'status', 'attendance']
+
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", 2000))
+CHUNK_SIZE = 64 * 1024
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+def column_widths(store, conn, start, end):
+    # Ширины колонок считаются агрегатом в SQL: в write-only режиме openpyxl
+    # пишет <cols> до первой строки, второй проход по данным не нужен
+    row = store.export_widths(conn, start, end)
+    return [min(max(len(header), row[col] or 0) + 2, 30) for header, col in zip(HEADERS, COLUMNS)]
+
+def iter_rows(store, conn, start, end, batch_size=EXPORT_BATCH_SIZE):
+    return store.iter_export(conn, start, end, batch_size)
+
+def stream_csv(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM, чтобы Excel открыл UTF-8 с кириллицей
+    buffer.write('\ufeff')
+    writer.writerow(HEADERS)
+    for rows in batches:
+        for row in rows:
+            writer.writerow([row[col] for col in COLUMNS])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    tail = buffer.getvalue()
+    if tail:
+        yield tail
+
+def stream_xlsx(batches, widths):
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, Alignment, PatternFill
+    from openpyxl.utils import get_column_letter
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Bookings Report")
+    for i, width in enumerate(widths, start=1):
+        ws.column_dimensions[get_column_letter(i)].width = width
+
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="4F46E5", end_color="4F46E5", fill_type="solid")
+    header = []
+    for title in HEADERS:
+        cell = WriteOnlyCell(ws, value=title)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = Alignment(horizontal="center")
+        header.append(cell)
+    ws.append(header)
+
+    for rows in batches:
+        for row in rows:
+            ws.append([row[col] for col in COLUMNS])
+
+    # Лист уже лежит во временном файле openpyxl; архив тоже пишем на диск
+    # и отдаём кусками, чтобы память не росла с числом строк
+    with tempfile.TemporaryFile() as output:
+        wb.save(output)
+        output.seek(0)
+        while True:
+            chunk = output.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
@@ -0,0 +1,43 @@
+# Продакшен-режим: несколько воркеров (fork) с потоками
+import os
+import secrets
+import multiprocessing
+
+bind = "0.0.0.0:%s" % os.environ.get("PORT", 5000)
+workers = int(os.environ.get("WEB_CONCURRENCY", min(multiprocessing.cpu_count() * 2 + 1, 8)))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 0))
+accesslog = "-" if os.environ.get("GUNICORN_ACCESS_LOG") else None
+
+# Приложение импортируется один раз в мастере; соединений при импорте не открывается
+preload_app = True
+
+# Пул в каждом воркере: по соединению на поток и одно для фоновой очистки (MaintenanceScheduler)
+os.environ.setdefault("DB_POOL_MAX", str(threads + 1))
+
+# Один ключ на все воркеры, иначе сессия админа живёт только в «своём» воркере
+if not os.environ.get("SECRET_KEY"):
+    print("[CONFIG] SECRET_KEY is not set, using a random key shared by the workers")
+    os.environ["SECRET_KEY"] = secrets.token_hex(32)
+
+def on_starting(server):
+    # Миграции — один раз, до запуска воркеров
+    from app import init_db
+    init_db()
+
+def post_worker_init(worker):
+    # Пул создаётся уже после fork, в самом воркере
+    import db
+    db.get_pool()
+
+def worker_exit(server, worker):
+    # Сюда воркер доходит после SIGTERM, когда текущие запросы дообслужены (graceful_timeout)
+    import db
+    from app import maintenance
+    maintenance.stop()
+    db.close_pool()
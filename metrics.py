@@ -0,0 +1,225 @@
+import os
+import re
+import time
+import bisect
+import threading
+
+from flask import g, request, has_app_context, has_request_context, before_render_template, template_rendered
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 200))
+
+def _bucket_index(buckets, value):
+    return bisect.bisect_left(buckets, value)
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+def _compact_sql(sql, limit=500):
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    sql = re.sub(r'\s+', ' ', str(sql)).strip()
+    return sql if len(sql) <= limit else sql[:limit] + '...'
+
+
+class _Route:
+    __slots__ = ('duration', 'queries', 'duration_sum', 'count', 'queries_sum',
+                 'db_seconds', 'acquire_seconds', 'render_seconds', 'statuses')
+
+    def __init__(self):
+        self.duration = [0] * (len(DURATION_BUCKETS) + 1)
+        self.queries = [0] * (len(QUERY_BUCKETS) + 1)
+        self.duration_sum = 0.0
+        self.count = 0
+        self.queries_sum = 0
+        self.db_seconds = 0.0
+        self.acquire_seconds = 0.0
+        self.render_seconds = 0.0
+        self.statuses = {}
+
+
+# Счётчики запроса живут в g; агрегаты по маршрутам — в памяти процесса.
+# На запрос: несколько perf_counter() и одна короткая блокировка в teardown.
+class Metrics:
+    def __init__(self, slow_query_ms=SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self._routes = {}
+        self._slow_queries = 0
+        self._get_storage = None
+        self._listening = False
+
+    # === Сбор ===
+    def on_query(self, sql, seconds):
+        if has_app_context():
+            stats = g.get('_metrics')
+            if stats is not None:
+                stats['queries'] += 1
+                stats['db'] += seconds
+        if self.slow_query_ms and seconds * 1000 >= self.slow_query_ms:
+            with self._lock:
+                self._slow_queries += 1
+            route = request.path if has_request_context() else '-'
+            print(f"[SLOW QUERY] {seconds * 1000:.0f} ms {route}: {_compact_sql(sql)}")
+
+    def start_request(self):
+        if not self._listening:
+            # Хранилище создаётся лениво (DATABASE_URL), поэтому подписываемся на первом запросе
+            with self._lock:
+                if not self._listening:
+                    self._get_storage().listeners.append(self.on_query)
+                    self._listening = True
+        g._metrics = {'start': time.perf_counter(), 'queries': 0, 'db': 0.0, 'render': 0.0, 'render_start': None}
+
+    def _render_started(self, sender, template, context, **extra):
+        stats = g.get('_metrics')
+        if stats is not None:
+            stats['render_start'] = time.perf_counter()
+
+    def _render_finished(self, sender, template, context, **extra):
+        stats = g.get('_metrics')
+        if stats is not None and stats['render_start'] is not None:
+            stats['render'] += time.perf_counter() - stats['render_start']
+            stats['render_start'] = None
+
+    def server_timing(self, response):
+        stats = g.get('_metrics')
+        if stats is None:
+            return response
+        total = time.perf_counter() - stats['start']
+        response.headers['Server-Timing'] = (
+            'db;dur=%.1f;desc="%d queries", conn;dur=%.1f, render;dur=%.1f, app;dur=%.1f' % (
+                stats['db'] * 1000, stats['queries'], g.get('db_acquire', 0.0) * 1000,
+                stats['render'] * 1000, total * 1000)
+        )
+        g._metrics_status = response.status_code
+        return response
+
+    def finish_request(self, exc=None):
+        # teardown: для потоковых ответов — после отдачи тела, поэтому время полное
+        stats = g.pop('_metrics', None)
+        if stats is None:
+            return
+        duration = time.perf_counter() - stats['start']
+        status = 500 if exc is not None else g.get('_metrics_status', 200)
+        rule = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        key = (request.method, rule)
+        with self._lock:
+            route = self._routes.get(key)
+            if route is None:
+                route = self._routes[key] = _Route()
+            route.duration[_bucket_index(DURATION_BUCKETS, duration)] += 1
+            route.queries[_bucket_index(QUERY_BUCKETS, stats['queries'])] += 1
+            route.duration_sum += duration
+            route.count += 1
+            route.queries_sum += stats['queries']
+            route.db_seconds += stats['db']
+            route.acquire_seconds += g.get('db_acquire', 0.0)
+            route.render_seconds += stats['render']
+            route.statuses[status] = route.statuses.get(status, 0) + 1
+
+    # === Prometheus ===
+    def render(self, pool=None, caches=None, limiters=None, gate=None):
+        lines = []
+
+        def metric(name, kind, help_text):
+            lines.append('# HELP %s %s' % (name, help_text))
+            lines.append('# TYPE %s %s' % (name, kind))
+
+        with self._lock:
+            routes = sorted(self._routes.items())
+            snapshot = [(key, list(r.duration), list(r.queries), r.duration_sum, r.count, r.queries_sum,
+                         r.db_seconds, r.acquire_seconds, r.render_seconds, dict(r.statuses))
+                        for key, r in routes]
+            slow_queries = self._slow_queries
+
+        def histogram(name, buckets, index, total_index):
+            for (method, rule), *values in snapshot:
+                labels = 'method="%s",route="%s"' % (_label(method), _label(rule))
+                cumulative = 0
+                for bound, count in zip(buckets, values[index]):
+                    cumulative += count
+                    lines.append('%s_bucket{%s,le="%s"} %d' % (name, labels, bound, cumulative))
+                lines.append('%s_bucket{%s,le="+Inf"} %d' % (name, labels, values[3]))
+                lines.append('%s_sum{%s} %s' % (name, labels, values[total_index]))
+                lines.append('%s_count{%s} %d' % (name, labels, values[3]))
+
+        metric('booking_request_duration_seconds', 'histogram', 'Request duration by route')
+        histogram('booking_request_duration_seconds', DURATION_BUCKETS, 0, 2)
+        metric('booking_request_queries', 'histogram', 'DB queries per request by route')
+        histogram('booking_request_queries', QUERY_BUCKETS, 1, 4)
+
+        metric('booking_requests_total', 'counter', 'Requests by route and status')
+        for (method, rule), *values in snapshot:
+            for status, count in sorted(values[8].items()):
+                lines.append('booking_requests_total{method="%s",route="%s",status="%d"} %d' % (
+                    _label(method), _label(rule), status, count))
+
+        for name, index, help_text in (
+            ('booking_db_seconds_total', 5, 'Time spent in DB queries'),
+            ('booking_db_acquire_seconds_total', 6, 'Time spent waiting for a pooled connection'),
+            ('booking_render_seconds_total', 7, 'Time spent rendering templates'),
+        ):
+            metric(name, 'counter', help_text)
+            for (method, rule), *values in snapshot:
+                lines.append('%s{method="%s",route="%s"} %s' % (name, _label(method), _label(rule), values[index]))
+
+        metric('booking_slow_queries_total', 'counter', 'Queries slower than SLOW_QUERY_MS')
+        lines.append('booking_slow_queries_total %d' % slow_queries)
+
+        if pool:
+            for key in ('size', 'idle', 'in_use', 'waiting'):
+                metric('booking_db_pool_%s' % key, 'gauge', 'Connection pool %s' % key.replace('_', ' '))
+                lines.append('booking_db_pool_%s %d' % (key, pool.get(key, 0)))
+            for key in ('created', 'recycled'):
+                metric('booking_db_pool_%s_total' % key, 'counter', 'Connections %s by the pool' % key)
+                lines.append('booking_db_pool_%s_total %d' % (key, pool.get(key, 0)))
+
+        if caches:
+            for key in ('hits', 'misses'):
+                metric('booking_cache_%s_total' % key, 'counter', 'In-process cache %s' % key)
+                for name, stats in sorted(caches.items()):
+                    lines.append('booking_cache_%s_total{cache="%s"} %d' % (key, _label(name), stats[key]))
+            metric('booking_cache_entries', 'gauge', 'In-process cache entries')
+            for name, stats in sorted(caches.items()):
+                lines.append('booking_cache_entries{cache="%s"} %d' % (_label(name), stats['entries']))
+            sized = [(name, stats) for name, stats in sorted(caches.items()) if 'bytes' in stats]
+            if sized:
+                metric('booking_cache_bytes', 'gauge', 'In-process cache size in bytes')
+                for name, stats in sized:
+                    lines.append('booking_cache_bytes{cache="%s"} %d' % (_label(name), stats['bytes']))
+
+        if limiters:
+            for key in ('allowed', 'limited'):
+                metric('booking_rate_%s_total' % key, 'counter', 'Booking attempts %s by rate limiter' % key)
+                for name, stats in sorted(limiters.items()):
+                    lines.append('booking_rate_%s_total{limiter="%s"} %d' % (key, _label(name), stats[key]))
+            metric('booking_rate_keys', 'gauge', 'Keys tracked by rate limiter')
+            for name, stats in sorted(limiters.items()):
+                lines.append('booking_rate_keys{limiter="%s"} %d' % (_label(name), stats['keys']))
+
+        if gate:
+            for key in ('active', 'waiting'):
+                metric('booking_gate_%s' % key, 'gauge', 'Booking transactions %s' % key)
+                lines.append('booking_gate_%s %d' % (key, gate[key]))
+            for key in ('admitted', 'queued', 'rejected', 'timed_out'):
+                metric('booking_gate_%s_total' % key, 'counter', 'Booking transactions %s' % key.replace('_', ' '))
+                lines.append('booking_gate_%s_total %d' % (key, gate[key]))
+
+        return '\n'.join(lines) + '\n'
+
+    def init_app(self, app, get_storage):
+        self._get_storage = get_storage
+        app.before_request(self.start_request)
+        app.after_request(self.server_timing)
+        app.teardown_request(self.finish_request)
+        before_render_template.connect(self._render_started, app)
+        template_rendered.connect(self._render_finished, app)
+
+
+# Доступ к /admin/metrics для сборщика без сессии: Authorization: Bearer $METRICS_TOKEN
+def token_allowed(req):
+    token = os.environ.get("METRICS_TOKEN")
+    return bool(token) and req.headers.get('Authorization') == 'Bearer ' + token
@@ -0,0 +1,70 @@
+import os
+import re
+import sys
+
+from storage import open_storage
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+def load_migrations(directory):
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = re.match(r'^(\d+)_(\w+)\.sql$', filename)
+        if not match:
+            continue
+        with open(os.path.join(directory, filename), encoding='utf-8') as f:
+            migrations.append((int(match.group(1)), match.group(2), f.read()))
+
+    versions = [m[0] for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise Exception("Duplicate migration version in %s" % directory)
+    return migrations
+
+def migrate(store, conn, migrations=None):
+    if migrations is None:
+        migrations = load_migrations(os.path.join(MIGRATIONS_DIR, store.dialect))
+    if not migrations:
+        return []
+
+    # Быстрая проверка при старте: схема уже актуальна
+    latest = migrations[-1][0]
+    if store.schema_version(conn) >= latest:
+        return []
+
+    applied = []
+    store.lock_migrations(conn)
+    try:
+        done = store.applied_migrations(conn)
+        # Каждая миграция — в своей транзакции вместе с записью о ней
+        for version, name, sql in migrations:
+            if version in done:
+                continue
+            store.apply_migration(conn, version, name, sql)
+            applied.append((version, name))
+            print(f"[MIGRATE] Applied {version:04d}_{name}")
+    finally:
+        store.unlock_migrations(conn)
+    return applied
+
+def main(argv):
+    db_url = os.environ.get("DATABASE_URL")
+    if not db_url:
+        raise Exception("DATABASE_URL is required")
+
+    store = open_storage(db_url)
+    conn = store.connect()
+    try:
+        if argv[1:] == ['status']:
+            current = store.schema_version(conn)
+            for version, name, _ in load_migrations(os.path.join(MIGRATIONS_DIR, store.dialect)):
+                mark = 'x' if version <= current else ' '
+                print(f"[{mark}] {version:04d}_{name}")
+        else:
+            applied = migrate(store, conn)
+            if not applied:
+                print("[MIGRATE] Schema is up to date")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main(sys.argv)
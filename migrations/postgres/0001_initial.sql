@@ -0,0 +1,29 @@
+-- Базовая схема (повторяет прежний init_db, безопасно для существующих БД)
+CREATE TABLE IF NOT EXISTS bookings (
+    id SERIAL PRIMARY KEY,
+    name TEXT NOT NULL,
+    phone TEXT NOT NULL,
+    date DATE NOT NULL,
+    time_slot TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'confirmed',
+    attended INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+ALTER TABLE bookings ADD COLUMN IF NOT EXISTS attended INTEGER;
+
+-- Исключения расписания: time_slot IS NULL = весь день отключён
+CREATE TABLE IF NOT EXISTS availability_override (
+    id SERIAL PRIMARY KEY,
+    date DATE NOT NULL,
+    time_slot TEXT
+);
+
+-- Общий счётчик версии данных (инвалидация кэша между воркерами)
+CREATE TABLE IF NOT EXISTS data_version (
+    id INTEGER PRIMARY KEY,
+    version BIGINT NOT NULL,
+    changed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+INSERT INTO data_version (id, version) VALUES (1, 1) ON CONFLICT (id) DO NOTHING;
@@ -0,0 +1,103 @@
+-- Накопительные агрегаты: переживают удаление старых записей (cleanup).
+-- booked = активные записи (confirmed, pending_cancellation), cancelled = отменённые.
+CREATE TABLE IF NOT EXISTS daily_stats (
+    date DATE PRIMARY KEY,
+    booked INTEGER NOT NULL DEFAULT 0,
+    cancelled INTEGER NOT NULL DEFAULT 0,
+    present INTEGER NOT NULL DEFAULT 0,
+    absent INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS student_daily_stats (
+    date DATE NOT NULL,
+    phone TEXT NOT NULL,
+    name TEXT NOT NULL,
+    booked INTEGER NOT NULL DEFAULT 0,
+    cancelled INTEGER NOT NULL DEFAULT 0,
+    present INTEGER NOT NULL DEFAULT 0,
+    absent INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (date, phone)
+);
+
+-- До какой даты сырые записи уже удалены (сверка с bookings имеет смысл только после неё)
+CREATE TABLE IF NOT EXISTS rollup_state (
+    id INTEGER PRIMARY KEY,
+    cleaned_through DATE
+);
+
+INSERT INTO rollup_state (id, cleaned_through) VALUES (1, NULL) ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION rollup_apply(d DATE, p TEXT, n TEXT, sign INTEGER, st TEXT, att INTEGER)
+RETURNS void AS $$
+DECLARE
+    b INTEGER := sign * (st IN ('confirmed', 'pending_cancellation'))::int;
+    c INTEGER := sign * (st = 'cancelled')::int;
+    pr INTEGER := sign * COALESCE(att = 1, false)::int;
+    ab INTEGER := sign * COALESCE(att = 0, false)::int;
+BEGIN
+    INSERT INTO daily_stats AS s (date, booked, cancelled, present, absent)
+    VALUES (d, b, c, pr, ab)
+    ON CONFLICT (date) DO UPDATE SET
+        booked = s.booked + EXCLUDED.booked,
+        cancelled = s.cancelled + EXCLUDED.cancelled,
+        present = s.present + EXCLUDED.present,
+        absent = s.absent + EXCLUDED.absent;
+
+    INSERT INTO student_daily_stats AS s (date, phone, name, booked, cancelled, present, absent)
+    VALUES (d, p, n, b, c, pr, ab)
+    ON CONFLICT (date, phone) DO UPDATE SET
+        name = EXCLUDED.name,
+        booked = s.booked + EXCLUDED.booked,
+        cancelled = s.cancelled + EXCLUDED.cancelled,
+        present = s.present + EXCLUDED.present,
+        absent = s.absent + EXCLUDED.absent;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Удаление не вычитается из агрегатов: так cleanup «сворачивает» записи, а не теряет их
+CREATE OR REPLACE FUNCTION bookings_rollup() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        PERFORM rollup_apply(OLD.date, OLD.phone, OLD.name, -1, OLD.status, OLD.attended);
+    END IF;
+    PERFORM rollup_apply(NEW.date, NEW.phone, NEW.name, 1, NEW.status, NEW.attended);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS bookings_rollup_insert ON bookings;
+CREATE TRIGGER bookings_rollup_insert
+    AFTER INSERT ON bookings
+    FOR EACH ROW EXECUTE FUNCTION bookings_rollup();
+
+DROP TRIGGER IF EXISTS bookings_rollup_update ON bookings;
+CREATE TRIGGER bookings_rollup_update
+    AFTER UPDATE ON bookings
+    FOR EACH ROW
+    WHEN (OLD.status IS DISTINCT FROM NEW.status
+          OR OLD.attended IS DISTINCT FROM NEW.attended
+          OR OLD.date IS DISTINCT FROM NEW.date
+          OR OLD.phone IS DISTINCT FROM NEW.phone)
+    EXECUTE FUNCTION bookings_rollup();
+
+-- Начальное заполнение из существующих записей
+DELETE FROM daily_stats;
+DELETE FROM student_daily_stats;
+
+INSERT INTO daily_stats (date, booked, cancelled, present, absent)
+SELECT date,
+       COUNT(*) FILTER (WHERE status IN ('confirmed', 'pending_cancellation')),
+       COUNT(*) FILTER (WHERE status = 'cancelled'),
+       COUNT(*) FILTER (WHERE attended = 1),
+       COUNT(*) FILTER (WHERE attended = 0)
+FROM bookings
+GROUP BY date;
+
+INSERT INTO student_daily_stats (date, phone, name, booked, cancelled, present, absent)
+SELECT date, phone, MAX(name),
+       COUNT(*) FILTER (WHERE status IN ('confirmed', 'pending_cancellation')),
+       COUNT(*) FILTER (WHERE status = 'cancelled'),
+       COUNT(*) FILTER (WHERE attended = 1),
+       COUNT(*) FILTER (WHERE attended = 0)
+FROM bookings
+GROUP BY date, phone;
@@ -0,0 +1,9 @@
+-- Последний запуск фоновых задач: повторный запуск за тот же период ничего не делает
+CREATE TABLE IF NOT EXISTS maintenance_runs (
+    task TEXT PRIMARY KEY,
+    period TEXT NOT NULL,
+    started_at TIMESTAMPTZ NOT NULL,
+    finished_at TIMESTAMPTZ NOT NULL,
+    rows_removed INTEGER NOT NULL DEFAULT 0,
+    duration_ms INTEGER NOT NULL DEFAULT 0
+);
@@ -0,0 +1,67 @@
+-- Каталог слотов: вместо строк "14:00-14:30" в каждой записи — маленький целый id.
+-- Слот открыт в те дни недели (0 = понедельник), которые перечислены в slot_weekdays.
+CREATE TABLE IF NOT EXISTS slots (
+    id SMALLINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    starts_at TIME NOT NULL,
+    ends_at TIME NOT NULL,
+    UNIQUE (starts_at, ends_at),
+    CHECK (ends_at > starts_at)
+);
+
+CREATE TABLE IF NOT EXISTS slot_weekdays (
+    slot_id SMALLINT NOT NULL REFERENCES slots (id) ON DELETE CASCADE,
+    weekday SMALLINT NOT NULL CHECK (weekday BETWEEN 0 AND 6),
+    PRIMARY KEY (slot_id, weekday)
+);
+
+-- Прежнее расписание: 30-минутные слоты с 14:00 до 20:00, пн–сб (id 1..12 по порядку)
+INSERT INTO slots (starts_at, ends_at)
+SELECT t::time, (t + interval '30 minutes')::time
+FROM generate_series(timestamp '2000-01-01 14:00', timestamp '2000-01-01 19:30', interval '30 minutes') AS t
+ORDER BY t
+ON CONFLICT (starts_at, ends_at) DO NOTHING;
+
+INSERT INTO slot_weekdays (slot_id, weekday)
+SELECT id, d FROM slots, generate_series(0, 5) AS d
+ON CONFLICT DO NOTHING;
+
+-- Старые слоты, которых нет в прежнем списке, сохраняются в каталоге без дней недели:
+-- история их записей остаётся, но записаться на них нельзя
+INSERT INTO slots (starts_at, ends_at)
+SELECT DISTINCT substr(time_slot, 1, 5)::time, substr(time_slot, 7, 5)::time
+FROM (SELECT time_slot FROM bookings
+      UNION SELECT time_slot FROM availability_override WHERE time_slot IS NOT NULL) legacy
+WHERE time_slot ~ '^\d\d:\d\d-\d\d:\d\d$' AND substr(time_slot, 7, 5) > substr(time_slot, 1, 5)
+ON CONFLICT (starts_at, ends_at) DO NOTHING;
+
+ALTER TABLE bookings ADD COLUMN slot_id SMALLINT REFERENCES slots (id);
+ALTER TABLE availability_override ADD COLUMN slot_id SMALLINT REFERENCES slots (id);
+
+UPDATE bookings b SET slot_id = s.id
+FROM slots s
+WHERE b.time_slot = to_char(s.starts_at, 'HH24:MI') || '-' || to_char(s.ends_at, 'HH24:MI');
+
+UPDATE availability_override o SET slot_id = s.id
+FROM slots s
+WHERE o.time_slot = to_char(s.starts_at, 'HH24:MI') || '-' || to_char(s.ends_at, 'HH24:MI');
+
+-- Исключения на несуществующие слоты ничего не закрывали
+DELETE FROM availability_override WHERE time_slot IS NOT NULL AND slot_id IS NULL;
+
+-- Приложение записывало только слоты из списка, поэтому все записи сопоставлены;
+-- иначе миграция остановится здесь, не потеряв данные
+ALTER TABLE bookings ALTER COLUMN slot_id SET NOT NULL;
+
+-- Вместе с колонками удаляются и индексы по ним
+ALTER TABLE bookings DROP COLUMN time_slot;
+ALTER TABLE availability_override DROP COLUMN time_slot;
+
+CREATE UNIQUE INDEX IF NOT EXISTS bookings_active_slot_uniq
+    ON bookings (date, slot_id)
+    WHERE status IN ('confirmed', 'pending_cancellation');
+
+CREATE INDEX IF NOT EXISTS bookings_date_slot_idx
+    ON bookings (date, slot_id, status);
+
+CREATE INDEX IF NOT EXISTS availability_override_date_slot_idx
+    ON availability_override (date, slot_id);
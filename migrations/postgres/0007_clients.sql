@@ -0,0 +1,115 @@
+-- Клиенты: один ряд на телефон, записи и агрегаты ссылаются на client_id.
+-- Имя клиента — последнее, под которым он записывался.
+CREATE TABLE IF NOT EXISTS clients (
+    id SERIAL PRIMARY KEY,
+    phone TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Телефоны из агрегатов тоже: их сырые записи могли быть уже удалены очисткой
+INSERT INTO clients (phone, name)
+SELECT phone, (array_agg(name ORDER BY seen DESC, id DESC))[1]
+FROM (SELECT phone, name, date AS seen, id FROM bookings
+      UNION ALL
+      SELECT phone, name, date, 0 FROM student_daily_stats) known
+GROUP BY phone
+ORDER BY MIN(seen)
+ON CONFLICT (phone) DO NOTHING;
+
+ALTER TABLE bookings ADD COLUMN client_id INTEGER REFERENCES clients (id);
+UPDATE bookings b SET client_id = c.id FROM clients c WHERE c.phone = b.phone;
+ALTER TABLE bookings ALTER COLUMN client_id SET NOT NULL;
+
+ALTER TABLE student_daily_stats ADD COLUMN client_id INTEGER REFERENCES clients (id);
+UPDATE student_daily_stats s SET client_id = c.id FROM clients c WHERE c.phone = s.phone;
+ALTER TABLE student_daily_stats ALTER COLUMN client_id SET NOT NULL;
+
+-- Триггеры зависят от phone/name: пересоздаются ниже
+DROP TRIGGER IF EXISTS bookings_rollup_insert ON bookings;
+DROP TRIGGER IF EXISTS bookings_rollup_update ON bookings;
+DROP FUNCTION IF EXISTS rollup_apply(DATE, TEXT, TEXT, INTEGER, TEXT, INTEGER);
+
+ALTER TABLE student_daily_stats DROP CONSTRAINT student_daily_stats_pkey;
+ALTER TABLE student_daily_stats ADD PRIMARY KEY (date, client_id);
+ALTER TABLE student_daily_stats DROP COLUMN phone;
+ALTER TABLE student_daily_stats DROP COLUMN name;
+
+-- Вместе с phone удаляется и bookings_phone_date_idx
+ALTER TABLE bookings DROP COLUMN phone;
+ALTER TABLE bookings DROP COLUMN name;
+
+-- Лимиты (день/неделя) и «Мои записи»
+CREATE INDEX IF NOT EXISTS bookings_client_date_idx
+    ON bookings (client_id, date, status);
+
+-- Подтверждённые записи клиента за неделю (с понедельника): лимит — чтение одной строки
+-- Обновляется триггером в транзакции записи/отмены, как и агрегаты; удаление не вычитается
+CREATE TABLE IF NOT EXISTS client_week_counts (
+    client_id INTEGER NOT NULL REFERENCES clients (id),
+    week_start DATE NOT NULL,
+    confirmed INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (client_id, week_start)
+);
+
+INSERT INTO client_week_counts (client_id, week_start, confirmed)
+SELECT client_id, date_trunc('week', date)::date, COUNT(*)
+FROM bookings
+WHERE status = 'confirmed'
+GROUP BY 1, 2;
+
+CREATE OR REPLACE FUNCTION rollup_apply(d DATE, cl INTEGER, sign INTEGER, st TEXT, att INTEGER)
+RETURNS void AS $$
+DECLARE
+    b INTEGER := sign * (st IN ('confirmed', 'pending_cancellation'))::int;
+    c INTEGER := sign * (st = 'cancelled')::int;
+    pr INTEGER := sign * COALESCE(att = 1, false)::int;
+    ab INTEGER := sign * COALESCE(att = 0, false)::int;
+BEGIN
+    INSERT INTO daily_stats AS s (date, booked, cancelled, present, absent)
+    VALUES (d, b, c, pr, ab)
+    ON CONFLICT (date) DO UPDATE SET
+        booked = s.booked + EXCLUDED.booked,
+        cancelled = s.cancelled + EXCLUDED.cancelled,
+        present = s.present + EXCLUDED.present,
+        absent = s.absent + EXCLUDED.absent;
+
+    INSERT INTO student_daily_stats AS s (date, client_id, booked, cancelled, present, absent)
+    VALUES (d, cl, b, c, pr, ab)
+    ON CONFLICT (date, client_id) DO UPDATE SET
+        booked = s.booked + EXCLUDED.booked,
+        cancelled = s.cancelled + EXCLUDED.cancelled,
+        present = s.present + EXCLUDED.present,
+        absent = s.absent + EXCLUDED.absent;
+
+    IF st = 'confirmed' THEN
+        INSERT INTO client_week_counts AS w (client_id, week_start, confirmed)
+        VALUES (cl, date_trunc('week', d)::date, sign)
+        ON CONFLICT (client_id, week_start) DO UPDATE SET
+            confirmed = w.confirmed + EXCLUDED.confirmed;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION bookings_rollup() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        PERFORM rollup_apply(OLD.date, OLD.client_id, -1, OLD.status, OLD.attended);
+    END IF;
+    PERFORM rollup_apply(NEW.date, NEW.client_id, 1, NEW.status, NEW.attended);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER bookings_rollup_insert
+    AFTER INSERT ON bookings
+    FOR EACH ROW EXECUTE FUNCTION bookings_rollup();
+
+CREATE TRIGGER bookings_rollup_update
+    AFTER UPDATE ON bookings
+    FOR EACH ROW
+    WHEN (OLD.status IS DISTINCT FROM NEW.status
+          OR OLD.attended IS DISTINCT FROM NEW.attended
+          OR OLD.date IS DISTINCT FROM NEW.date
+          OR OLD.client_id IS DISTINCT FROM NEW.client_id)
+    EXECUTE FUNCTION bookings_rollup();
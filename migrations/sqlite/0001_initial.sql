@@ -0,0 +1,27 @@
+-- Базовая схема (SQLite)
+CREATE TABLE IF NOT EXISTS bookings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    phone TEXT NOT NULL,
+    date DATE NOT NULL,
+    time_slot TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'confirmed',
+    attended INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Исключения расписания: time_slot IS NULL = весь день отключён
+CREATE TABLE IF NOT EXISTS availability_override (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date DATE NOT NULL,
+    time_slot TEXT
+);
+
+-- Общий счётчик версии данных (инвалидация кэша между воркерами)
+CREATE TABLE IF NOT EXISTS data_version (
+    id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL,
+    changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 1);
@@ -0,0 +1,14 @@
+-- Одна активная запись на слот. Дубли, оставшиеся от гонок:
+-- первая запись остаётся, остальные отменяются.
+UPDATE bookings SET status = 'cancelled'
+WHERE status IN ('confirmed', 'pending_cancellation')
+  AND EXISTS (
+      SELECT 1 FROM bookings b
+      WHERE b.date = bookings.date AND b.time_slot = bookings.time_slot
+        AND b.status IN ('confirmed', 'pending_cancellation')
+        AND b.id < bookings.id
+  );
+
+CREATE UNIQUE INDEX IF NOT EXISTS bookings_active_slot_uniq
+    ON bookings (date, time_slot)
+    WHERE status IN ('confirmed', 'pending_cancellation');
@@ -0,0 +1,11 @@
+-- Записи клиента: лимиты (день/неделя) и «Мои записи»
+CREATE INDEX IF NOT EXISTS bookings_phone_date_idx
+    ON bookings (phone, date, status);
+
+-- Списки админки и экспорт: WHERE date >= ... ORDER BY date, time_slot
+CREATE INDEX IF NOT EXISTS bookings_date_slot_idx
+    ON bookings (date, time_slot, status);
+
+-- Исключения расписания по дате и слоту
+CREATE INDEX IF NOT EXISTS availability_override_date_slot_idx
+    ON availability_override (date, time_slot);
@@ -0,0 +1,121 @@
+-- Накопительные агрегаты: переживают удаление старых записей (cleanup).
+-- booked = активные записи (confirmed, pending_cancellation), cancelled = отменённые.
+CREATE TABLE IF NOT EXISTS daily_stats (
+    date DATE PRIMARY KEY,
+    booked INTEGER NOT NULL DEFAULT 0,
+    cancelled INTEGER NOT NULL DEFAULT 0,
+    present INTEGER NOT NULL DEFAULT 0,
+    absent INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS student_daily_stats (
+    date DATE NOT NULL,
+    phone TEXT NOT NULL,
+    name TEXT NOT NULL,
+    booked INTEGER NOT NULL DEFAULT 0,
+    cancelled INTEGER NOT NULL DEFAULT 0,
+    present INTEGER NOT NULL DEFAULT 0,
+    absent INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (date, phone)
+);
+
+CREATE TABLE IF NOT EXISTS rollup_state (
+    id INTEGER PRIMARY KEY,
+    cleaned_through DATE
+);
+
+INSERT OR IGNORE INTO rollup_state (id, cleaned_through) VALUES (1, NULL);
+
+-- Функций в SQLite нет, поэтому дельты расписаны прямо в триггерах.
+-- Удаление не вычитается из агрегатов: так cleanup «сворачивает» записи, а не теряет их.
+DROP TRIGGER IF EXISTS bookings_rollup_insert;
+CREATE TRIGGER bookings_rollup_insert AFTER INSERT ON bookings
+BEGIN
+    INSERT INTO daily_stats (date, booked, cancelled, present, absent)
+    VALUES (NEW.date, NEW.status IN ('confirmed', 'pending_cancellation'), NEW.status = 'cancelled',
+            COALESCE(NEW.attended = 1, 0), COALESCE(NEW.attended = 0, 0))
+    ON CONFLICT (date) DO UPDATE SET
+        booked = booked + excluded.booked,
+        cancelled = cancelled + excluded.cancelled,
+        present = present + excluded.present,
+        absent = absent + excluded.absent;
+
+    INSERT INTO student_daily_stats (date, phone, name, booked, cancelled, present, absent)
+    VALUES (NEW.date, NEW.phone, NEW.name, NEW.status IN ('confirmed', 'pending_cancellation'),
+            NEW.status = 'cancelled', COALESCE(NEW.attended = 1, 0), COALESCE(NEW.attended = 0, 0))
+    ON CONFLICT (date, phone) DO UPDATE SET
+        name = excluded.name,
+        booked = booked + excluded.booked,
+        cancelled = cancelled + excluded.cancelled,
+        present = present + excluded.present,
+        absent = absent + excluded.absent;
+END;
+
+DROP TRIGGER IF EXISTS bookings_rollup_update;
+CREATE TRIGGER bookings_rollup_update AFTER UPDATE ON bookings
+WHEN OLD.status IS NOT NEW.status
+  OR OLD.attended IS NOT NEW.attended
+  OR OLD.date IS NOT NEW.date
+  OR OLD.phone IS NOT NEW.phone
+BEGIN
+    INSERT INTO daily_stats (date, booked, cancelled, present, absent)
+    VALUES (OLD.date, -(OLD.status IN ('confirmed', 'pending_cancellation')), -(OLD.status = 'cancelled'),
+            -COALESCE(OLD.attended = 1, 0), -COALESCE(OLD.attended = 0, 0))
+    ON CONFLICT (date) DO UPDATE SET
+        booked = booked + excluded.booked,
+        cancelled = cancelled + excluded.cancelled,
+        present = present + excluded.present,
+        absent = absent + excluded.absent;
+
+    INSERT INTO student_daily_stats (date, phone, name, booked, cancelled, present, absent)
+    VALUES (OLD.date, OLD.phone, OLD.name, -(OLD.status IN ('confirmed', 'pending_cancellation')),
+            -(OLD.status = 'cancelled'), -COALESCE(OLD.attended = 1, 0), -COALESCE(OLD.attended = 0, 0))
+    ON CONFLICT (date, phone) DO UPDATE SET
+        booked = booked + excluded.booked,
+        cancelled = cancelled + excluded.cancelled,
+        present = present + excluded.present,
+        absent = absent + excluded.absent;
+
+    INSERT INTO daily_stats (date, booked, cancelled, present, absent)
+    VALUES (NEW.date, NEW.status IN ('confirmed', 'pending_cancellation'), NEW.status = 'cancelled',
+            COALESCE(NEW.attended = 1, 0), COALESCE(NEW.attended = 0, 0))
+    ON CONFLICT (date) DO UPDATE SET
+        booked = booked + excluded.booked,
+        cancelled = cancelled + excluded.cancelled,
+        present = present + excluded.present,
+        absent = absent + excluded.absent;
+
+    INSERT INTO student_daily_stats (date, phone, name, booked, cancelled, present, absent)
+    VALUES (NEW.date, NEW.phone, NEW.name, NEW.status IN ('confirmed', 'pending_cancellation'),
+            NEW.status = 'cancelled', COALESCE(NEW.attended = 1, 0), COALESCE(NEW.attended = 0, 0))
+    ON CONFLICT (date, phone) DO UPDATE SET
+        name = excluded.name,
+        booked = booked + excluded.booked,
+        cancelled = cancelled + excluded.cancelled,
+        present = present + excluded.present,
+        absent = absent + excluded.absent;
+END;
+
+-- Начальное заполнение из существующих записей
+DELETE FROM daily_stats;
+DELETE FROM student_daily_stats;
+
+INSERT INTO daily_stats (date, booked, cancelled, present, absent)
+SELECT date,
+       COUNT(*) FILTER (WHERE status IN ('confirmed', 'pending_cancellation')),
+       COUNT(*) FILTER (WHERE status = 'cancelled'),
+       COUNT(*) FILTER (WHERE attended = 1),
+       COUNT(*) FILTER (WHERE attended = 0)
+FROM bookings
+WHERE true
+GROUP BY date;
+
+INSERT INTO student_daily_stats (date, phone, name, booked, cancelled, present, absent)
+SELECT date, phone, MAX(name),
+       COUNT(*) FILTER (WHERE status IN ('confirmed', 'pending_cancellation')),
+       COUNT(*) FILTER (WHERE status = 'cancelled'),
+       COUNT(*) FILTER (WHERE attended = 1),
+       COUNT(*) FILTER (WHERE attended = 0)
+FROM bookings
+WHERE true
+GROUP BY date, phone;
@@ -0,0 +1,65 @@
+-- Каталог слотов (SQLite): время хранится строкой 'HH:MM'
+CREATE TABLE IF NOT EXISTS slots (
+    id INTEGER PRIMARY KEY,
+    starts_at TIME NOT NULL,
+    ends_at TIME NOT NULL,
+    UNIQUE (starts_at, ends_at),
+    CHECK (ends_at > starts_at)
+);
+
+CREATE TABLE IF NOT EXISTS slot_weekdays (
+    slot_id INTEGER NOT NULL REFERENCES slots (id) ON DELETE CASCADE,
+    weekday INTEGER NOT NULL CHECK (weekday BETWEEN 0 AND 6),
+    PRIMARY KEY (slot_id, weekday)
+) WITHOUT ROWID;
+
+-- Прежнее расписание: 30-минутные слоты с 14:00 до 20:00, пн–сб (id 1..12 по порядку)
+INSERT OR IGNORE INTO slots (starts_at, ends_at) VALUES
+    ('14:00', '14:30'), ('14:30', '15:00'), ('15:00', '15:30'), ('15:30', '16:00'),
+    ('16:00', '16:30'), ('16:30', '17:00'), ('17:00', '17:30'), ('17:30', '18:00'),
+    ('18:00', '18:30'), ('18:30', '19:00'), ('19:00', '19:30'), ('19:30', '20:00');
+
+WITH RECURSIVE days (d) AS (SELECT 0 UNION ALL SELECT d + 1 FROM days WHERE d < 5)
+INSERT OR IGNORE INTO slot_weekdays (slot_id, weekday)
+SELECT id, d FROM slots, days;
+
+-- Старые слоты, которых нет в прежнем списке, сохраняются без дней недели
+INSERT OR IGNORE INTO slots (starts_at, ends_at)
+SELECT DISTINCT substr(time_slot, 1, 5), substr(time_slot, 7, 5)
+FROM (SELECT time_slot FROM bookings
+      UNION SELECT time_slot FROM availability_override WHERE time_slot IS NOT NULL)
+WHERE time_slot GLOB '[0-2][0-9]:[0-5][0-9]-[0-2][0-9]:[0-5][0-9]'
+  AND substr(time_slot, 7, 5) > substr(time_slot, 1, 5);
+
+-- Добавить NOT NULL в SQLite можно только пересозданием таблицы (с триггерами агрегатов);
+-- slot_id всегда заполняет приложение
+ALTER TABLE bookings ADD COLUMN slot_id INTEGER REFERENCES slots (id);
+ALTER TABLE availability_override ADD COLUMN slot_id INTEGER REFERENCES slots (id);
+
+UPDATE bookings SET slot_id = (
+    SELECT id FROM slots WHERE starts_at || '-' || ends_at = bookings.time_slot
+);
+
+UPDATE availability_override SET slot_id = (
+    SELECT id FROM slots WHERE starts_at || '-' || ends_at = availability_override.time_slot
+) WHERE time_slot IS NOT NULL;
+
+DELETE FROM availability_override WHERE time_slot IS NOT NULL AND slot_id IS NULL;
+
+-- Колонку с индексом удалить нельзя: сначала индексы
+DROP INDEX IF EXISTS bookings_active_slot_uniq;
+DROP INDEX IF EXISTS bookings_date_slot_idx;
+DROP INDEX IF EXISTS availability_override_date_slot_idx;
+
+ALTER TABLE bookings DROP COLUMN time_slot;
+ALTER TABLE availability_override DROP COLUMN time_slot;
+
+CREATE UNIQUE INDEX IF NOT EXISTS bookings_active_slot_uniq
+    ON bookings (date, slot_id)
+    WHERE status IN ('confirmed', 'pending_cancellation');
+
+CREATE INDEX IF NOT EXISTS bookings_date_slot_idx
+    ON bookings (date, slot_id, status);
+
+CREATE INDEX IF NOT EXISTS availability_override_date_slot_idx
+    ON availability_override (date, slot_id);
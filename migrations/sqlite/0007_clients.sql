@@ -0,0 +1,150 @@
+-- Клиенты (SQLite): один ряд на телефон, записи и агрегаты ссылаются на client_id
+CREATE TABLE IF NOT EXISTS clients (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    phone TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Имя — последнее, под которым клиент записывался; телефоны из агрегатов тоже
+INSERT OR IGNORE INTO clients (phone, name)
+SELECT phone, name FROM (
+    SELECT phone, name,
+           ROW_NUMBER() OVER (PARTITION BY phone ORDER BY seen DESC, id DESC) AS rn,
+           MIN(seen) OVER (PARTITION BY phone) AS first_seen
+    FROM (SELECT phone, name, date AS seen, id FROM bookings
+          UNION ALL
+          SELECT phone, name, date, 0 FROM student_daily_stats)
+)
+WHERE rn = 1
+ORDER BY first_seen;
+
+ALTER TABLE bookings ADD COLUMN client_id INTEGER REFERENCES clients (id);
+UPDATE bookings SET client_id = (SELECT id FROM clients WHERE clients.phone = bookings.phone);
+
+-- Триггеры ссылаются на phone/name и на пересоздаваемую таблицу: пересоздаются ниже
+DROP TRIGGER IF EXISTS bookings_rollup_insert;
+DROP TRIGGER IF EXISTS bookings_rollup_update;
+
+-- Первичный ключ в SQLite не меняется: таблица агрегатов пересоздаётся
+CREATE TABLE student_daily_stats_new (
+    date DATE NOT NULL,
+    client_id INTEGER NOT NULL REFERENCES clients (id),
+    booked INTEGER NOT NULL DEFAULT 0,
+    cancelled INTEGER NOT NULL DEFAULT 0,
+    present INTEGER NOT NULL DEFAULT 0,
+    absent INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (date, client_id)
+);
+
+INSERT INTO student_daily_stats_new (date, client_id, booked, cancelled, present, absent)
+SELECT s.date, c.id, s.booked, s.cancelled, s.present, s.absent
+FROM student_daily_stats s JOIN clients c ON c.phone = s.phone;
+
+DROP TABLE student_daily_stats;
+ALTER TABLE student_daily_stats_new RENAME TO student_daily_stats;
+
+-- Колонку с индексом удалить нельзя: сначала индекс
+DROP INDEX IF EXISTS bookings_phone_date_idx;
+ALTER TABLE bookings DROP COLUMN phone;
+ALTER TABLE bookings DROP COLUMN name;
+
+CREATE INDEX IF NOT EXISTS bookings_client_date_idx
+    ON bookings (client_id, date, status);
+
+-- Подтверждённые записи клиента за неделю (с понедельника): лимит — чтение одной строки
+CREATE TABLE IF NOT EXISTS client_week_counts (
+    client_id INTEGER NOT NULL REFERENCES clients (id),
+    week_start DATE NOT NULL,
+    confirmed INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (client_id, week_start)
+) WITHOUT ROWID;
+
+INSERT INTO client_week_counts (client_id, week_start, confirmed)
+SELECT client_id, date(date, 'weekday 0', '-6 days'), COUNT(*)
+FROM bookings
+WHERE status = 'confirmed'
+GROUP BY 1, 2;
+
+-- Те же дельты, что и раньше, плюс недельный счётчик; удаление по-прежнему не вычитается
+CREATE TRIGGER bookings_rollup_insert AFTER INSERT ON bookings
+BEGIN
+    INSERT INTO daily_stats (date, booked, cancelled, present, absent)
+    VALUES (NEW.date, NEW.status IN ('confirmed', 'pending_cancellation'), NEW.status = 'cancelled',
+            COALESCE(NEW.attended = 1, 0), COALESCE(NEW.attended = 0, 0))
+    ON CONFLICT (date) DO UPDATE SET
+        booked = booked + excluded.booked,
+        cancelled = cancelled + excluded.cancelled,
+        present = present + excluded.present,
+        absent = absent + excluded.absent;
+
+    INSERT INTO student_daily_stats (date, client_id, booked, cancelled, present, absent)
+    VALUES (NEW.date, NEW.client_id, NEW.status IN ('confirmed', 'pending_cancellation'),
+            NEW.status = 'cancelled', COALESCE(NEW.attended = 1, 0), COALESCE(NEW.attended = 0, 0))
+    ON CONFLICT (date, client_id) DO UPDATE SET
+        booked = booked + excluded.booked,
+        cancelled = cancelled + excluded.cancelled,
+        present = present + excluded.present,
+        absent = absent + excluded.absent;
+
+    INSERT INTO client_week_counts (client_id, week_start, confirmed)
+    SELECT NEW.client_id, date(NEW.date, 'weekday 0', '-6 days'), 1
+    WHERE NEW.status = 'confirmed'
+    ON CONFLICT (client_id, week_start) DO UPDATE SET
+        confirmed = confirmed + excluded.confirmed;
+END;
+
+CREATE TRIGGER bookings_rollup_update AFTER UPDATE ON bookings
+WHEN OLD.status IS NOT NEW.status
+  OR OLD.attended IS NOT NEW.attended
+  OR OLD.date IS NOT NEW.date
+  OR OLD.client_id IS NOT NEW.client_id
+BEGIN
+    INSERT INTO daily_stats (date, booked, cancelled, present, absent)
+    VALUES (OLD.date, -(OLD.status IN ('confirmed', 'pending_cancellation')), -(OLD.status = 'cancelled'),
+            -COALESCE(OLD.attended = 1, 0), -COALESCE(OLD.attended = 0, 0))
+    ON CONFLICT (date) DO UPDATE SET
+        booked = booked + excluded.booked,
+        cancelled = cancelled + excluded.cancelled,
+        present = present + excluded.present,
+        absent = absent + excluded.absent;
+
+    INSERT INTO student_daily_stats (date, client_id, booked, cancelled, present, absent)
+    VALUES (OLD.date, OLD.client_id, -(OLD.status IN ('confirmed', 'pending_cancellation')),
+            -(OLD.status = 'cancelled'), -COALESCE(OLD.attended = 1, 0), -COALESCE(OLD.attended = 0, 0))
+    ON CONFLICT (date, client_id) DO UPDATE SET
+        booked = booked + excluded.booked,
+        cancelled = cancelled + excluded.cancelled,
+        present = present + excluded.present,
+        absent = absent + excluded.absent;
+
+    INSERT INTO client_week_counts (client_id, week_start, confirmed)
+    SELECT OLD.client_id, date(OLD.date, 'weekday 0', '-6 days'), -1
+    WHERE OLD.status = 'confirmed'
+    ON CONFLICT (client_id, week_start) DO UPDATE SET
+        confirmed = confirmed + excluded.confirmed;
+
+    INSERT INTO daily_stats (date, booked, cancelled, present, absent)
+    VALUES (NEW.date, NEW.status IN ('confirmed', 'pending_cancellation'), NEW.status = 'cancelled',
+            COALESCE(NEW.attended = 1, 0), COALESCE(NEW.attended = 0, 0))
+    ON CONFLICT (date) DO UPDATE SET
+        booked = booked + excluded.booked,
+        cancelled = cancelled + excluded.cancelled,
+        present = present + excluded.present,
+        absent = absent + excluded.absent;
+
+    INSERT INTO student_daily_stats (date, client_id, booked, cancelled, present, absent)
+    VALUES (NEW.date, NEW.client_id, NEW.status IN ('confirmed', 'pending_cancellation'),
+            NEW.status = 'cancelled', COALESCE(NEW.attended = 1, 0), COALESCE(NEW.attended = 0, 0))
+    ON CONFLICT (date, client_id) DO UPDATE SET
+        booked = booked + excluded.booked,
+        cancelled = cancelled + excluded.cancelled,
+        present = present + excluded.present,
+        absent = absent + excluded.absent;
+
+    INSERT INTO client_week_counts (client_id, week_start, confirmed)
+    SELECT NEW.client_id, date(NEW.date, 'weekday 0', '-6 days'), 1
+    WHERE NEW.status = 'confirmed'
+    ON CONFLICT (client_id, week_start) DO UPDATE SET
+        confirmed = confirmed + excluded.confirmed;
+END;
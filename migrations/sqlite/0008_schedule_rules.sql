@@ -0,0 +1,20 @@
+-- Повторяющиеся правила расписания (SQLite): время 'HH:MM', даты ISO-строками
+CREATE TABLE IF NOT EXISTS schedule_rules (
+    id INTEGER PRIMARY KEY,
+    weekday INTEGER NOT NULL CHECK (weekday BETWEEN 0 AND 6),
+    from_time TIME,
+    to_time TIME,
+    valid_from DATE,
+    valid_until DATE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CHECK (from_time IS NULL OR to_time IS NULL OR to_time > from_time),
+    CHECK (valid_from IS NULL OR valid_until IS NULL OR valid_until >= valid_from)
+);
+
+-- Исключения сохраняются разницей: одна строка на (день, слот), NULL — весь день
+DELETE FROM availability_override
+WHERE id NOT IN (SELECT MIN(id) FROM availability_override GROUP BY date, slot_id);
+
+DROP INDEX IF EXISTS availability_override_date_slot_idx;
+CREATE UNIQUE INDEX IF NOT EXISTS availability_override_date_slot_uniq
+    ON availability_override (date, COALESCE(slot_id, 0));
@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+NAMED_DAYS = 7  # дни диапазона не длиннее недели подписываются названиями
+MAX_RANGE_DAYS = 366
+
+def report_range(kind, anchor, start=None, end=None):
+    if kind == 'week':
+        start = anchor - timedelta(days=anchor.weekday())
+        end = start + timedelta(days=6)
+    elif kind == 'month':
+        start = anchor.replace(day=1)
+        end = (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    elif kind == 'custom':
+        if start is None or end is None:
+            raise ValueError("Custom range needs both dates")
+    else:
+        raise ValueError("Unknown range: %s" % kind)
+
+    if end < start or (end - start).days >= MAX_RANGE_DAYS:
+        raise ValueError("Invalid range")
+    return start, end
+
+def working_dates(start, end, catalog):
+    # Рабочие дни — те, в которые по каталогу открыт хотя бы один слот
+    days = (end - start).days + 1
+    return [start + timedelta(days=i) for i in range(days)
+            if catalog.capacity(start + timedelta(days=i))]
+
+def build_report(store, conn, start, end, catalog):
+    # Загрузка и посещаемость по дням — из накопительных агрегатов (O(дней)).
+    # Ёмкость дня считается по текущему каталогу слотов
+    per_day = {row['date']: row for row in store.daily_stats(conn, start, end)}
+    top_students = [(row['name'], row['phone'], row['cnt']) for row in store.top_students(conn, start, end)]
+
+    dates = working_dates(start, end, catalog)
+    total_slots = sum(catalog.capacity(d) for d in dates)
+    load_by_day = []
+    for d in dates:
+        cnt = per_day[d]['booked'] if d in per_day else 0
+        capacity = catalog.capacity(d)
+        load_by_day.append({
+            'day': d.strftime('%A') if len(dates) <= NAMED_DAYS else d.strftime('%a, %b %d'),
+            'count': cnt,
+            'capacity': capacity,
+            'percent': round(cnt / capacity * 100)
+        })
+
+    booked = sum(row['booked'] for row in per_day.values())
+    return {
+        'total_slots': total_slots,
+        'booked': booked,
+        'load_percent': round(booked / total_slots * 100) if total_slots else 0,
+        'present': sum(row['present'] for row in per_day.values()),
+        'absent': sum(row['absent'] for row in per_day.values()),
+        'top_students': top_students,
+        'load_by_day': load_by_day,
+    }
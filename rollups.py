@@ -0,0 +1,86 @@
+import os
+import sys
+from datetime import date, timedelta
+
+from storage import open_storage
+
+COUNTERS = ('booked', 'cancelled', 'present', 'absent')
+WEEK_COUNTERS = ('confirmed',)
+
+def default_range(store, conn, start=None, end=None):
+    # Сверять и пересчитывать можно только даты, сырые записи которых ещё не удалялись:
+    # пересчёт более ранних стёр бы агрегаты, которые уже не из чего восстановить
+    through = store.cleaned_through(conn)
+    first = through + timedelta(days=1) if through else date(2000, 1, 1)
+    if start is None or start < first:
+        start = first
+    if end is None:
+        end = date(9999, 12, 31)
+    return start, end
+
+def week_range(start, end):
+    # Недельные счётчики клиентов пересчитываются целыми неделями (с понедельника)
+    return start - timedelta(days=start.weekday()), end
+
+def backfill(store, conn, start=None, end=None):
+    start, end = default_range(store, conn, start, end)
+    try:
+        store.lock_bookings(conn)
+        days, students = store.rebuild_rollups(conn, start, end)
+        weeks = store.rebuild_week_counts(conn, *week_range(start, end))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return start, end, days, students, weeks
+
+def check(store, conn, start=None, end=None):
+    start, end = default_range(store, conn, start, end)
+    daily, students = store.raw_and_rolled(conn, start, end)
+    weeks = store.raw_and_counted_weeks(conn, *week_range(start, end))
+    conn.rollback()
+    mismatches = (_compare('daily', *daily) + _compare('student', *students)
+                  + _compare('week', *weeks, counters=WEEK_COUNTERS))
+    return start, end, mismatches
+
+def _compare(kind, raw, rolled, counters=COUNTERS):
+    mismatches = []
+    for key in set(raw) | set(rolled):
+        expected = tuple(raw[key][c] if key in raw else 0 for c in counters)
+        actual = tuple(rolled[key][c] if key in rolled else 0 for c in counters)
+        if expected != actual:
+            mismatches.append((kind, key, expected, actual))
+    return sorted(mismatches, key=lambda m: str(m[1]))
+
+def main(argv):
+    db_url = os.environ.get("DATABASE_URL")
+    if not db_url:
+        raise Exception("DATABASE_URL is required")
+    if len(argv) < 2 or argv[1] not in ('backfill', 'check'):
+        print("Usage: python rollups.py backfill|check [FROM [TO]]")
+        return 2
+    requested = date.fromisoformat(argv[2]) if len(argv) > 2 else None
+    end = date.fromisoformat(argv[3]) if len(argv) > 3 else None
+
+    store = open_storage(db_url)
+    conn = store.connect()
+    try:
+        start, end = default_range(store, conn, requested, end)
+        conn.rollback()
+        if requested and requested < start:
+            print(f"[ROLLUPS] Raw bookings before {start} were cleaned up; starting from {start}")
+        if argv[1] == 'backfill':
+            start, end, days, students, weeks = backfill(store, conn, start, end)
+            print(f"[ROLLUPS] Rebuilt {start}..{end}: {days} days, {students} student-days, "
+                  f"{weeks} client-weeks")
+            return 0
+        start, end, mismatches = check(store, conn, start, end)
+        for kind, key, expected, actual in mismatches:
+            print(f"[ROLLUPS] {kind} {key}: raw={expected} rollup={actual}")
+        print(f"[ROLLUPS] Checked {start}..{end}: {len(mismatches)} mismatches")
+        return 1 if mismatches else 0
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,49 @@
+from datetime import date, timedelta
+
+from slots import SlotCatalog, rules_from_rows
+
+def get_current_week_dates():
+    today = date.today()
+    if today.weekday() == 6:
+        start = today + timedelta(days=1)
+    else:
+        start = today - timedelta(days=today.weekday())
+    return [start + timedelta(days=i) for i in range(6)]
+
+def rule_closed(rules, day, slots):
+    # Правила разворачиваются на лету: id слотов дня, закрытых правилами
+    day_rules = [r for r in rules if r.applies_on(day)]
+    return set(s.id for s in slots if any(r.closes(s) for r in day_rules)) if day_rules else set()
+
+def build_availability(dates, catalog, disabled_days, blocked, rules=()):
+    # Строки сетки — слоты недели; {день: {slot_id: свободен}}, закрытый в этот день слот занят
+    week_slots = catalog.for_week(dates)
+    grid = {}
+    for d in dates:
+        closed = d in disabled_days
+        by_rule = rule_closed(rules, d, week_slots)
+        grid[d] = {s.id: not closed and s.open_on(d) and (d, s.id) not in blocked and s.id not in by_rule
+                   for s in week_slots}
+    return week_slots, grid
+
+def override_diff(stored, submitted):
+    # Что вставить и что удалить, чтобы исключения (день, slot_id | None) стали как в форме
+    stored, submitted = set(stored), set(submitted)
+    key = lambda entry: (entry[0], entry[1] or 0)
+    return sorted(submitted - stored, key=key), sorted(stored - submitted, key=key)
+
+def availability_to_masks(dates, week_slots, availability):
+    # Бит i дня установлен, если слот week_slots[i] свободен
+    return [sum(1 << i for i, s in enumerate(week_slots) if availability[d][s.id]) for d in dates]
+
+def load_week(store, conn, dates):
+    catalog, disabled_days, blocked, rules = store.week_schedule(conn, min(dates), max(dates))
+    return build_availability(dates, SlotCatalog.from_rows(catalog), disabled_days, blocked,
+                              rules_from_rows(rules))
+
+def load_week_masks(store, conn, dates):
+    week_slots, availability = load_week(store, conn, dates)
+    return week_slots, availability_to_masks(dates, week_slots, availability)
+
+def slots_payload(week_slots):
+    return [{'id': s.id, 'time': s.label} for s in week_slots]
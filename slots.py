@@ -0,0 +1,254 @@
+import os
+import sys
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+from storage import open_storage
+
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+WORKING_DAYS = (0, 1, 2, 3, 4, 5)  # Пн–Сб, если дни не указаны
+
+
+class Slot(namedtuple('Slot', 'id starts_at ends_at weekdays')):
+    __slots__ = ()
+
+    @property
+    def label(self):
+        return '%s-%s' % (self.starts_at.strftime('%H:%M'), self.ends_at.strftime('%H:%M'))
+
+    def open_on(self, day):
+        return day.weekday() in self.weekdays
+
+
+# Каталог слотов из таблиц slots и slot_weekdays. Небольшой и неизменяемый:
+# сетка недели строится по целым id, а меняется каталог только через python slots.py
+class SlotCatalog:
+    def __init__(self, slots):
+        self.slots = sorted(slots, key=lambda s: (s.starts_at, s.ends_at))
+        self.by_id = {s.id: s for s in self.slots}
+
+    @classmethod
+    def from_rows(cls, rows):
+        # Строки (id, starts_at, ends_at, weekday); слот без дней недели в сетку не попадает
+        spans = {}
+        weekdays = {}
+        for row in rows:
+            spans[row['id']] = (row['starts_at'], row['ends_at'])
+            days = weekdays.setdefault(row['id'], set())
+            if row['weekday'] is not None:
+                days.add(row['weekday'])
+        return cls(Slot(slot_id, starts_at, ends_at, frozenset(weekdays[slot_id]))
+                   for slot_id, (starts_at, ends_at) in spans.items())
+
+    def for_day(self, day):
+        return [s for s in self.slots if s.open_on(day)]
+
+    def for_week(self, dates):
+        # Строки сетки: слоты, открытые хотя бы в один день недели
+        return [s for s in self.slots if any(s.open_on(d) for d in dates)]
+
+    def capacity(self, day):
+        return sum(1 for s in self.slots if s.open_on(day))
+
+
+# Повторяющееся правило: в день недели weekday слоты, пересекающие окно [from_time, to_time),
+# закрыты; пустая граница — от начала/до конца дня, пустые даты — бессрочно
+class ScheduleRule(namedtuple('ScheduleRule', 'id weekday from_time to_time valid_from valid_until')):
+    __slots__ = ()
+
+    def applies_on(self, day):
+        return (day.weekday() == self.weekday
+                and (self.valid_from is None or self.valid_from <= day)
+                and (self.valid_until is None or day <= self.valid_until))
+
+    def closes(self, slot):
+        return ((self.from_time is None or slot.ends_at > self.from_time)
+                and (self.to_time is None or slot.starts_at < self.to_time))
+
+    @property
+    def label(self):
+        if self.from_time is None and self.to_time is None:
+            window = 'all day'
+        elif self.to_time is None:
+            window = 'after %s' % self.from_time.strftime('%H:%M')
+        elif self.from_time is None:
+            window = 'before %s' % self.to_time.strftime('%H:%M')
+        else:
+            window = '%s-%s' % (self.from_time.strftime('%H:%M'), self.to_time.strftime('%H:%M'))
+        label = '%s %s' % (WEEKDAYS[self.weekday], window)
+        if self.valid_from or self.valid_until:
+            label += ' (%s..%s)' % (self.valid_from or '', self.valid_until or '')
+        return label
+
+
+def rules_from_rows(rows):
+    return [ScheduleRule(**row) for row in rows]
+
+def parse_time(value):
+    return datetime.strptime(value, '%H:%M').time()
+
+def parse_weekdays(value):
+    # "mon,wed,fri", "0,2,4" или "mon-sat"
+    if value is None:
+        return WORKING_DAYS
+    days = set()
+    for part in value.lower().split(','):
+        first, _, last = part.strip().partition('-')
+        first = WEEKDAYS.index(first) if first in WEEKDAYS else int(first)
+        last = (WEEKDAYS.index(last) if last in WEEKDAYS else int(last)) if last else first
+        if not 0 <= first <= last <= 6:
+            raise ValueError("Invalid weekdays: %s" % value)
+        days.update(range(first, last + 1))
+    return tuple(sorted(days))
+
+def generate_spans(start, end, minutes):
+    # Слоты длиной minutes подряд от start до end
+    if minutes <= 0:
+        raise ValueError("Slot length must be positive")
+    spans = []
+    current = datetime.combine(date.min, start)
+    finish = datetime.combine(date.min, end)
+    step = timedelta(minutes=minutes)
+    while current + step <= finish:
+        spans.append((current.time(), (current + step).time()))
+        current += step
+    return spans
+
+def parse_window(value):
+    # "18:00-" (после 18:00), "-10:00" (до 10:00), "12:00-13:00"
+    first, _, last = value.partition('-')
+    from_time = parse_time(first) if first else None
+    to_time = parse_time(last) if last else None
+    if from_time and to_time and to_time <= from_time:
+        raise ValueError("Invalid time window: %s" % value)
+    return from_time, to_time
+
+def parse_period(value):
+    # "2026-11-01..2026-12-31", открытые концы: "2026-11-01.." или "..2026-12-31"
+    first, _, last = value.partition('..')
+    valid_from = date.fromisoformat(first) if first else None
+    valid_until = date.fromisoformat(last) if last else None
+    if valid_from and valid_until and valid_until < valid_from:
+        raise ValueError("Invalid period: %s" % value)
+    return valid_from, valid_until
+
+def overlapping(catalog, spans, weekdays, ignore=()):
+    # Один преподаватель: открытые в один день слоты не должны пересекаться
+    clashes = []
+    for starts_at, ends_at in spans:
+        for slot in catalog.slots:
+            if slot.id in ignore or not slot.weekdays & set(weekdays):
+                continue
+            if starts_at < slot.ends_at and slot.starts_at < ends_at:
+                clashes.append(slot)
+    return clashes
+
+def _commit(store, conn):
+    # Каталог — часть расписания: кэши сетки и подписчики SSE узнают об изменении по версии
+    version, _ = store.bump_version(conn)
+    store.notify_changed(conn, version)
+    conn.commit()
+
+def _print_catalog(catalog):
+    for slot in catalog.slots:
+        days = ','.join(WEEKDAYS[d] for d in sorted(slot.weekdays)) or '-'
+        print(f"[SLOTS] {slot.id:>3}  {slot.label}  {days}")
+
+def main(argv):
+    db_url = os.environ.get("DATABASE_URL")
+    if not db_url:
+        raise Exception("DATABASE_URL is required")
+    commands = ('list', 'add', 'generate', 'days', 'retire', 'rules', 'off', 'on')
+    if len(argv) < 2 or argv[1] not in commands:
+        print("Usage: python slots.py list\n"
+              "       python slots.py add HH:MM HH:MM [DAYS]\n"
+              "       python slots.py generate HH:MM HH:MM MINUTES [DAYS]\n"
+              "       python slots.py days ID [DAYS]\n"
+              "       python slots.py retire ID\n"
+              "       python slots.py rules\n"
+              "       python slots.py off DAYS [HH:MM-HH:MM] [YYYY-MM-DD..YYYY-MM-DD]\n"
+              "       python slots.py on RULE_ID\n"
+              "DAYS: mon,wed,fri | mon-sat | 0,2,4 (по умолчанию mon-sat)\n"
+              "Окно правила: 18:00- (после 18:00), -10:00 (до 10:00); без окна — весь день")
+        return 2
+
+    store = open_storage(db_url)
+    conn = store.connect()
+    try:
+        catalog = SlotCatalog.from_rows(store.slot_catalog(conn, include_closed=True))
+        command = argv[1]
+        if command == 'list':
+            conn.rollback()
+            _print_catalog(catalog)
+            return 0
+
+        if command == 'rules':
+            conn.rollback()
+            for rule in rules_from_rows(store.schedule_rules(conn)):
+                print(f"[SLOTS] rule {rule.id:>3}  {rule.label}")
+            return 0
+
+        if command == 'off':
+            # Повторяющееся правило вместо исключений на каждую дату
+            days = parse_weekdays(argv[2])
+            from_time, to_time = None, None
+            valid_from, valid_until = None, None
+            for arg in argv[3:]:
+                if '..' in arg:
+                    valid_from, valid_until = parse_period(arg)
+                else:
+                    from_time, to_time = parse_window(arg)
+            ids = store.add_rules(conn, days, from_time, to_time, valid_from, valid_until)
+            _commit(store, conn)
+            print(f"[SLOTS] Added rules: {', '.join(str(i) for i in ids)}")
+            return 0
+
+        if command == 'on':
+            if not store.delete_rule(conn, int(argv[2])):
+                conn.rollback()
+                print(f"[SLOTS] No rule {argv[2]}")
+                return 1
+            _commit(store, conn)
+            print(f"[SLOTS] Rule {argv[2]} removed")
+            return 0
+
+        if command in ('add', 'generate'):
+            start, end = parse_time(argv[2]), parse_time(argv[3])
+            if command == 'add':
+                spans = [(start, end)] if end > start else []
+                days = parse_weekdays(argv[4] if len(argv) > 4 else None)
+            else:
+                spans = generate_spans(start, end, int(argv[4]))
+                days = parse_weekdays(argv[5] if len(argv) > 5 else None)
+            if not spans:
+                print("[SLOTS] Nothing to add")
+                return 2
+            clashes = overlapping(catalog, spans, days)
+            if clashes:
+                print("[SLOTS] Overlaps existing slots: %s" % ', '.join(s.label for s in clashes))
+                return 1
+            ids = store.add_slots(conn, spans, days)
+            _commit(store, conn)
+            print(f"[SLOTS] Added {len(ids)} slots")
+            return 0
+
+        slot = catalog.by_id.get(int(argv[2]))
+        if slot is None:
+            print(f"[SLOTS] No slot {argv[2]}")
+            return 1
+        days = () if command == 'retire' else parse_weekdays(argv[3] if len(argv) > 3 else None)
+        clashes = overlapping(catalog, [(slot.starts_at, slot.ends_at)], days, ignore=(slot.id,))
+        if clashes:
+            print("[SLOTS] Overlaps existing slots: %s" % ', '.join(s.label for s in clashes))
+            return 1
+        # Прошлые записи на слот сохраняются; retire только закрывает его для новых записей
+        store.set_slot_weekdays(conn, slot.id, days)
+        _commit(store, conn)
+        print(f"[SLOTS] Slot {slot.id} ({slot.label}) is open on: "
+              f"{','.join(WEEKDAYS[d] for d in days) or 'no days'}")
+        return 0
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
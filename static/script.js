@@ -22,11 +22,11 @@ function initThemeToggle() {
 
 // Функции модального окна (только для главной)
 function initBookingModal() {
-    window.openBookingModal = function(date, time) {
+    window.openBookingModal = function(date, slotId) {
         const modal = document.getElementById('modal');
         if (modal) {
             document.getElementById('date-input').value = date;
-            document.getElementById('time-input').value = time;
+            document.getElementById('slot-input').value = slotId;
             modal.style.display = 'flex';
         }
     };
@@ -49,7 +49,9 @@ function initBookingModal() {
                 if (response.ok) {
                     window.location.href = '/success';
                 } else {
-                    response.text().then(text => alert('Error: ' + text));
+                    // Слот могли занять — сразу подтягиваем изменения сетки
+                    const refreshed = window.refreshAvailability ? window.refreshAvailability() : Promise.resolve();
+                    response.text().then(text => refreshed.then(() => alert('Error: ' + text)));
                 }
             })
             .catch(err => alert('Network error'));
@@ -57,8 +59,169 @@ function initBookingModal() {
     }
 }
 
+// Обновление сетки без перезагрузки страницы: /api/availability отдаёт маски свободных слотов
+// по дням (бит i — i-й слот недели, data-slots), а с ?since=<версия> — только изменившиеся дни
+function initAvailabilityRefresh() {
+    const grid = document.getElementById('weekGrid');
+    if (!grid) return;
+
+    const POLL_INTERVAL = 15000;
+    const week = grid.dataset.week;
+    let version = Number(grid.dataset.version);
+    let etag = '"api-' + week + '-' + version + '"';
+    let pending = null;
+
+    function setSlot(el, available) {
+        if (el.classList.contains('available') === available) return;
+        el.classList.toggle('available', available);
+        el.classList.toggle('unavailable', !available);
+        el.querySelector('.status').textContent = available ? '✅' : '🔒';
+        el.onclick = available ? () => window.openBookingModal(el.dataset.date, el.dataset.slot) : null;
+    }
+
+    function applyMask(date, mask) {
+        grid.querySelectorAll('.slot[data-date="' + date + '"]').forEach((el, i) => {
+            setSlot(el, ((mask >> i) & 1) === 1);
+        });
+    }
+
+    function applyPayload(data) {
+        if (data.week !== week || (data.slots && data.slots.map(s => s.id).join(',') !== grid.dataset.slots)) {
+            // Началась новая неделя или изменился каталог слотов — сетка другая целиком
+            window.location.reload();
+            return;
+        }
+        if (data.version < version) return;
+        if (data.changed) {
+            Object.keys(data.changed).forEach(date => applyMask(date, data.changed[date]));
+        } else {
+            data.days.forEach((date, i) => applyMask(date, data.free[i]));
+        }
+        version = data.version;
+        etag = '"api-' + week + '-' + version + '"';
+    }
+
+    function refresh() {
+        if (pending) return pending;
+        pending = fetch('/api/availability?since=' + version, {
+            headers: { 'If-None-Match': etag },
+            cache: 'no-store'
+        })
+        .then(response => {
+            if (response.status === 304 || !response.ok) return null;
+            etag = response.headers.get('ETag') || etag;
+            return response.json();
+        })
+        .then(data => {
+            if (data) applyPayload(data);
+        })
+        .catch(() => {})
+        .then(() => { pending = null; });
+        return pending;
+    }
+
+    // Живые изменения через SSE; пока поток подключён, опрос не нужен
+    let source = null;
+    if (grid.dataset.events && window.EventSource) {
+        source = new EventSource(grid.dataset.events + '?since=' + version);
+        source.addEventListener('slots', event => applyPayload(JSON.parse(event.data)));
+    }
+    const streaming = () => source && source.readyState === EventSource.OPEN;
+
+    window.refreshAvailability = refresh;
+    setInterval(() => {
+        if (!document.hidden && !streaming()) refresh();
+    }, POLL_INTERVAL);
+    document.addEventListener('visibilitychange', () => {
+        if (!document.hidden && !streaming()) refresh();
+    });
+}
+
+// Записи в админке: строки приходят страницами с /admin/bookings, следующая — по «Load more»
+function initAdminBookings() {
+    const body = document.getElementById('adminBookings');
+    if (!body) return;
+    const filter = document.getElementById('bookingsFilter');
+    let request = 0;
+
+    function load(url, append) {
+        const current = ++request;
+        return fetch(url, { credentials: 'same-origin' })
+            .then(response => response.ok ? response.text() : Promise.reject(response.status))
+            .then(html => {
+                if (current !== request) return; // фильтр успели сменить
+                if (!append) body.innerHTML = '';
+                const more = body.querySelector('.load-more');
+                if (more) more.remove();
+                body.insertAdjacentHTML('beforeend', html);
+            })
+            .catch(() => {
+                if (current !== request) return;
+                if (append) {
+                    const more = body.querySelector('.load-more');
+                    if (more) delete more.dataset.loading; // можно нажать ещё раз
+                } else {
+                    body.innerHTML = '<tr><td colspan="7">Failed to load bookings</td></tr>';
+                }
+            });
+    }
+
+    function source() {
+        return body.dataset.src + (filter ? '?status=' + encodeURIComponent(filter.value) : '');
+    }
+
+    body.addEventListener('click', event => {
+        const more = event.target.closest('.load-more');
+        if (!more) return;
+        event.preventDefault();
+        if (more.dataset.loading) return;
+        more.dataset.loading = '1';
+        load(more.dataset.next, true);
+    });
+    if (filter) filter.addEventListener('change', () => load(source(), false));
+    load(source(), false);
+}
+
+// Пакетные действия админки: выбранные в строках действия — одним POST /admin/batch
+function initAdminBatch() {
+    const button = document.getElementById('batchSubmit');
+    if (!button) return;
+
+    button.addEventListener('click', () => {
+        const selects = Array.from(document.querySelectorAll('.batch-action')).filter(el => el.value);
+        if (!selects.length) return;
+        const byId = {};
+        const ops = selects.map(el => {
+            byId[el.dataset.id] = el;
+            return { id: Number(el.dataset.id), action: el.value };
+        });
+        button.disabled = true;
+        fetch(button.dataset.url, {
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ ops: ops })
+        })
+        .then(response => response.ok ? response.json() : response.text().then(text => Promise.reject(text)))
+        .then(data => {
+            const failed = data.results.filter(r => r.result !== 'ok');
+            failed.forEach(r => {
+                const el = byId[r.id];
+                if (el) el.nextElementSibling.textContent = r.result;
+            });
+            // Всё применилось — перерисовываем страницу с новыми статусами
+            if (!failed.length) window.location.reload();
+        })
+        .catch(err => alert('Error: ' + err))
+        .then(() => { button.disabled = false; });
+    });
+}
+
 // Запуск при загрузке
 document.addEventListener('DOMContentLoaded', function () {
     initThemeToggle();
     initBookingModal();
+    initAvailabilityRefresh();
+    initAdminBookings();
+    initAdminBatch();
 });
\ No newline at end of file
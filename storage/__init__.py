@@ -0,0 +1,12 @@
+from storage.base import Storage, ACTIVE_STATUSES
+
+def open_storage(url):
+    # Бэкенд выбирается по схеме DATABASE_URL
+    scheme = url.split(':', 1)[0].lower()
+    if scheme in ('postgres', 'postgresql'):
+        from storage.postgres import PostgresStorage
+        return PostgresStorage(url)
+    if scheme == 'sqlite':
+        from storage.sqlite import SqliteStorage
+        return SqliteStorage(url)
+    raise Exception("Unsupported DATABASE_URL scheme: %s" % scheme)
@@ -0,0 +1,566 @@
+ACTIVE_STATUSES = ('confirmed', 'pending_cancellation')
+
+
+# Операции с данными, которые нужны маршрутам и фоновым задачам.
+# SQL здесь переносимый (PostgreSQL и SQLite), параметры — в стиле %s / %(name)s;
+# бэкенды переопределяют только то, что отличается, и сами управляют соединениями.
+# Методы не коммитят — транзакцией владеет вызывающий код.
+class Storage:
+    dialect = None
+
+    def __init__(self, url):
+        self.url = url
+        # Наблюдатели за запросами: callable(sql, seconds), вызываются в потоке запроса
+        self.listeners = []
+
+    def _observe(self, sql, seconds):
+        for listener in self.listeners:
+            listener(sql, seconds)
+
+    # === Соединения ===
+    def connect(self):
+        raise NotImplementedError
+
+    def cursor(self, conn):
+        raise NotImplementedError
+
+    def is_closed(self, conn):
+        raise NotImplementedError
+
+    def in_transaction(self, conn):
+        raise NotImplementedError
+
+    def ping(self, conn):
+        with self.cursor(conn) as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+
+    # Значения дат/времени, которые драйвер может вернуть строкой
+    def _date(self, value):
+        return value
+
+    def _time(self, value):
+        return value
+
+    def _timestamp(self, value):
+        return value
+
+    # === Миграции ===
+    def schema_version(self, conn):
+        raise NotImplementedError
+
+    def lock_migrations(self, conn):
+        pass
+
+    def unlock_migrations(self, conn):
+        pass
+
+    def applied_migrations(self, conn):
+        with self.cursor(conn) as cur:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            cur.execute("SELECT version FROM schema_version")
+            done = set(row['version'] for row in cur.fetchall())
+        conn.commit()
+        return done
+
+    def apply_migration(self, conn, version, name, sql):
+        raise NotImplementedError
+
+    # === Версия данных ===
+    def data_version(self, conn):
+        with self.cursor(conn) as cur:
+            cur.execute("SELECT version, changed_at FROM data_version WHERE id = 1")
+            row = cur.fetchone()
+        return row['version'], self._timestamp(row['changed_at'])
+
+    def bump_version(self, conn):
+        with self.cursor(conn) as cur:
+            cur.execute("""
+                UPDATE data_version SET version = version + 1, changed_at = CURRENT_TIMESTAMP
+                WHERE id = 1 RETURNING version, changed_at
+            """)
+            row = cur.fetchone()
+        return row['version'], self._timestamp(row['changed_at'])
+
+    # === Уведомления об изменениях ===
+    # Бэкенды с каналом уведомлений (PostgreSQL LISTEN/NOTIFY) переопределяют все три метода;
+    # без канала listen_changes() возвращает None и подписчики опрашивают data_version
+    def notify_changed(self, conn, version):
+        pass
+
+    def listen_changes(self):
+        return None
+
+    def poll_changes(self, listener):
+        return []
+
+    # === Каталог слотов ===
+    def slot_catalog(self, conn, include_closed=False):
+        # Строки (id, starts_at, ends_at, weekday); include_closed — и слоты без дней недели
+        join = "LEFT JOIN" if include_closed else "JOIN"
+        with self.cursor(conn) as cur:
+            cur.execute("""
+                SELECT s.id, s.starts_at, s.ends_at, w.weekday
+                FROM slots s """ + join + """ slot_weekdays w ON w.slot_id = s.id
+                ORDER BY s.starts_at, s.id, w.weekday
+            """)
+            return [dict(row, starts_at=self._time(row['starts_at']), ends_at=self._time(row['ends_at']))
+                    for row in cur.fetchall()]
+
+    def add_slots(self, conn, spans, weekdays):
+        # Уже существующий слот (например, закрытый) не дублируется, а открывается в эти дни
+        ids = []
+        with self.cursor(conn) as cur:
+            for starts_at, ends_at in spans:
+                cur.execute("""
+                    INSERT INTO slots (starts_at, ends_at) VALUES (%s, %s)
+                    ON CONFLICT (starts_at, ends_at) DO UPDATE SET starts_at = EXCLUDED.starts_at
+                    RETURNING id
+                """, (starts_at, ends_at))
+                ids.append(cur.fetchone()['id'])
+            for slot_id in ids:
+                for weekday in weekdays:
+                    cur.execute(
+                        "INSERT INTO slot_weekdays (slot_id, weekday) VALUES (%s, %s) ON CONFLICT DO NOTHING",
+                        (slot_id, weekday)
+                    )
+        return ids
+
+    def set_slot_weekdays(self, conn, slot_id, weekdays):
+        with self.cursor(conn) as cur:
+            cur.execute("DELETE FROM slot_weekdays WHERE slot_id = %s", (slot_id,))
+            for weekday in weekdays:
+                cur.execute("INSERT INTO slot_weekdays (slot_id, weekday) VALUES (%s, %s)", (slot_id, weekday))
+
+    # === Расписание ===
+    def week_schedule(self, conn, start, end):
+        # Один запрос на промах кэша: открытые слоты каталога, исключения, активные записи
+        # и правила, действующие в периоде. Каталог идёт первым: по нему выводятся типы колонок
+        with self.cursor(conn) as cur:
+            cur.execute("""
+                SELECT 'slot' AS kind, NULL AS date, CAST(NULL AS DATE) AS until,
+                       s.id, w.weekday, s.starts_at, s.ends_at
+                FROM slots s JOIN slot_weekdays w ON w.slot_id = s.id
+                UNION ALL
+                SELECT 'off', date, NULL, slot_id, NULL, NULL, NULL FROM availability_override
+                WHERE date BETWEEN %(start)s AND %(end)s
+                UNION ALL
+                SELECT 'off', date, NULL, slot_id, NULL, NULL, NULL FROM bookings
+                WHERE date BETWEEN %(start)s AND %(end)s AND status IN ('confirmed', 'pending_cancellation')
+                UNION ALL
+                SELECT 'rule', valid_from, valid_until, id, weekday, from_time, to_time FROM schedule_rules
+                WHERE (valid_from IS NULL OR valid_from <= %(end)s)
+                  AND (valid_until IS NULL OR valid_until >= %(start)s)
+            """, {'start': start.isoformat(), 'end': end.isoformat()})
+            rows = cur.fetchall()
+        catalog = []
+        disabled_days = set()
+        blocked = set()
+        rules = []
+        for row in rows:
+            if row['kind'] == 'slot':
+                catalog.append({'id': row['id'], 'weekday': row['weekday'],
+                                'starts_at': self._time(row['starts_at']), 'ends_at': self._time(row['ends_at'])})
+            elif row['kind'] == 'rule':
+                rules.append(self._rule(row['id'], row['weekday'], row['starts_at'], row['ends_at'],
+                                        row['date'], row['until']))
+            elif row['id'] is None:
+                disabled_days.add(self._date(row['date']))
+            else:
+                blocked.add((self._date(row['date']), row['id']))
+        return catalog, disabled_days, blocked, rules
+
+    def overrides(self, conn, start, end):
+        with self.cursor(conn) as cur:
+            cur.execute(
+                "SELECT date, slot_id FROM availability_override WHERE date BETWEEN %s AND %s",
+                (start.isoformat(), end.isoformat())
+            )
+            return [dict(row, date=self._date(row['date'])) for row in cur.fetchall()]
+
+    def change_overrides(self, conn, added, removed):
+        # Разница исключений (день, slot_id | None) — по одному запросу на вставку и удаление
+        with self.cursor(conn) as cur:
+            if removed:
+                where = []
+                params = []
+                for day, slot_id in removed:
+                    if slot_id is None:
+                        where.append("(date = %s AND slot_id IS NULL)")
+                        params.append(day.isoformat())
+                    else:
+                        where.append("(date = %s AND slot_id = %s)")
+                        params += [day.isoformat(), slot_id]
+                cur.execute("DELETE FROM availability_override WHERE " + " OR ".join(where), params)
+            if added:
+                cur.execute(
+                    "INSERT INTO availability_override (date, slot_id) VALUES "
+                    + ", ".join(["(%s, %s)"] * len(added)) + " ON CONFLICT DO NOTHING",
+                    [value for day, slot_id in added for value in (day.isoformat(), slot_id)]
+                )
+
+    def _rule(self, rule_id, weekday, from_time, to_time, valid_from, valid_until):
+        return {'id': rule_id, 'weekday': weekday,
+                'from_time': self._time(from_time), 'to_time': self._time(to_time),
+                'valid_from': self._date(valid_from), 'valid_until': self._date(valid_until)}
+
+    def schedule_rules(self, conn):
+        with self.cursor(conn) as cur:
+            cur.execute("""
+                SELECT id, weekday, from_time, to_time, valid_from, valid_until FROM schedule_rules
+                ORDER BY weekday, from_time, id
+            """)
+            return [self._rule(row['id'], row['weekday'], row['from_time'], row['to_time'],
+                               row['valid_from'], row['valid_until']) for row in cur.fetchall()]
+
+    def add_rules(self, conn, weekdays, from_time, to_time, valid_from, valid_until):
+        # Одна строка на день недели: так правило проверяется равенством weekday
+        ids = []
+        with self.cursor(conn) as cur:
+            for weekday in weekdays:
+                cur.execute("""
+                    INSERT INTO schedule_rules (weekday, from_time, to_time, valid_from, valid_until)
+                    VALUES (%s, %s, %s, %s, %s) RETURNING id
+                """, (weekday, from_time, to_time,
+                      valid_from.isoformat() if valid_from else None,
+                      valid_until.isoformat() if valid_until else None))
+                ids.append(cur.fetchone()['id'])
+        return ids
+
+    def delete_rule(self, conn, rule_id):
+        with self.cursor(conn) as cur:
+            cur.execute("DELETE FROM schedule_rules WHERE id = %s", (rule_id,))
+            return cur.rowcount
+
+    # === Записи ===
+    # Подпись слота в выборках для людей (списки, экспорт); в таблицах — только slot_id
+    SLOT_LABEL_SQL = "s.starts_at || '-' || s.ends_at"
+    # Понедельник недели даты — ключ недельных счётчиков client_week_counts
+    WEEK_START_SQL = "date({col}, 'weekday 0', '-6 days')"
+    # Закрыт ли слот %(slot)s правилом расписания на день %(date)s (%(weekday)s — его день недели):
+    # слот пересекает окно правила [from_time, to_time)
+    RULE_BLOCKED_SQL = """
+        EXISTS (SELECT 1 FROM schedule_rules r JOIN slots rs ON rs.id = %(slot)s
+                WHERE r.weekday = %(weekday)s
+                  AND (r.valid_from IS NULL OR r.valid_from <= %(date)s)
+                  AND (r.valid_until IS NULL OR r.valid_until >= %(date)s)
+                  AND (r.from_time IS NULL OR rs.ends_at > r.from_time)
+                  AND (r.to_time IS NULL OR rs.starts_at < r.to_time))"""
+    # Телефон для админки маскируется в запросе (как mask_phone): +998*****567
+    MASKED_PHONE_SQL = ("CASE WHEN length(c.phone) >= 7 THEN substr(c.phone, 1, 4)"
+                        " || replace(hex(zeroblob(length(c.phone) - 7)), '00', '*')"
+                        " || substr(c.phone, -3) ELSE c.phone END")
+
+    def create_booking(self, conn, name, phone, target_date, slot_id, limit):
+        # Возвращает словарь с флагами blocked/taken/same_day, week_count и booking_id
+        raise NotImplementedError
+
+    def client_bookings(self, conn, phone, since):
+        with self.cursor(conn) as cur:
+            cur.execute(
+                """SELECT b.id, b.date, """ + self.SLOT_LABEL_SQL + """ AS time_slot, b.status
+                   FROM clients c
+                   JOIN bookings b ON b.client_id = c.id
+                   JOIN slots s ON s.id = b.slot_id
+                   WHERE c.phone = %s AND b.date >= %s ORDER BY b.date, s.starts_at""",
+                (phone, since.isoformat())
+            )
+            return cur.fetchall()
+
+    def set_status(self, conn, booking_id, status):
+        with self.cursor(conn) as cur:
+            cur.execute("UPDATE bookings SET status = %s WHERE id = %s", (status, booking_id))
+            return cur.rowcount
+
+    def set_attendance(self, conn, booking_id, attended):
+        with self.cursor(conn) as cur:
+            cur.execute("UPDATE bookings SET attended = %s WHERE id = %s", (attended, booking_id))
+            return cur.rowcount
+
+    # Пакетные действия админки: (присваивание, условие на текущее состояние записи)
+    BATCH_ACTIONS = {
+        'present': ("attended = 1", "status <> 'cancelled'"),
+        'absent': ("attended = 0", "status <> 'cancelled'"),
+        'approve': ("status = 'cancelled'", "status = 'pending_cancellation'"),
+        'reject': ("status = 'confirmed'", "status = 'pending_cancellation'"),
+        'cancel': ("status = 'cancelled'", "status = 'confirmed'"),
+    }
+
+    def apply_batch(self, conn, actions):
+        # actions: {действие: [id]}; одно UPDATE на действие. Возвращает ({действие: изменённые id},
+        # существующие id) — по ним видно, что запись пропущена условием, а не отсутствует
+        applied = {}
+        ids = sorted(set(i for action_ids in actions.values() for i in action_ids))
+        with self.cursor(conn) as cur:
+            for action, action_ids in actions.items():
+                assignment, condition = self.BATCH_ACTIONS[action]
+                placeholders = ", ".join(["%s"] * len(action_ids))
+                cur.execute(
+                    "UPDATE bookings SET " + assignment + " WHERE id IN (" + placeholders + ") AND "
+                    + condition + " RETURNING id",
+                    list(action_ids)
+                )
+                applied[action] = set(row['id'] for row in cur.fetchall())
+            existing = set()
+            if ids:
+                cur.execute("SELECT id FROM bookings WHERE id IN (" + ", ".join(["%s"] * len(ids)) + ")", ids)
+                existing = set(row['id'] for row in cur.fetchall())
+        return applied, existing
+
+    def bookings_on(self, conn, day):
+        with self.cursor(conn) as cur:
+            cur.execute("""
+                SELECT b.id, c.name, """ + self.MASKED_PHONE_SQL + """ AS masked_phone,
+                       """ + self.SLOT_LABEL_SQL + """ AS time_slot, b.status, b.attended
+                FROM bookings b
+                JOIN clients c ON c.id = b.client_id
+                JOIN slots s ON s.id = b.slot_id
+                WHERE b.date = %s
+                ORDER BY s.starts_at
+            """, (day.isoformat(),))
+            return cur.fetchall()
+
+    def bookings_page(self, conn, since, after=None, statuses=None, limit=50):
+        # Страница записей с даты since по ключу (date, starts_at, id): after — ключ последней
+        # строки прошлой страницы. Условие b.date >= ... даёт индексу начать с нужного дня
+        where = ["b.date >= %(since)s"]
+        params = {'since': since.isoformat(), 'limit': limit}
+        if after is not None:
+            where.append("(b.date, s.starts_at, b.id) > (%(date)s, %(starts_at)s, %(id)s)")
+            params.update(date=after[0].isoformat(), starts_at=after[1], id=after[2])
+            params['since'] = max(since, after[0]).isoformat()
+        if statuses:
+            where.append("b.status IN (" + ", ".join("%%(status%d)s" % i for i in range(len(statuses))) + ")")
+            params.update(('status%d' % i, status) for i, status in enumerate(statuses))
+        with self.cursor(conn) as cur:
+            cur.execute("""
+                SELECT b.id, c.name, """ + self.MASKED_PHONE_SQL + """ AS masked_phone, b.date,
+                       s.starts_at, """ + self.SLOT_LABEL_SQL + """ AS time_slot, b.status, b.attended
+                FROM bookings b
+                JOIN clients c ON c.id = b.client_id
+                JOIN slots s ON s.id = b.slot_id
+                WHERE """ + " AND ".join(where) + """
+                ORDER BY b.date, s.starts_at, b.id
+                LIMIT %(limit)s
+            """, params)
+            return [dict(row, date=self._date(row['date']), starts_at=self._time(row['starts_at']))
+                    for row in cur.fetchall()]
+
+    # === Экспорт ===
+    def _export_filter(self, start, end):
+        where = "b.date >= %s"
+        params = [start.isoformat()]
+        if end is not None:
+            where += " AND b.date <= %s"
+            params.append(end.isoformat())
+        return where, params
+
+    def export_widths(self, conn, start, end):
+        where, params = self._export_filter(start, end)
+        with self.cursor(conn) as cur:
+            cur.execute("""
+                SELECT MAX(LENGTH(c.name)) AS name, MAX(LENGTH(c.phone)) AS phone,
+                       MAX(LENGTH(CAST(b.date AS TEXT))) AS date,
+                       MAX(LENGTH(""" + self.SLOT_LABEL_SQL + """)) AS time_slot,
+                       MAX(LENGTH(b.status)) AS status,
+                       MAX(CASE WHEN b.attended = 1 THEN 7
+                                WHEN b.attended = 0 THEN 6
+                                ELSE 10 END) AS attendance
+                FROM bookings b
+                JOIN clients c ON c.id = b.client_id
+                JOIN slots s ON s.id = b.slot_id
+                WHERE """ + where, params)
+            return cur.fetchone()
+
+    EXPORT_SQL = """
+        SELECT c.name, c.phone, b.date, {slot_label} AS time_slot, b.status,
+               CASE WHEN b.attended = 1 THEN 'Present'
+                    WHEN b.attended = 0 THEN 'Absent'
+                    ELSE 'Not marked' END as attendance
+        FROM bookings b
+        JOIN clients c ON c.id = b.client_id
+        JOIN slots s ON s.id = b.slot_id
+        WHERE {where}
+        ORDER BY b.date, s.starts_at
+    """
+
+    def iter_export(self, conn, start, end, batch_size):
+        where, params = self._export_filter(start, end)
+        with self.cursor(conn) as cur:
+            cur.execute(self.EXPORT_SQL.format(where=where, slot_label=self.SLOT_LABEL_SQL), params)
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+
+    # === Отчёты (из накопительных агрегатов) ===
+    def daily_stats(self, conn, start, end):
+        with self.cursor(conn) as cur:
+            cur.execute("""
+                SELECT date, booked, present, absent
+                FROM daily_stats
+                WHERE date BETWEEN %s AND %s
+            """, (start.isoformat(), end.isoformat()))
+            return [dict(row, date=self._date(row['date'])) for row in cur.fetchall()]
+
+    def top_students(self, conn, start, end, limit=5):
+        with self.cursor(conn) as cur:
+            cur.execute("""
+                SELECT c.name, c.phone, top.cnt
+                FROM (SELECT client_id, SUM(booked + cancelled) AS cnt
+                      FROM student_daily_stats
+                      WHERE date BETWEEN %s AND %s
+                      GROUP BY client_id
+                      ORDER BY cnt DESC
+                      LIMIT %s) top
+                JOIN clients c ON c.id = top.client_id
+                ORDER BY top.cnt DESC
+            """, (start.isoformat(), end.isoformat(), limit))
+            return cur.fetchall()
+
+    # === Накопительные агрегаты ===
+    RAW_DAILY_SQL = """
+        SELECT date,
+               COUNT(*) FILTER (WHERE status IN ('confirmed', 'pending_cancellation')) AS booked,
+               COUNT(*) FILTER (WHERE status = 'cancelled') AS cancelled,
+               COUNT(*) FILTER (WHERE attended = 1) AS present,
+               COUNT(*) FILTER (WHERE attended = 0) AS absent
+        FROM bookings
+        WHERE date BETWEEN %(start)s AND %(end)s
+        GROUP BY date
+    """
+
+    RAW_STUDENT_SQL = """
+        SELECT date, client_id,
+               COUNT(*) FILTER (WHERE status IN ('confirmed', 'pending_cancellation')) AS booked,
+               COUNT(*) FILTER (WHERE status = 'cancelled') AS cancelled,
+               COUNT(*) FILTER (WHERE attended = 1) AS present,
+               COUNT(*) FILTER (WHERE attended = 0) AS absent
+        FROM bookings
+        WHERE date BETWEEN %(start)s AND %(end)s
+        GROUP BY date, client_id
+    """
+
+    # Недели считаются целиком: start — понедельник
+    RAW_WEEK_SQL = """
+        SELECT client_id, {week_start} AS week_start, COUNT(*) AS confirmed
+        FROM bookings
+        WHERE date BETWEEN %(start)s AND %(end)s AND status = 'confirmed'
+        GROUP BY 1, 2
+    """
+
+    def cleaned_through(self, conn):
+        with self.cursor(conn) as cur:
+            cur.execute("SELECT cleaned_through FROM rollup_state WHERE id = 1")
+            row = cur.fetchone()
+        return self._date(row['cleaned_through']) if row else None
+
+    def mark_cleaned(self, conn, through):
+        with self.cursor(conn) as cur:
+            cur.execute("""
+                UPDATE rollup_state
+                SET cleaned_through = CASE
+                    WHEN cleaned_through IS NULL OR cleaned_through < %s THEN %s
+                    ELSE cleaned_through END
+                WHERE id = 1
+            """, (through.isoformat(), through.isoformat()))
+
+    def lock_bookings(self, conn):
+        pass
+
+    def rebuild_rollups(self, conn, start, end):
+        params = {'start': start.isoformat(), 'end': end.isoformat()}
+        with self.cursor(conn) as cur:
+            cur.execute("DELETE FROM daily_stats WHERE date BETWEEN %(start)s AND %(end)s", params)
+            cur.execute("DELETE FROM student_daily_stats WHERE date BETWEEN %(start)s AND %(end)s", params)
+            cur.execute("""
+                INSERT INTO daily_stats (date, booked, cancelled, present, absent)
+                SELECT date, booked, cancelled, present, absent FROM (""" + self.RAW_DAILY_SQL + """) raw
+            """, params)
+            days = cur.rowcount
+            cur.execute("""
+                INSERT INTO student_daily_stats (date, client_id, booked, cancelled, present, absent)
+                SELECT date, client_id, booked, cancelled, present, absent FROM (""" + self.RAW_STUDENT_SQL + """) raw
+            """, params)
+            students = cur.rowcount
+        return days, students
+
+    def _raw_week_sql(self):
+        return self.RAW_WEEK_SQL.format(week_start=self.WEEK_START_SQL.format(col='date'))
+
+    def rebuild_week_counts(self, conn, start, end):
+        params = {'start': start.isoformat(), 'end': end.isoformat()}
+        with self.cursor(conn) as cur:
+            cur.execute("DELETE FROM client_week_counts WHERE week_start BETWEEN %(start)s AND %(end)s", params)
+            cur.execute("""
+                INSERT INTO client_week_counts (client_id, week_start, confirmed)
+                SELECT client_id, week_start, confirmed FROM (""" + self._raw_week_sql() + """) raw
+            """, params)
+            return cur.rowcount
+
+    def raw_and_rolled(self, conn, start, end):
+        params = {'start': start.isoformat(), 'end': end.isoformat()}
+        with self.cursor(conn) as cur:
+            cur.execute(self.RAW_DAILY_SQL, params)
+            raw_daily = {self._date(row['date']): row for row in cur.fetchall()}
+            cur.execute("SELECT * FROM daily_stats WHERE date BETWEEN %(start)s AND %(end)s", params)
+            daily = {self._date(row['date']): row for row in cur.fetchall()}
+            cur.execute(self.RAW_STUDENT_SQL, params)
+            raw_students = {(self._date(row['date']), row['client_id']): row for row in cur.fetchall()}
+            cur.execute("SELECT * FROM student_daily_stats WHERE date BETWEEN %(start)s AND %(end)s", params)
+            students = {(self._date(row['date']), row['client_id']): row for row in cur.fetchall()}
+        return (raw_daily, daily), (raw_students, students)
+
+    def raw_and_counted_weeks(self, conn, start, end):
+        params = {'start': start.isoformat(), 'end': end.isoformat()}
+        with self.cursor(conn) as cur:
+            cur.execute(self._raw_week_sql(), params)
+            raw = {(self._date(row['week_start']), row['client_id']): row for row in cur.fetchall()}
+            cur.execute("SELECT * FROM client_week_counts WHERE week_start BETWEEN %(start)s AND %(end)s", params)
+            counted = {(self._date(row['week_start']), row['client_id']): row for row in cur.fetchall()}
+        return raw, counted
+
+    # === Обслуживание ===
+    def try_lock_maintenance(self, conn):
+        return True
+
+    def unlock_maintenance(self, conn):
+        pass
+
+    def last_run(self, conn, task):
+        with self.cursor(conn) as cur:
+            cur.execute("SELECT * FROM maintenance_runs WHERE task = %s", (task,))
+            return cur.fetchone()
+
+    def delete_old_bookings(self, conn, cutoff, batch_size):
+        with self.cursor(conn) as cur:
+            cur.execute("""
+                DELETE FROM bookings
+                WHERE id IN (
+                    SELECT id FROM bookings
+                    WHERE date <= %s AND status IN ('confirmed', 'cancelled')
+                    ORDER BY id
+                    LIMIT %s
+                )
+            """, (cutoff.isoformat(), batch_size))
+            return cur.rowcount
+
+    def record_run(self, conn, task, period, started_at, rows_removed, duration_ms):
+        with self.cursor(conn) as cur:
+            cur.execute("""
+                INSERT INTO maintenance_runs (task, period, started_at, finished_at, rows_removed, duration_ms)
+                VALUES (%s, %s, %s, CURRENT_TIMESTAMP, %s, %s)
+                ON CONFLICT (task) DO UPDATE SET
+                    period = EXCLUDED.period,
+                    started_at = EXCLUDED.started_at,
+                    finished_at = EXCLUDED.finished_at,
+                    rows_removed = EXCLUDED.rows_removed,
+                    duration_ms = EXCLUDED.duration_ms
+            """, (task, period, started_at, rows_removed, duration_ms))
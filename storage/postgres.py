@@ -0,0 +1,187 @@
+import time
+from datetime import timedelta
+
+import psycopg2
+from psycopg2.extensions import STATUS_READY, ISOLATION_LEVEL_AUTOCOMMIT, connection
+from psycopg2.extras import RealDictCursor
+
+from storage.base import Storage
+
+# Ключи advisory-блокировок: миграции и очистку выполняет только один процесс
+MIGRATION_LOCK_ID = 814201
+CLEANUP_LOCK_ID = 814202
+
+# Канал NOTIFY: payload — новая версия данных
+CHANGES_CHANNEL = 'booking_changes'
+
+
+class _Connection(connection):
+    storage = None
+
+
+class _Cursor(RealDictCursor):
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            if self.connection.storage is not None:
+                self.connection.storage._observe(query, time.perf_counter() - start)
+
+
+class PostgresStorage(Storage):
+    dialect = 'postgres'
+
+    SLOT_LABEL_SQL = "to_char(s.starts_at, 'HH24:MI') || '-' || to_char(s.ends_at, 'HH24:MI')"
+    WEEK_START_SQL = "date_trunc('week', {col})::date"
+    MASKED_PHONE_SQL = ("CASE WHEN length(c.phone) >= 7 THEN left(c.phone, 4) || repeat('*', length(c.phone) - 7)"
+                        " || right(c.phone, 3) ELSE c.phone END")
+
+    def connect(self):
+        conn = psycopg2.connect(self.url, connection_factory=_Connection, cursor_factory=_Cursor)
+        conn.storage = self
+        return conn
+
+    def cursor(self, conn):
+        return conn.cursor()
+
+    def is_closed(self, conn):
+        return bool(conn.closed)
+
+    def in_transaction(self, conn):
+        return conn.status != STATUS_READY
+
+    # === Миграции ===
+    def schema_version(self, conn):
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT MAX(version) AS version FROM schema_version")
+                row = cur.fetchone()
+            conn.commit()
+        except psycopg2.errors.UndefinedTable:
+            conn.rollback()
+            return 0
+        return row['version'] or 0
+
+    def lock_migrations(self, conn):
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+
+    def unlock_migrations(self, conn):
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+        conn.commit()
+
+    def apply_migration(self, conn, version, name, sql):
+        try:
+            with conn.cursor() as cur:
+                cur.execute(sql)
+                cur.execute(
+                    "INSERT INTO schema_version (version, name) VALUES (%s, %s)",
+                    (version, name)
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    # === Уведомления об изменениях ===
+    def notify_changed(self, conn, version):
+        # Внутри транзакции записи: слушатели получат уведомление только после COMMIT
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_notify(%s, %s)", (CHANGES_CHANNEL, str(version)))
+
+    def listen_changes(self):
+        listener = psycopg2.connect(self.url)
+        listener.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with listener.cursor() as cur:
+            cur.execute("LISTEN " + CHANGES_CHANNEL)
+        return listener
+
+    def poll_changes(self, listener):
+        listener.poll()
+        payloads = [n.payload for n in listener.notifies]
+        del listener.notifies[:]
+        return payloads
+
+    # === Записи ===
+    def create_booking(self, conn, name, phone, target_date, slot_id, limit):
+        monday = target_date - timedelta(days=target_date.weekday())
+        with conn.cursor() as cur:
+            # Строка клиента блокируется до конца транзакции: параллельные записи одного клиента
+            # идут по очереди и не обходят недельный лимит
+            cur.execute("""
+                INSERT INTO clients (phone, name) VALUES (%s, %s)
+                ON CONFLICT (phone) DO UPDATE SET name = EXCLUDED.name
+                RETURNING id
+            """, (phone, name))
+            client_id = cur.fetchone()['id']
+
+            # Все проверки и вставка одним запросом; гонку за слот решает уникальный индекс.
+            # Недельный лимит — одна строка client_week_counts (её ведёт триггер bookings)
+            cur.execute("""
+                WITH checks AS (
+                    SELECT
+                        (NOT EXISTS (SELECT 1 FROM slot_weekdays
+                                     WHERE slot_id = %(slot)s AND weekday = %(weekday)s)
+                         OR EXISTS (SELECT 1 FROM availability_override
+                                    WHERE date = %(date)s
+                                      AND (slot_id IS NULL OR slot_id = %(slot)s))
+                         OR """ + self.RULE_BLOCKED_SQL + """) AS blocked,
+                        EXISTS (SELECT 1 FROM bookings
+                                WHERE date = %(date)s AND slot_id = %(slot)s
+                                  AND status IN ('confirmed', 'pending_cancellation')) AS taken,
+                        EXISTS (SELECT 1 FROM bookings
+                                WHERE client_id = %(client)s AND date = %(date)s
+                                  AND status = 'confirmed') AS same_day,
+                        COALESCE((SELECT confirmed FROM client_week_counts
+                                  WHERE client_id = %(client)s AND week_start = %(monday)s), 0) AS week_count
+                ),
+                inserted AS (
+                    INSERT INTO bookings (client_id, date, slot_id, status)
+                    SELECT %(client)s, %(date)s, %(slot)s, 'confirmed'
+                    FROM checks
+                    WHERE NOT blocked AND NOT taken AND NOT same_day AND week_count < %(limit)s
+                    ON CONFLICT (date, slot_id)
+                        WHERE status IN ('confirmed', 'pending_cancellation') DO NOTHING
+                    RETURNING id
+                )
+                SELECT checks.*, (SELECT id FROM inserted) AS booking_id FROM checks
+            """, {
+                'client': client_id, 'slot': slot_id, 'weekday': target_date.weekday(),
+                'date': target_date.isoformat(), 'monday': monday.isoformat(),
+                'limit': limit,
+            })
+            return cur.fetchone()
+
+    # === Экспорт ===
+    def iter_export(self, conn, start, end, batch_size):
+        where, params = self._export_filter(start, end)
+        # Серверный курсор: строки приходят пачками, в памяти не больше batch_size
+        with conn.cursor(name='bookings_export') as cur:
+            cur.itersize = batch_size
+            cur.execute(self.EXPORT_SQL.format(where=where, slot_label=self.SLOT_LABEL_SQL), params)
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+
+    # === Накопительные агрегаты ===
+    def lock_bookings(self, conn):
+        # Блокируем запись в bookings, чтобы триггеры не наложились на пересчёт
+        with conn.cursor() as cur:
+            cur.execute("LOCK TABLE bookings IN SHARE MODE")
+
+    # === Обслуживание ===
+    def try_lock_maintenance(self, conn):
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_lock(%s) AS locked", (CLEANUP_LOCK_ID,))
+            locked = cur.fetchone()['locked']
+        conn.commit()
+        return locked
+
+    def unlock_maintenance(self, conn):
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (CLEANUP_LOCK_ID,))
+        conn.commit()
@@ -0,0 +1,186 @@
+import re
+import time
+import sqlite3
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from functools import lru_cache
+
+from storage.base import Storage
+
+# Даты хранятся ISO-строками, время слотов — 'HH:MM'; колонки DATE/TIME/TIMESTAMP читаются обратно
+sqlite3.register_adapter(date, lambda v: v.isoformat())
+sqlite3.register_adapter(datetime, lambda v: v.isoformat(' '))
+sqlite3.register_adapter(dt_time, lambda v: v.isoformat('minutes'))
+sqlite3.register_converter('DATE', lambda v: date.fromisoformat(v.decode()[:10]))
+sqlite3.register_converter('TIME', lambda v: dt_time.fromisoformat(v.decode()))
+sqlite3.register_converter('TIMESTAMP', lambda v: datetime.fromisoformat(v.decode()))
+
+
+@lru_cache(maxsize=256)
+def _translate(sql):
+    # %(name)s -> :name, %s -> ?
+    return re.sub(r'%\((\w+)\)s', r':\1', sql).replace('%s', '?')
+
+def _dict_row(cursor, row):
+    return {col[0]: value for col, value in zip(cursor.description, row)}
+
+
+class _Cursor:
+    def __init__(self, cur, storage):
+        self._cur = cur
+        self._storage = storage
+
+    def execute(self, sql, params=()):
+        start = time.perf_counter()
+        try:
+            self._cur.execute(_translate(sql), params)
+        finally:
+            self._storage._observe(sql, time.perf_counter() - start)
+        return self
+
+    def fetchone(self):
+        return self._cur.fetchone()
+
+    def fetchall(self):
+        return self._cur.fetchall()
+
+    def fetchmany(self, size):
+        return self._cur.fetchmany(size)
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+    def close(self):
+        self._cur.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# SQLite для бенчмарков и разработки без сервера БД: sqlite:///path/to/file.db
+class SqliteStorage(Storage):
+    dialect = 'sqlite'
+
+    def __init__(self, url, timeout=30.0):
+        super().__init__(url)
+        self.path = url[len('sqlite:///'):] if url.startswith('sqlite:///') else url[len('sqlite:'):]
+        self.timeout = timeout
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False,
+                               detect_types=sqlite3.PARSE_DECLTYPES)
+        conn.row_factory = _dict_row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def cursor(self, conn):
+        return _Cursor(conn.cursor(), self)
+
+    def is_closed(self, conn):
+        try:
+            conn.total_changes
+        except sqlite3.ProgrammingError:
+            return True
+        return False
+
+    def in_transaction(self, conn):
+        return conn.in_transaction
+
+    def _begin_immediate(self, conn):
+        # Берём блокировку записи сразу, а не при первом UPDATE/INSERT
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+
+    def _date(self, value):
+        if isinstance(value, str):
+            return date.fromisoformat(value[:10])
+        return value
+
+    def _time(self, value):
+        if isinstance(value, str):
+            return dt_time.fromisoformat(value)
+        return value
+
+    def _timestamp(self, value):
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        if isinstance(value, datetime) and value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value
+
+    # === Миграции ===
+    def schema_version(self, conn):
+        row = conn.execute(
+            "SELECT 1 AS found FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'"
+        ).fetchone()
+        if row is None:
+            return 0
+        return conn.execute("SELECT MAX(version) AS version FROM schema_version").fetchone()['version'] or 0
+
+    def apply_migration(self, conn, version, name, sql):
+        if conn.in_transaction:
+            conn.commit()
+        try:
+            # executescript сам коммитит перед запуском, поэтому транзакция — внутри скрипта
+            conn.executescript(
+                "BEGIN;\n%s\n;INSERT INTO schema_version (version, name) VALUES (%d, '%s');\nCOMMIT;"
+                % (sql, int(version), name)
+            )
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+
+    # === Записи ===
+    def create_booking(self, conn, name, phone, target_date, slot_id, limit):
+        monday = target_date - timedelta(days=target_date.weekday())
+        # SQLite допускает одного писателя: BEGIN IMMEDIATE сериализует проверки и вставку
+        self._begin_immediate(conn)
+        with self.cursor(conn) as cur:
+            cur.execute("""
+                INSERT INTO clients (phone, name) VALUES (%s, %s)
+                ON CONFLICT (phone) DO UPDATE SET name = excluded.name
+                RETURNING id
+            """, (phone, name))
+            params = {
+                'client': cur.fetchone()['id'], 'slot': slot_id, 'weekday': target_date.weekday(),
+                'date': target_date.isoformat(), 'monday': monday.isoformat(),
+            }
+            cur.execute("""
+                SELECT
+                    (NOT EXISTS (SELECT 1 FROM slot_weekdays
+                                 WHERE slot_id = %(slot)s AND weekday = %(weekday)s)
+                     OR EXISTS (SELECT 1 FROM availability_override
+                                WHERE date = %(date)s
+                                  AND (slot_id IS NULL OR slot_id = %(slot)s))
+                     OR """ + self.RULE_BLOCKED_SQL + """) AS blocked,
+                    EXISTS (SELECT 1 FROM bookings
+                            WHERE date = %(date)s AND slot_id = %(slot)s
+                              AND status IN ('confirmed', 'pending_cancellation')) AS taken,
+                    EXISTS (SELECT 1 FROM bookings
+                            WHERE client_id = %(client)s AND date = %(date)s
+                              AND status = 'confirmed') AS same_day,
+                    COALESCE((SELECT confirmed FROM client_week_counts
+                              WHERE client_id = %(client)s AND week_start = %(monday)s), 0) AS week_count
+            """, params)
+            checks = cur.fetchone()
+            checks['booking_id'] = None
+            if not (checks['blocked'] or checks['taken'] or checks['same_day']) and checks['week_count'] < limit:
+                cur.execute("""
+                    INSERT INTO bookings (client_id, date, slot_id, status)
+                    VALUES (%(client)s, %(date)s, %(slot)s, 'confirmed')
+                    ON CONFLICT (date, slot_id)
+                        WHERE status IN ('confirmed', 'pending_cancellation') DO NOTHING
+                    RETURNING id
+                """, params)
+                row = cur.fetchone()
+                checks['booking_id'] = row['id'] if row else None
+        return checks
+
+    # === Накопительные агрегаты ===
+    def lock_bookings(self, conn):
+        self._begin_immediate(conn)
@@ -0,0 +1,75 @@
+import os
+import sys
+import tempfile
+
+import psycopg2
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Окружение задаётся до импорта app: лимиты /book и кэши читают его при импорте.
+# Фоновая очистка не должна удалять засеянные записи посреди теста. Все клиенты тестов
+# приходят с одного адреса — лимиты частоты и очередь записи выключены, а кэш отказов
+# не живёт: каждый POST /book доходит до транзакции (test_admission подменяет их своими)
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ["MAINTENANCE_INTERVAL"] = "0"
+os.environ["BOOK_IP_RATE"] = "0"
+os.environ["BOOK_PHONE_RATE"] = "0"
+os.environ["BOOK_CONCURRENCY"] = "1000"
+os.environ["BOOK_QUEUE"] = "1000"
+os.environ["BOOK_REJECTIONS_TTL"] = "0"
+
+import db  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def postgres_url(request):
+    # TEST_POSTGRES_URL с отдельной схемой на модуль тестов: схема удаляется после, данные базы не затрагиваются
+    url = os.environ.get("TEST_POSTGRES_URL")
+    if not url:
+        pytest.skip("TEST_POSTGRES_URL is not set")
+    schema = '%s_%d' % (request.module.__name__.rsplit('.', 1)[-1], os.getpid())
+    admin = psycopg2.connect(url)
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute("DROP SCHEMA IF EXISTS " + schema + " CASCADE")
+        cur.execute("CREATE SCHEMA " + schema)
+    try:
+        yield url + ('&' if '?' in url else '?') + 'options=-csearch_path%3D' + schema
+    finally:
+        with admin.cursor() as cur:
+            cur.execute("DROP SCHEMA IF EXISTS " + schema + " CASCADE")
+        admin.close()
+
+
+@pytest.fixture(scope='module')
+def sqlite_url():
+    return 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='booking-tests-'), 'test.db')
+
+
+@pytest.fixture(scope='module', params=['sqlite', 'postgres'])
+def database_url(request):
+    # Приложение на базе теста (SQLite или PostgreSQL): бэкенд и пул открываются заново и закрываются после
+    url = request.getfixturevalue(request.param + '_url')
+    saved = os.environ.get("DATABASE_URL")
+    os.environ["DATABASE_URL"] = url
+    db.close_pool()
+    db._storage = None
+    try:
+        yield url
+    finally:
+        db.close_pool()
+        db._storage = None
+        if saved is None:
+            os.environ.pop("DATABASE_URL", None)
+        else:
+            os.environ["DATABASE_URL"] = saved
+
+
+@pytest.fixture(scope='module')
+def flask_app(database_url):
+    import app as booking_app
+
+    booking_app.init_db()
+    return booking_app.create_app({'TESTING': True})
@@ -0,0 +1,80 @@
+from datetime import date, timedelta
+
+import db
+
+
+def next_week(weekday):
+    today = date.today()
+    return today - timedelta(days=today.weekday()) + timedelta(days=7 + weekday)
+
+def book(client, phone, slot_id):
+    response = client.post('/book', data={'name': 'Student', 'phone': phone,
+                                          'date': next_week(1).isoformat(), 'slot_id': slot_id})
+    assert response.status_code == 302
+    store = db.get_storage()
+    with db.get_pool().connection() as conn, store.cursor(conn) as cur:
+        cur.execute("SELECT b.id FROM bookings b JOIN clients c ON c.id = b.client_id "
+                    "WHERE c.phone = %s AND b.slot_id = %s", (phone, slot_id))
+        return cur.fetchone()['id']
+
+def booking_state(booking_id):
+    store = db.get_storage()
+    with db.get_pool().connection() as conn, store.cursor(conn) as cur:
+        cur.execute("SELECT status, attended FROM bookings WHERE id = %s", (booking_id,))
+        row = cur.fetchone()
+        return row['status'], row['attended']
+
+
+def test_mixed_batch(flask_app):
+    client = flask_app.test_client()
+    present, cancel, untouched = (book(client, '+99893000000%d' % i, slot_id)
+                                  for i, slot_id in enumerate((4, 5, 6)))
+    with client.session_transaction() as session:
+        session['admin'] = True
+
+    ops = [
+        {'id': present, 'action': 'present'},
+        {'id': cancel, 'action': 'cancel'},
+        {'id': untouched, 'action': ['cancel']},
+        {'id': untouched, 'action': {'name': 'cancel'}},
+        {'id': untouched, 'action': 'approve'},
+        {'id': present, 'action': 'absent'},
+        {'id': str(untouched), 'action': 'cancel'},
+        {'id': 2**31 - 1, 'action': 'present'},
+        'cancel',
+    ]
+    response = client.post('/admin/batch', json={'ops': ops})
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['applied'] == 2
+    assert [item['result'] for item in body['results']] == [
+        'ok', 'ok', 'invalid', 'invalid', 'skipped', 'duplicate', 'invalid', 'not_found', 'invalid']
+    assert booking_state(present) == ('confirmed', 1)
+    assert booking_state(cancel) == ('cancelled', None)
+    assert booking_state(untouched) == ('confirmed', None)
+
+def test_malformed_batch(flask_app):
+    client = flask_app.test_client()
+    with client.session_transaction() as session:
+        session['admin'] = True
+
+    assert client.post('/admin/batch', json={'ops': {'id': 1, 'action': 'present'}}).status_code == 400
+    assert client.post('/admin/batch', json=[]).status_code == 400
+
+def test_cancel_now_from_bookings_list(flask_app):
+    # Кнопка «Cancel Now» из фрагмента списка должна вести на существующий маршрут
+    client = flask_app.test_client()
+    booking_id = book(client, '+998931000000', 7)
+    with client.session_transaction() as session:
+        session['admin'] = True
+
+    page = client.get('/admin/bookings?status=active').get_data(as_text=True)
+    action = '/admin/cancel/%d' % booking_id
+    assert 'action="%s"' % action in page
+
+    assert client.post(action).status_code == 302
+    assert booking_state(booking_id) == ('cancelled', None)
+    # Повторная отмена ничего не меняет
+    assert client.post(action).status_code == 302
+    assert booking_state(booking_id) == ('cancelled', None)
@@ -0,0 +1,94 @@
+import threading
+import time
+from datetime import date, timedelta
+
+import admission
+import app as booking_app
+import db
+from cache import VersionedCache
+
+
+def next_week(weekday):
+    today = date.today()
+    return today - timedelta(days=today.weekday()) + timedelta(days=7 + weekday)
+
+def form(phone, weekday, slot_id):
+    return {'name': 'Student', 'phone': phone, 'date': next_week(weekday).isoformat(), 'slot_id': slot_id}
+
+def booking_id(phone, weekday):
+    store = db.get_storage()
+    with db.get_pool().connection() as conn, store.cursor(conn) as cur:
+        cur.execute("SELECT b.id FROM bookings b JOIN clients c ON c.id = b.client_id "
+                    "WHERE c.phone = %s AND b.date = %s", (phone, next_week(weekday)))
+        return cur.fetchone()['id']
+
+
+def test_phone_and_ip_rate_limits(flask_app, monkeypatch):
+    # conftest выключает лимиты для всех тестов — здесь они свои, с пустыми баками
+    monkeypatch.setattr(booking_app, 'phone_limiter', admission.RateLimiter(rate=0.01, burst=2))
+    client = flask_app.test_client()
+    assert client.post('/book', data=form('+998920000001', 0, 1)).status_code == 302
+    assert client.post('/book', data=form('+998920000001', 1, 1)).status_code == 302
+    response = client.post('/book', data=form('+998920000001', 2, 1))
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '100'
+    # Лимит — на телефон: другой телефон проходит
+    assert client.post('/book', data=form('+998920000002', 2, 1)).status_code == 302
+
+    monkeypatch.setattr(booking_app, 'ip_limiter', admission.RateLimiter(rate=0.5, burst=1))
+    first, other = {'REMOTE_ADDR': '10.0.0.1'}, {'REMOTE_ADDR': '10.0.0.2'}
+    assert client.post('/book', data=form('+998920000003', 0, 2), environ_base=first).status_code == 302
+    response = client.post('/book', data=form('+998920000004', 1, 2), environ_base=first)
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '2'
+    assert client.post('/book', data=form('+998920000004', 1, 2), environ_base=other).status_code == 302
+    assert booking_app.ip_limiter.stats() == {'keys': 2, 'allowed': 2, 'limited': 1}
+
+def test_full_booking_queue_returns_503(flask_app, monkeypatch):
+    gate = admission.ConcurrencyGate(limit=1, queue_size=1, timeout=5)
+    monkeypatch.setattr(booking_app, 'booking_gate', gate)
+    # Единственное место занято: первый запрос встаёт в очередь, следующий получает отказ сразу
+    assert gate.acquire()
+    queued = []
+    waiter = threading.Thread(target=lambda: queued.append(
+        flask_app.test_client().post('/book', data=form('+998921000001', 0, 5)).status_code))
+    waiter.start()
+    deadline = time.monotonic() + 5
+    while gate.stats()['waiting'] < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    response = flask_app.test_client().post('/book', data=form('+998921000002', 1, 5))
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+
+    gate.release()
+    waiter.join()
+    assert queued == [302]
+    assert gate.stats() == {'active': 0, 'waiting': 0, 'admitted': 2, 'queued': 1, 'rejected': 1, 'timed_out': 0}
+
+def test_cancellations_clear_cached_rejections(flask_app, monkeypatch):
+    rejections = VersionedCache(max_entries=64, ttl=60)
+    monkeypatch.setattr(booking_app, 'booking_rejections', rejections)
+    client = flask_app.test_client()
+    phone, rival = '+998922000001', '+998922000002'
+    for weekday in range(3):
+        assert client.post('/book', data=form(phone, weekday, 7)).status_code == 302
+
+    # Недельный лимит: отказ запоминается, запрос отмены освобождает место
+    response = client.post('/book', data=form(phone, 3, 7))
+    assert (response.status_code, response.get_data(as_text=True)) == (400, "Maximum 3 sessions per week.")
+    assert rejections.stats()['entries'] == 1
+    monday = booking_id(phone, 0)
+    assert client.post('/cancel/%d' % monday).status_code == 302
+    assert rejections.stats()['entries'] == 0
+    assert client.post('/book', data=form(phone, 3, 7)).status_code == 302
+
+    # Слот ждёт подтверждения отмены: отказ снова в кэше, пока админ её не подтвердит
+    response = client.post('/book', data=form(rival, 0, 7))
+    assert (response.status_code, response.get_data(as_text=True)) == (400, "Slot is not available")
+    assert rejections.stats()['entries'] == 1
+    with client.session_transaction() as session:
+        session['admin'] = True
+    assert client.post('/admin/approve_cancel/%d' % monday).status_code == 302
+    assert rejections.stats()['entries'] == 0
+    assert client.post('/book', data=form(rival, 0, 7)).status_code == 302
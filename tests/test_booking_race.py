@@ -0,0 +1,59 @@
+import threading
+from datetime import date, timedelta
+
+import app as booking_app
+import db
+
+THREADS = 40
+
+
+def next_week(weekday):
+    # День следующей недели: слоты каталога по умолчанию открыты пн–сб
+    today = date.today()
+    return today - timedelta(days=today.weekday()) + timedelta(days=7 + weekday)
+
+def post_together(flask_app, forms):
+    # Каждый поток со своим клиентом; барьер выпускает все POST /book одновременно
+    barrier = threading.Barrier(len(forms))
+    results = [None] * len(forms)
+
+    def worker(i, form):
+        client = flask_app.test_client()
+        barrier.wait()
+        response = client.post('/book', data=form)
+        results[i] = (response.status_code, response.get_data(as_text=True))
+
+    threads = [threading.Thread(target=worker, args=(i, form)) for i, form in enumerate(forms)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+def active_bookings(where, params):
+    store = db.get_storage()
+    with db.get_pool().connection() as conn, store.cursor(conn) as cur:
+        cur.execute("SELECT COUNT(*) AS n FROM bookings b JOIN clients c ON c.id = b.client_id "
+                    "WHERE b.status IN ('confirmed', 'pending_cancellation') AND " + where, params)
+        return cur.fetchone()['n']
+
+def test_one_slot_many_students(flask_app):
+    day = next_week(0)
+    forms = [{'name': 'Student %d' % i, 'phone': '+99890%07d' % i, 'date': day.isoformat(), 'slot_id': 1}
+             for i in range(THREADS)]
+    results = post_together(flask_app, forms)
+
+    assert [status for status, _ in results].count(302) == 1
+    assert all(body == "Slot is not available" for status, body in results if status != 302)
+    assert active_bookings("b.date = %s AND b.slot_id = %s", (day, 1)) == 1
+
+def test_weekly_limit_under_parallel_bookings(flask_app):
+    # Один телефон, по два слота на каждый день недели: пройти должны ровно WEEKLY_LIMIT записей
+    phone = '+998911234567'
+    forms = [{'name': 'Student', 'phone': phone, 'date': next_week(weekday).isoformat(), 'slot_id': slot_id}
+             for weekday in range(6) for slot_id in (2, 3)]
+    results = post_together(flask_app, forms)
+
+    assert [status for status, _ in results].count(302) == booking_app.WEEKLY_LIMIT
+    assert active_bookings("c.phone = %s AND b.date BETWEEN %s AND %s",
+                           (phone, next_week(0), next_week(6))) == booking_app.WEEKLY_LIMIT
@@ -0,0 +1,63 @@
+from datetime import timedelta
+
+import psycopg2
+import pytest
+
+from cleanup import cleanup_cutoff, cleanup_old_bookings
+from migrate import migrate
+from storage import open_storage
+
+
+@pytest.fixture
+def pg_store(postgres_url):
+    store = open_storage(postgres_url)
+    conn = store.connect()
+    try:
+        migrate(store, conn)
+        yield store, conn
+    finally:
+        conn.close()
+
+
+def test_failed_cleanup_releases_maintenance_lock(pg_store, monkeypatch):
+    store, conn = pg_store
+
+    def failing_delete(conn, cutoff, batch_size):
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 / 0")
+
+    monkeypatch.setattr(store, 'delete_old_bookings', failing_delete)
+    # Наружу выходит исходная ошибка пакета, а не ошибка прерванной транзакции при снятии блокировки
+    with pytest.raises(psycopg2.errors.DivisionByZero):
+        cleanup_old_bookings(store, conn, force=True)
+
+    other = store.connect()
+    try:
+        assert store.try_lock_maintenance(other)
+        store.unlock_maintenance(other)
+    finally:
+        other.close()
+
+
+def test_cleanup_notifies_subscribers(pg_store):
+    store, conn = pg_store
+    with store.cursor(conn) as cur:
+        cur.execute("INSERT INTO clients (phone, name) VALUES (%s, %s) RETURNING id", ('+998940000000', 'Student'))
+        client_id = cur.fetchone()['id']
+        cur.execute("INSERT INTO bookings (date, slot_id, client_id, status) VALUES (%s, %s, %s, 'confirmed')",
+                    (cleanup_cutoff() - timedelta(days=7), 1, client_id))
+    conn.commit()
+    before, _ = store.data_version(conn)
+    conn.rollback()
+
+    listener = store.listen_changes()
+    try:
+        result = cleanup_old_bookings(store, conn, force=True)
+        # Как после любой записи: версия данных выросла, подписчики SSE получили её после COMMIT
+        version, _ = store.data_version(conn)
+        conn.rollback()
+        assert result['rows_removed'] == 1
+        assert version == before + 1
+        assert store.poll_changes(listener) == [str(version)]
+    finally:
+        listener.close()
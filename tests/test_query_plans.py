@@ -0,0 +1,177 @@
+import random
+import re
+from datetime import date, timedelta
+
+from migrate import migrate
+from storage import open_storage
+
+# Таблицы, которые растут с числом записей: полный проход по ним на горячем пути — регрессия
+LARGE_TABLES = {'bookings', 'clients', 'availability_override', 'client_week_counts',
+                'daily_stats', 'student_daily_stats'}
+
+CLIENTS = 20000
+PAST_DAYS = 600
+FUTURE_DAYS = 120
+CANCELLED_PER_SLOT = 3
+WEEKLY_LIMIT = 3
+
+
+def seed(store, conn):
+    # Два года записей: на каждый слот дня одна активная и несколько отменённых,
+    # клиентов больше, чем записей за день, и по исключению расписания на каждый день
+    rng = random.Random(1)
+    first = date.today() - timedelta(days=PAST_DAYS)
+    with store.cursor(conn) as cur:
+        cur.execute("SELECT id FROM slots")
+        slot_ids = [row['id'] for row in cur.fetchall()]
+        clients = [('+99890%07d' % i, 'Student %d' % i) for i in range(CLIENTS)]
+        for k in range(0, len(clients), 400):
+            chunk = clients[k:k + 400]
+            cur.execute("INSERT INTO clients (phone, name) VALUES " + ", ".join(["(%s, %s)"] * len(chunk)),
+                        [value for row in chunk for value in row])
+        cur.execute("SELECT id FROM clients")
+        client_ids = [row['id'] for row in cur.fetchall()]
+
+        rows = []
+        for offset in range(PAST_DAYS + FUTURE_DAYS):
+            day = first + timedelta(days=offset)
+            for slot_id in slot_ids:
+                rows.append((day, slot_id, rng.choice(client_ids), 'confirmed'))
+                rows.extend((day, slot_id, rng.choice(client_ids), 'cancelled') for _ in range(CANCELLED_PER_SLOT))
+        overrides = [(first + timedelta(days=offset), rng.choice(slot_ids))
+                     for offset in range(PAST_DAYS + FUTURE_DAYS)]
+        for k in range(0, len(overrides), 400):
+            chunk = overrides[k:k + 400]
+            cur.execute("INSERT INTO availability_override (date, slot_id) VALUES "
+                        + ", ".join(["(%s, %s)"] * len(chunk)),
+                        [value for row in chunk for value in row])
+        for k in range(0, len(rows), 250):
+            chunk = rows[k:k + 250]
+            cur.execute("INSERT INTO bookings (date, slot_id, client_id, status) VALUES "
+                        + ", ".join(["(%s, %s, %s, %s)"] * len(chunk)),
+                        [value for row in chunk for value in row])
+        cur.execute("ANALYZE")
+    conn.commit()
+
+def hot_paths(store, conn):
+    # Запросы маршрутов под нагрузкой: сетка недели, запись (слот, день и неделя ученика),
+    # «Мои записи» и админка (сегодня, исключения недели и страницы списка записей)
+    today = date.today()
+    monday = today - timedelta(days=today.weekday())
+    free_day = monday + timedelta(days=7 * (FUTURE_DAYS // 7 + 2))
+    store.week_schedule(conn, monday, monday + timedelta(days=5))
+    store.create_booking(conn, 'Student', '+998900000005', free_day, 1, WEEKLY_LIMIT)
+    store.create_booking(conn, 'Student', '+998900000006', monday + timedelta(days=7), 1, WEEKLY_LIMIT)
+    store.client_bookings(conn, '+998900000005', today)
+    store.bookings_on(conn, today)
+    store.overrides(conn, monday, monday + timedelta(days=5))
+    store.bookings_page(conn, today, limit=50)
+    store.bookings_page(conn, today, statuses=('pending_cancellation',), limit=50)
+    store.bookings_page(conn, today, after=(today + timedelta(days=1), '15:00', 1000), limit=50)
+    conn.rollback()
+
+def table_aliases(sql):
+    aliases = {}
+    for table, alias in re.findall(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', sql, flags=re.I):
+        aliases[table] = table
+        if alias:
+            aliases[alias] = table
+    return aliases
+
+def is_query(sql):
+    return sql.lstrip().split(None, 1)[0].upper() in ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')
+
+def seq_scans(plan):
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        stack.extend(node.get('Plans', []))
+        if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') in LARGE_TABLES:
+            yield node['Relation Name']
+
+
+class _Recording:
+    # Курсор SQLite, который запоминает выполненные запросы вместе с параметрами
+    def __init__(self, cur, statements):
+        self._cur = cur
+        self._statements = statements
+
+    def execute(self, sql, params=()):
+        self._statements.append((sql, params))
+        self._cur.execute(sql, params)
+        return self
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cur.close()
+
+
+def test_sqlite_hot_paths_use_indexes(sqlite_url):
+    from storage.sqlite import _translate
+
+    store = open_storage(sqlite_url)
+    conn = store.connect()
+    try:
+        migrate(store, conn)
+        seed(store, conn)
+
+        statements = []
+        cursor = store.cursor
+        store.cursor = lambda c: _Recording(cursor(c), statements)
+        hot_paths(store, conn)
+        store.cursor = cursor
+
+        scans = []
+        for sql, params in statements:
+            if not is_query(sql):
+                continue
+            aliases = table_aliases(sql)
+            plan = [row['detail'] for row in conn.execute('EXPLAIN QUERY PLAN ' + _translate(sql), params)]
+            for detail in plan:
+                # «SCAN b» — полный проход; «SCAN b USING INDEX» по индексу тоже читает всю таблицу
+                match = re.match(r'SCAN (\w+)', detail)
+                if match and aliases.get(match.group(1)) in LARGE_TABLES:
+                    scans.append((' '.join(sql.split())[:120], detail))
+        conn.rollback()
+        assert not scans, scans
+    finally:
+        conn.close()
+
+
+def test_postgres_hot_paths_have_no_seq_scans(postgres_url):
+    statements = []
+    store = open_storage(postgres_url)
+    conn = store.connect()
+
+    class Recording(conn.cursor_factory):
+        # Запоминает запрос вместе с подставленными параметрами
+        def execute(self, query, vars=None):
+            result = super().execute(query, vars)
+            statements.append((query, self.query))
+            return result
+
+    try:
+        migrate(store, conn)
+        seed(store, conn)
+
+        cursor_factory, conn.cursor_factory = conn.cursor_factory, Recording
+        hot_paths(store, conn)
+        conn.cursor_factory = cursor_factory
+
+        scans = []
+        with conn.cursor() as cur:
+            for sql, bound in statements:
+                if not is_query(sql):
+                    continue
+                cur.execute(b'EXPLAIN (FORMAT JSON) ' + bound)
+                plan = cur.fetchone()['QUERY PLAN'][0]['Plan']
+                scans.extend((' '.join(sql.split())[:120], table) for table in seq_scans(plan))
+        conn.rollback()
+        assert not scans, scans
+    finally:
+        conn.close()
@@ -0,0 +1,85 @@
+from datetime import timedelta
+from html.parser import HTMLParser
+
+import app as booking_app
+import db
+
+
+class ScheduleForm(HTMLParser):
+    # Что браузер отправит формой расписания: скрытые поля и отмеченные флажки с именем
+    def __init__(self):
+        super().__init__()
+        self.inside = False
+        self.fields = {}
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'form':
+            self.inside = attrs.get('action') == '/admin/update_schedule'
+        elif tag == 'input' and self.inside and attrs.get('name'):
+            if attrs.get('type') == 'hidden' or (attrs.get('type') == 'checkbox' and 'checked' in attrs):
+                self.fields[attrs['name']] = attrs.get('value') or 'on'
+
+    def handle_endtag(self, tag):
+        if tag == 'form':
+            self.inside = False
+
+def schedule_form(client):
+    parser = ScheduleForm()
+    parser.feed(client.get('/admin').get_data(as_text=True))
+    return parser.fields
+
+def overrides(start, end):
+    store = db.get_storage()
+    with db.get_pool().connection() as conn:
+        rows = store.overrides(conn, start, end)
+        version, _ = store.data_version(conn)
+        conn.rollback()
+    return set((row['date'], row['slot_id']) for row in rows), version
+
+def seed_overrides(entries):
+    store = db.get_storage()
+    with db.get_pool().connection() as conn:
+        store.change_overrides(conn, entries, [])
+        booking_app.commit_changes(conn)
+
+
+def test_update_schedule_saves_only_the_difference(flask_app):
+    client = flask_app.test_client()
+    with client.session_transaction() as session:
+        session['admin'] = True
+
+    mon, tue, wed, thu = booking_app.get_current_week_dates()[:4]
+    sat = mon + timedelta(days=5)
+    last_week = mon - timedelta(days=7)
+    # Правило закрывает вторник 14:00–15:00 (слоты 1 и 2); на слот 1 есть ещё и своё исключение
+    assert client.post('/admin/rules', data={'weekday': '1', 'from': '14:00', 'to': '15:00'}).status_code == 302
+    seed_overrides([(mon, 3), (tue, 1), (last_week, 3)])
+
+    form = schedule_form(client)
+    assert form['disable_%s_3' % mon] == 'on'
+    assert form['disable_%s_1' % tue] == 'on'
+    assert 'disable_%s_2' % tue not in form
+
+    # Форма без изменений ничего не пишет: версия данных та же
+    before, version = overrides(last_week, sat)
+    assert client.post('/admin/update_schedule', data=form).status_code == 302
+    assert overrides(last_week, sat) == (before, version)
+
+    # Снять исключение понедельника, закрыть слот в среду и весь четверг
+    del form['disable_%s_3' % mon]
+    form['disable_%s_5' % wed] = 'on'
+    form['disable_%s' % thu] = 'on'
+    assert client.post('/admin/update_schedule', data=form).status_code == 302
+
+    after, changed = overrides(last_week, sat)
+    assert changed == version + 1
+    assert after - before == {(wed, 5), (thu, None)}
+    assert before - after == {(mon, 3)}
+    # Вне диапазона формы и под правилом: исключения на месте, закрытый правилом слот 2 не стал исключением
+    assert {(last_week, 3), (tue, 1)} <= after
+    assert (tue, 2) not in after
+
+    form = schedule_form(client)
+    assert client.post('/admin/update_schedule', data=form).status_code == 302
+    assert overrides(last_week, sat) == (after, changed)